@@ -0,0 +1,169 @@
+"""FastAPI endpoints and the /ws fan-out under concurrent load against the local app.
+
+The app is served by uvicorn on a free localhost port in a background
+thread of this process, so load generator and server share one
+interpreter: absolute numbers are pessimistic, but comparable run to run.
+"""
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+import uvicorn
+import websockets
+
+from harness import percentile, summarize
+
+# Served models are loaded (or trained) in the background at startup
+READY_TIMEOUT = 300
+
+
+def endpoints(rng):
+    """(method, path, JSON body) of the endpoints under load"""
+    n = 1000
+    spoilage = {'temperature': rng.uniform(-2, 10, n).round(2).tolist(),
+                'humidity': rng.uniform(30, 80, n).round(1).tolist(),
+                'days_stored': rng.integers(1, 15, n).tolist(),
+                'food_type': rng.integers(0, 4, n).tolist()}
+    now = datetime.now(timezone.utc).isoformat()
+    readings = [{'sensor_id': f'bench_{i}', 'temperature': 4.0, 'humidity': 50.0, 'weight': 20.0, 'timestamp': now}
+                for i in range(100)]
+    return [
+        ('GET', '/', None),
+        ('GET', '/api/dashboard/overview', None),
+        ('GET', '/api/sensor/realtime', None),
+        ('GET', '/api/predictions/donations', None),
+        ('GET', '/api/predictions/demand?horizon=30', None),
+        ('GET', '/api/optimization/routes', None),
+        ('GET', '/api/network/analysis', None),
+        ('GET', '/api/analytics/efficiency', None),
+        ('POST', '/api/spoilage/batch', spoilage),
+        ('POST', '/api/sensor/ingest', readings),
+    ]
+
+
+class LocalServer(uvicorn.Server):
+    """uvicorn serving ``app`` from a background thread; ``loop`` is the server's event loop"""
+
+    def __init__(self, app):
+        # A long keep-alive: with the default 5s, an idle connection closing just as the load
+        # generator reuses it shows up as spurious read errors once the loop is saturated
+        super().__init__(uvicorn.Config(app, host='127.0.0.1', port=0, log_level='warning', timeout_keep_alive=60))
+        self.loop = None
+        self.thread = None
+
+    async def startup(self, sockets=None):
+        self.loop = asyncio.get_running_loop()
+        await super().startup(sockets)
+
+    @property
+    def url(self):
+        host, port = self.servers[0].sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        while not self.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("The benchmark server failed to start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.should_exit = True
+        self.thread.join(timeout=30)
+
+
+async def wait_until_ready(client):
+    deadline = time.monotonic() + READY_TIMEOUT
+    while (await client.get('/api/predictions/donations')).status_code != 200:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Models did not become ready for the API benchmark")
+        await asyncio.sleep(0.5)
+
+
+async def load(client, method, path, body, requests, concurrency):
+    """Issue ``requests`` calls from ``concurrency`` concurrent clients; latency and throughput stats"""
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                errors += response.status_code >= 400
+            except httpx.TransportError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {**summarize(latencies), 'requests_per_s': round(requests / elapsed, 1), 'errors': errors,
+            'concurrency': concurrency}
+
+
+async def fan_out(server, hub, clients, messages, interval=0.005):
+    """Publish ``messages`` to ``clients`` /ws subscribers; delivery latency from publish to receipt"""
+    url = server.url.replace('http', 'ws') + '/ws?topic=benchmark'
+    connections = [await websockets.connect(url, max_queue=None) for _ in range(clients)]
+    latencies = []
+
+    async def receive(connection):
+        # Until the last message: a saturated subscriber queue drops the oldest ones, never the newest
+        while True:
+            message = json.loads(await connection.recv())
+            latencies.append((time.perf_counter() - message['sent_at']) * 1000)
+            if message['seq'] == messages - 1:
+                return
+
+    receivers = [asyncio.create_task(receive(connection)) for connection in connections]
+    dropped = hub.dropped
+    started = time.perf_counter()
+    for i in range(messages):
+        # One distinct key per message, so nothing is coalesced
+        server.loop.call_soon_threadsafe(lambda i=i: hub.publish(
+            'benchmark', {'sensor_id': f'benchmark_{i}', 'seq': i, 'sent_at': time.perf_counter()}))
+        await asyncio.sleep(interval)
+    _, pending = await asyncio.wait(receivers, timeout=30)
+    elapsed = time.perf_counter() - started
+    for task in pending:
+        task.cancel()
+    for connection in connections:
+        await connection.close()
+
+    if not latencies:
+        raise RuntimeError("No websocket messages were delivered")
+    latencies.sort()
+    return {**summarize(latencies), 'p99_ms': round(percentile(latencies, 0.99), 3), 'delivered': len(latencies),
+            'expected': clients * messages, 'dropped': hub.dropped - dropped,
+            'messages_per_s': round(len(latencies) / elapsed, 1)}
+
+
+async def run_load(server, hub, quick):
+    requests, concurrency = (100, 10) if quick else (1000, 50)
+    results = {}
+    async with httpx.AsyncClient(base_url=server.url, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        await wait_until_ready(client)
+        for method, path, body in endpoints(np.random.default_rng(0)):
+            # One untimed round first, so caches and connections are warm
+            await load(client, method, path, body, concurrency, concurrency)
+            results[f'api.{method} {path}'] = await load(client, method, path, body, requests, concurrency)
+
+    clients, messages = (20, 50) if quick else (200, 200)
+    results[f'api.ws.fan_out.{clients}x{messages}'] = await fan_out(server, hub, clients, messages)
+    return results
+
+
+def run(quick=False):
+    import main
+
+    with LocalServer(main.app) as server:
+        return asyncio.run(run_load(server, main.manager, quick))
@@ -0,0 +1,57 @@
+"""GraphOptimizer routing and analysis on synthetic networks of 10 to 10k nodes"""
+import numpy as np
+
+from harness import measure
+from graph_algorithms import GraphOptimizer
+
+SIZES = (10, 100, 1000, 10000)
+QUICK_SIZES = (10, 100, 1000)
+
+# Networks up to this size are fully connected like the built-in one; larger ones link k nearest neighbours
+FULL_MESH_MAX_NODES = 100
+K_NEAREST = 8
+
+# Donors and NGOs are each a tenth of the nodes, up to this many
+MAX_STOPS = 100
+
+TSP_STOPS = 20
+
+
+def synthetic_network(n_nodes, seed=0):
+    """A GraphOptimizer over ``n_nodes`` random locations around the hub: donors, NGOs and storage"""
+    rng = np.random.default_rng(seed)
+    n_stops = max(1, min(n_nodes // 10, MAX_STOPS))
+    node_ids = ['central_hub'] + [f'donor_{i}' for i in range(n_stops)] + [f'ngo_{i}' for i in range(n_stops)]
+    node_ids += [f'storage_{i}' for i in range(n_nodes - len(node_ids))]
+    node_types = ['hub'] + ['donor'] * n_stops + ['ngo'] * n_stops + ['storage'] * (n_nodes - 1 - 2 * n_stops)
+
+    types = np.array(node_types)
+    capacity = np.where(types == 'donor', rng.uniform(100, 250, n_nodes).round(),
+                        np.where(types == 'storage', 300.0, np.nan))
+    capacity[0] = 1000
+    demand = np.where(types == 'ngo', rng.uniform(40, 150, n_nodes).round(), np.nan)
+
+    optimizer = GraphOptimizer()
+    optimizer.build_network(node_ids, rng.uniform(40.55, 40.90, n_nodes), rng.uniform(-74.10, -73.75, n_nodes),
+                            node_types, k_nearest=None if n_nodes <= FULL_MESH_MAX_NODES else K_NEAREST,
+                            capacity=capacity, demand=demand)
+    return optimizer
+
+
+def run(quick=False):
+    repeat = 3 if quick else 5
+    results = {}
+    for n_nodes in QUICK_SIZES if quick else SIZES:
+        results[f'graph.build.{n_nodes}'] = measure(lambda: synthetic_network(n_nodes), repeat=repeat, warmup=0)
+        optimizer = synthetic_network(n_nodes)
+        stops = (optimizer.nodes_of_type('ngo') + optimizer.nodes_of_type('storage'))[:TSP_STOPS]
+
+        results[f'graph.optimize_delivery_routes.{n_nodes}'] = measure(optimizer.optimize_delivery_routes,
+                                                                       repeat=repeat)
+        results[f'graph.tsp.{n_nodes}'] = measure(lambda: optimizer.traveling_salesman_approximation(stops),
+                                                  repeat=repeat)
+        results[f'graph.minimum_spanning_tree.{n_nodes}'] = measure(optimizer.minimum_spanning_tree, repeat=repeat)
+        # Cold: the per-version result cache is emptied before every call
+        results[f'graph.network_analysis.{n_nodes}'] = measure(optimizer.network_analysis, repeat=repeat, warmup=0,
+                                                               setup=lambda: optimizer._analysis_cache.clear())
+    return results
@@ -0,0 +1,71 @@
+"""MLModelManager training and prediction, single and batched"""
+import tempfile
+
+import numpy as np
+
+from harness import measure
+from data_sources import SyntheticDataSource
+from lstm_forecaster import LSTMForecaster
+from ml_models import MODEL_SCHEMAS, MODEL_PARAMS, MLModelManager
+from model_store import ModelStore
+from model_training import FOREST_TYPES, TrainingOrchestrator, fit_forest
+from spoilage_cache import SpoilageScoreCache
+
+
+def random_forecaster(seq_length=MODEL_PARAMS['lstm']['seq_length'], units=MODEL_PARAMS['lstm']['units'], seed=0):
+    """An LSTMForecaster with the trained model's shapes and random weights (no TensorFlow needed)"""
+    rng = np.random.default_rng(seed)
+    lstm_layers, inputs = [], 1
+    for _ in range(2):
+        lstm_layers.append((rng.normal(0, 0.1, (inputs, 4 * units)), rng.normal(0, 0.1, (units, 4 * units)),
+                            np.zeros(4 * units)))
+        inputs = units
+    dense_layers = [(rng.normal(0, 0.1, (units, 25)), np.zeros(25)), (rng.normal(0, 0.1, (25, 1)), np.zeros(1))]
+    return LSTMForecaster(lstm_layers, dense_layers, seq_length, 100.0, 20.0, rng.uniform(50, 150, seq_length))
+
+
+def run(quick=False):
+    repeat = 10 if quick else 30
+    train_repeat = 1 if quick else 3
+    results = {}
+    rng = np.random.default_rng(0)
+    # Imported up front, so the first training case is not charged for it
+    import sklearn.ensemble  # noqa: F401
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        frames = SyntheticDataSource(42).load()
+        for name in FOREST_TYPES:
+            df = frames[MODEL_SCHEMAS[name][0]]
+            results[f'ml.train.{name}'] = measure(lambda: fit_forest(name, df, n_jobs=-1),
+                                                  repeat=train_repeat, warmup=0)
+
+        manager = MLModelManager(store=ModelStore(store_dir), data_source=SyntheticDataSource(42))
+        orchestrator = TrainingOrchestrator(manager)
+        results['ml.train.orchestrator'] = measure(lambda: orchestrator.run(list(FOREST_TYPES), force=True),
+                                                   repeat=train_repeat, warmup=0)
+
+        for horizon in (7, 90):
+            results[f'ml.predict.donations.{horizon}d'] = measure(lambda: manager.predict_donations(horizon),
+                                                                  repeat=repeat)
+        results['ml.predict.demand.30d'] = measure(lambda: manager.predict_demand(30), repeat=repeat)
+
+        def reset_cache():
+            manager.spoilage_cache = SpoilageScoreCache()
+
+        single = lambda: manager.predict_spoilage_risk(6.0, 75.0, 5, 1)
+        results['ml.predict.spoilage.single'] = measure(single, repeat=repeat, warmup=0, setup=reset_cache)
+        results['ml.predict.spoilage.single.cached'] = measure(single, repeat=repeat * 10)
+
+        n = 10_000
+        batch = (rng.uniform(-2, 10, n).round(2), rng.uniform(30, 80, n).round(1),
+                 rng.integers(1, 15, n), rng.integers(0, 4, n))
+        results['ml.predict.spoilage.batch_10k'] = measure(lambda: manager.predict_spoilage_batch(*batch),
+                                                           repeat=repeat, warmup=0, setup=reset_cache)
+        results['ml.predict.spoilage.batch_10k.cached'] = measure(lambda: manager.predict_spoilage_batch(*batch),
+                                                                  repeat=repeat)
+
+    forecaster = random_forecaster()
+    histories = rng.uniform(50, 150, (1000, forecaster.seq_length))
+    results['ml.predict.lstm.30d'] = measure(lambda: forecaster.forecast(30), repeat=repeat)
+    results['ml.predict.lstm.30d_1000_series'] = measure(lambda: forecaster.forecast(30, histories), repeat=repeat)
+    return results
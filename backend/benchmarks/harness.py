@@ -0,0 +1,135 @@
+"""Timing, result files and baseline comparison shared by the benchmark suite"""
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+RESULTS_DIR = os.environ.get('SMARTCARE_BENCH_RESULTS', os.path.join(BACKEND_DIR, 'benchmarks', 'results'))
+
+# A benchmark regressed when its median is this much slower than the baseline's...
+REGRESSION_TOLERANCE = float(os.environ.get('SMARTCARE_BENCH_TOLERANCE', 0.25))
+# ...and slower by at least this many milliseconds, so timer noise on tiny cases does not count
+REGRESSION_MIN_MS = 0.5
+
+
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples_ms):
+    """Median, p95, min and max of timings in milliseconds"""
+    samples = sorted(samples_ms)
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(percentile(samples, 0.95), 3),
+        'min_ms': round(samples[0], 3),
+        'max_ms': round(samples[-1], 3),
+        'runs': len(samples),
+    }
+
+
+def measure(fn, repeat=5, warmup=1, setup=None):
+    """Time ``fn()`` ``repeat`` times after ``warmup`` untimed calls; ``setup()`` runs untimed before each.
+
+    Anything the code under test prints is swallowed.
+    """
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(warmup + repeat):
+            if setup is not None:
+                setup()
+            started = time.perf_counter()
+            fn()
+            elapsed = (time.perf_counter() - started) * 1000
+            if i >= warmup:
+                samples.append(elapsed)
+    return summarize(samples)
+
+
+def environment():
+    """Where the results were measured, so baselines from other machines can be recognised"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def save(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE, min_ms=REGRESSION_MIN_MS):
+    """Per-benchmark comparison of median times with a baseline's.
+
+    Status is 'regressed' or 'improved' when the median moved by more than
+    ``tolerance`` (relative) and ``min_ms`` (absolute), else 'ok'; 'new'
+    and 'missing' mark benchmarks only in the results or only in the
+    baseline.
+    """
+    rows = []
+    for name in sorted(set(results) | set(baseline)):
+        current, previous = results.get(name), baseline.get(name)
+        if current is None or previous is None:
+            rows.append({'name': name, 'status': 'missing' if current is None else 'new',
+                         'baseline_ms': previous and previous['median_ms'],
+                         'current_ms': current and current['median_ms']})
+            continue
+        before, after = previous['median_ms'], current['median_ms']
+        ratio = after / before if before else float('inf')
+        status = 'ok'
+        if abs(after - before) >= min_ms:
+            if ratio > 1 + tolerance:
+                status = 'regressed'
+            elif ratio < 1 / (1 + tolerance):
+                status = 'improved'
+        rows.append({'name': name, 'status': status, 'baseline_ms': before, 'current_ms': after,
+                     'ratio': round(ratio, 3)})
+    return rows
+
+
+def print_results(results):
+    width = max(len(name) for name in results)
+    for name, stats in results.items():
+        extra = ', '.join(f"{key} {value}" for key, value in stats.items()
+                          if key not in ('median_ms', 'p95_ms', 'min_ms', 'max_ms', 'runs'))
+        print(f"  {name:<{width}}  median {stats['median_ms']:10.3f} ms  p95 {stats['p95_ms']:10.3f} ms"
+              + (f"  ({extra})" if extra else ''))
+
+
+def print_comparison(rows):
+    width = max(len(row['name']) for row in rows)
+    for row in rows:
+        if row['status'] in ('new', 'missing'):
+            print(f"  {row['name']:<{width}}  {row['status']}")
+        else:
+            print(f"  {row['name']:<{width}}  {row['baseline_ms']:10.3f} -> {row['current_ms']:10.3f} ms  "
+                  f"x{row['ratio']:<6} {row['status']}")
@@ -0,0 +1,92 @@
+"""Import-time budget for the API.
+
+Imports ``main`` in fresh interpreters, reports the median wall time, peak
+memory and the slowest top-level imports (from ``-X importtime``), and
+exits non-zero when the median exceeds the budget or a heavy framework is
+imported eagerly. Run from the backend directory:
+
+    python benchmarks/import_time.py [--runs 5] [--budget 3.0] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get('SMARTCARE_IMPORT_BUDGET', 3.0))
+
+# Only loaded once a model is trained, unpickled or warmed up, never by importing main
+LAZY_MODULES = ('tensorflow', 'keras', 'sklearn', 'matplotlib', 'seaborn')
+
+PROBE = f"""
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+print(json.dumps({{
+    'seconds': time.perf_counter() - started,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'eager_modules': [m for m in {LAZY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_probe(extra_args=()):
+    result = subprocess.run([sys.executable, *extra_args, '-c', PROBE], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True)
+    # main prints while building the network; the measurement is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(importtime_log, limit=10):
+    """Modules imported directly by main, by cumulative import time (ms) from ``-X importtime``.
+
+    A shared dependency is charged to whichever of them imported it first.
+    """
+    totals = []
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Each nesting level indents the name by two more spaces; main itself is level 0
+        if len(name) - len(name.lstrip(' ')) == 3:
+            totals.append((name.strip(), int(cumulative) / 1000))
+    return sorted(totals, key=lambda item: -item[1])[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET_SECONDS, help='seconds')
+    parser.add_argument('--json', action='store_true', help='print the result as JSON')
+    args = parser.parse_args()
+
+    runs = [run_probe()[0] for _ in range(args.runs)]
+    _, importtime_log = run_probe(['-X', 'importtime'])
+    result = {
+        'median_seconds': round(statistics.median(r['seconds'] for r in runs), 3),
+        'max_seconds': round(max(r['seconds'] for r in runs), 3),
+        'max_rss_mb': round(max(r['max_rss_mb'] for r in runs), 1),
+        'budget_seconds': args.budget,
+        'eager_modules': sorted({m for r in runs for m in r['eager_modules']}),
+        'slowest_imports_ms': [[name, round(ms, 1)] for name, ms in slowest_imports(importtime_log)],
+    }
+    result['passed'] = result['median_seconds'] <= args.budget and not result['eager_modules']
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"import main: median {result['median_seconds']}s, max {result['max_seconds']}s "
+              f"(budget {args.budget}s), peak RSS {result['max_rss_mb']} MB")
+        for name, ms in result['slowest_imports_ms']:
+            print(f"  {ms:8.1f} ms  {name}")
+        if result['eager_modules']:
+            print(f"Imported eagerly (should be lazy): {', '.join(result['eager_modules'])}")
+        print("PASS" if result['passed'] else "FAIL")
+    return 0 if result['passed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Benchmark suite for the ML, graph and API hot paths.
+
+Runs the selected suites, writes the results as JSON and compares median
+times with a saved baseline, exiting non-zero when anything regressed by
+more than the tolerance. Run from the backend directory:
+
+    python benchmarks/run.py [ml graph api] [--quick] [--save-baseline]
+
+Record a baseline on the deploy machine (``--save-baseline``) and run the
+same command before the next deploy to catch regressions.
+"""
+import argparse
+import os
+import sys
+import time
+
+import harness
+
+SUITES = ('ml', 'graph', 'api')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('suites', nargs='*', help=f"suites to run, of {list(SUITES)} (default: all)")
+    parser.add_argument('--quick', action='store_true', help='smaller inputs and fewer runs')
+    parser.add_argument('--output', default=os.path.join(harness.RESULTS_DIR, 'latest.json'))
+    parser.add_argument('--baseline', default=os.path.join(harness.RESULTS_DIR, 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='also store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=harness.REGRESSION_TOLERANCE,
+                        help='relative slowdown counted as a regression')
+    args = parser.parse_args()
+    suites = args.suites or list(SUITES)
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites {sorted(unknown)}")
+
+    results = {}
+    for suite in suites:
+        started = time.perf_counter()
+        module = __import__(f'bench_{suite}')
+        suite_results = module.run(quick=args.quick)
+        print(f"{suite}: {len(suite_results)} benchmarks in {time.perf_counter() - started:.1f}s")
+        harness.print_results(suite_results)
+        results.update(suite_results)
+
+    report = {'environment': harness.environment(), 'quick': args.quick, 'suites': suites, 'results': results}
+    baseline = None if args.save_baseline else harness.load(args.baseline)
+    regressed = []
+    if baseline is None and not args.save_baseline:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+    elif baseline is not None and baseline.get('quick') != args.quick:
+        print(f"Not comparing: the baseline at {args.baseline} was recorded "
+              f"{'with' if baseline.get('quick') else 'without'} --quick, so its inputs differ")
+    elif baseline is not None:
+        if baseline['environment'].get('cpu_count') != report['environment']['cpu_count']:
+            print(f"Warning: baseline was recorded on another machine ({baseline['environment'].get('platform')})")
+        # Only suites that ran now are compared, so running one suite does not report the rest as missing
+        prefixes = tuple(f'{suite}.' for suite in suites)
+        rows = harness.compare(results, {name: stats for name, stats in baseline['results'].items()
+                                         if name.startswith(prefixes)}, args.tolerance)
+        report['baseline'] = {'path': args.baseline, 'environment': baseline['environment']}
+        report['comparison'] = rows
+        print(f"Compared with baseline from {baseline['environment'].get('timestamp')} "
+              f"(commit {baseline['environment'].get('commit')}), tolerance {args.tolerance:.0%}:")
+        harness.print_comparison(rows)
+        regressed = [row['name'] for row in rows if row['status'] == 'regressed']
+
+    harness.save(report, args.output)
+    print(f"Results written to {args.output}")
+    if args.save_baseline:
+        harness.save(report, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+    if regressed:
+        print(f"FAIL: {len(regressed)} regressed: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
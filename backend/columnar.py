@@ -0,0 +1,84 @@
+import io
+import json
+
+import numpy as np
+
+# Content types accepted (and returned) by the columnar batch endpoints
+JSON_CONTENT_TYPE = 'application/json'
+NPZ_CONTENT_TYPE = 'application/x-npz'
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+class ColumnarFormatError(ValueError):
+    """Raised when a columnar request body cannot be decoded"""
+
+
+def media_type(content_type):
+    """Strip parameters such as charset from a Content-Type header"""
+    return (content_type or JSON_CONTENT_TYPE).split(';')[0].strip().lower()
+
+
+def decode_columns(body: bytes, content_type: str, names):
+    """Decode a columnar request body into a dict of NumPy arrays.
+
+    Supports JSON objects of lists, NumPy ``.npz`` archives and Arrow IPC
+    streams (the latter only when pyarrow is installed).
+    """
+    kind = media_type(content_type)
+    if kind == NPZ_CONTENT_TYPE:
+        try:
+            with np.load(io.BytesIO(body), allow_pickle=False) as archive:
+                columns = {name: archive[name] for name in names if name in archive.files}
+        except (OSError, ValueError) as e:
+            raise ColumnarFormatError(f"Invalid npz payload: {e}")
+    elif kind == ARROW_CONTENT_TYPE:
+        pa = _import_pyarrow()
+        try:
+            table = pa.ipc.open_stream(body).read_all()
+        except pa.ArrowInvalid as e:
+            raise ColumnarFormatError(f"Invalid Arrow payload: {e}")
+        columns = {name: table.column(name).to_numpy() for name in names if name in table.column_names}
+    elif kind == JSON_CONTENT_TYPE:
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            raise ColumnarFormatError(f"Invalid JSON payload: {e}")
+        if not isinstance(payload, dict):
+            raise ColumnarFormatError("JSON payload must be an object of columns")
+        columns = {name: np.asarray(payload[name]) for name in names if name in payload}
+    else:
+        raise ColumnarFormatError(f"Unsupported content type: {kind}")
+
+    missing = [name for name in names if name not in columns]
+    if missing:
+        raise ColumnarFormatError(f"Missing columns: {', '.join(missing)}")
+    lengths = {len(col) for col in columns.values()}
+    if len(lengths) > 1:
+        raise ColumnarFormatError("All columns must have the same length")
+    return columns
+
+
+def encode_columns(columns, content_type: str):
+    """Encode a dict of NumPy arrays in the given format; returns (body, media type)"""
+    kind = media_type(content_type)
+    if kind == NPZ_CONTENT_TYPE:
+        buffer = io.BytesIO()
+        np.savez(buffer, **columns)
+        return buffer.getvalue(), NPZ_CONTENT_TYPE
+    if kind == ARROW_CONTENT_TYPE:
+        pa = _import_pyarrow()
+        table = pa.table({name: pa.array(col) for name, col in columns.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), ARROW_CONTENT_TYPE
+    body = json.dumps({name: np.asarray(col).tolist() for name, col in columns.items()})
+    return body.encode(), JSON_CONTENT_TYPE
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ColumnarFormatError("Arrow payloads require pyarrow to be installed")
+    return pa
@@ -0,0 +1,188 @@
+import math
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, minimum_spanning_tree, shortest_path
+
+from network_metrics import local_clustering
+
+# Sources per csgraph call when computing eccentricities, bounding memory to O(block * n)
+ECCENTRICITY_BLOCK_SIZE = 256
+
+
+class CompactNetwork:
+    """Array-backed undirected distribution network.
+
+    Node ids map to integer indices; node attributes live in typed NumPy
+    arrays (type codes into ``type_names``, float64 coordinates, float32
+    numeric attributes with NaN for missing values). Each edge is stored
+    once as (u, v) index arrays with its distance, traffic factor and
+    closed flag. A symmetric CSR weight matrix mirrors the edges for
+    scipy.sparse.csgraph, and ``edge_entries`` records where each edge sits
+    in ``adjacency.data`` so traffic updates are plain array writes.
+    """
+
+    def __init__(self, node_ids, lats, lons, node_types=None, **attributes):
+        self.node_ids = list(node_ids)
+        self.index = {node: i for i, node in enumerate(self.node_ids)}
+        if len(self.index) != len(self.node_ids):
+            raise ValueError("Node ids must be unique")
+        self.lat = np.asarray(lats, dtype=np.float64)
+        self.lon = np.asarray(lons, dtype=np.float64)
+
+        node_types = node_types if node_types is not None else ['location'] * len(self.node_ids)
+        self.type_names, codes = np.unique(np.asarray(node_types, dtype=object).astype(str), return_inverse=True)
+        self.type_names = self.type_names.tolist()
+        self.type_codes = codes.astype(np.int16)
+
+        self.attributes = {name: np.asarray(values, dtype=np.float32) for name, values in attributes.items()}
+        self.set_edges(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), np.empty(0))
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Convert a NetworkX distribution network"""
+        nodes = list(graph.nodes(data=True))
+        names = {name for _, attrs in nodes for name, value in attrs.items()
+                 if name not in ('type', 'lat', 'lon') and isinstance(value, (int, float))}
+        network = cls([node for node, _ in nodes],
+                      [attrs['lat'] for _, attrs in nodes],
+                      [attrs['lon'] for _, attrs in nodes],
+                      [attrs.get('type', 'location') for _, attrs in nodes],
+                      **{name: [attrs.get(name, np.nan) for _, attrs in nodes] for name in names})
+        edges = list(graph.edges(data=True))
+        network.set_edges(
+            [network.index[u] for u, _, _ in edges],
+            [network.index[v] for _, v, _ in edges],
+            [data['distance'] for _, _, data in edges],
+            [data.get('traffic_factor', 1.0) for _, _, data in edges],
+            [data.get('closed', False) for _, _, data in edges])
+        return network
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_u)
+
+    def set_edges(self, sources, targets, distances, traffic_factors=None, closed=None):
+        """Replace all edges and rebuild the CSR weight matrix"""
+        self.edge_u = np.asarray(sources, dtype=np.int32)
+        self.edge_v = np.asarray(targets, dtype=np.int32)
+        self.edge_distance = np.asarray(distances, dtype=np.float64)
+        m = len(self.edge_u)
+        self.edge_traffic = (np.ones(m, dtype=np.float32) if traffic_factors is None
+                             else np.asarray(traffic_factors, dtype=np.float32))
+        self.edge_closed = np.zeros(m, dtype=bool) if closed is None else np.asarray(closed, dtype=bool)
+
+        # Both directions of every edge, sorted by (row, column) for CSR
+        rows = np.concatenate((self.edge_u, self.edge_v))
+        cols = np.concatenate((self.edge_v, self.edge_u))
+        order = np.lexsort((cols, rows))
+        indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.num_nodes), out=indptr[1:])
+
+        # CSR slot of each edge's two directions, and the edge behind every slot
+        edge_of_entry = np.concatenate((np.arange(m), np.arange(m)))[order]
+        position = np.empty(2 * m, dtype=np.int64)
+        position[order] = np.arange(2 * m)
+        self.edge_entries = np.column_stack((position[:m], position[m:]))
+        self.entry_edge = edge_of_entry
+
+        self.adjacency = csr_matrix((self.edge_weights()[edge_of_entry], cols[order], indptr),
+                                    shape=(self.num_nodes, self.num_nodes))
+
+    def edge_weights(self, edges=None):
+        """Current weights (distance * traffic factor, inf while closed)"""
+        edges = slice(None) if edges is None else edges
+        weights = self.edge_distance[edges] * self.edge_traffic[edges]
+        return np.where(self.edge_closed[edges], np.inf, weights)
+
+    def edge_id(self, i, j):
+        """Index of the edge between node indices i and j, or -1"""
+        start, stop = self.adjacency.indptr[i], self.adjacency.indptr[i + 1]
+        pos = start + np.searchsorted(self.adjacency.indices[start:stop], j)
+        if pos >= stop or self.adjacency.indices[pos] != j:
+            return -1
+        return int(self.entry_edge[pos])
+
+    def set_edge_state(self, edge, traffic_factor=None, closed=None):
+        """Update one edge's traffic factor / closure; returns its new weight"""
+        if traffic_factor is not None:
+            self.edge_traffic[edge] = traffic_factor
+        if closed is not None:
+            self.edge_closed[edge] = closed
+        weight = float(self.edge_weights(edge))
+        self.adjacency.data[self.edge_entries[edge]] = weight
+        return weight
+
+    def open_adjacency(self):
+        """CSR weight matrix without closed edges"""
+        if not self.edge_closed.any():
+            return self.adjacency
+        adjacency = self.adjacency.copy()
+        adjacency.data[~np.isfinite(adjacency.data)] = 0
+        adjacency.eliminate_zeros()
+        return adjacency
+
+    # Node attributes
+
+    def node_type(self, i):
+        return self.type_names[self.type_codes[i]]
+
+    def node_types(self):
+        """Type name of every node, as an object array"""
+        return np.asarray(self.type_names, dtype=object)[self.type_codes]
+
+    def nodes_of_type(self, node_type):
+        if node_type not in self.type_names:
+            return []
+        members = np.nonzero(self.type_codes == self.type_names.index(node_type))[0]
+        return [self.node_ids[i] for i in members.tolist()]
+
+    def node_attrs(self, node):
+        """Attributes of one node as a dict (missing values left out)"""
+        i = self.index[node]
+        attrs = {'type': self.node_type(i), 'lat': float(self.lat[i]), 'lon': float(self.lon[i])}
+        for name, values in self.attributes.items():
+            if not math.isnan(values[i]):
+                attrs[name] = float(values[i])
+        return attrs
+
+    def memory_bytes(self):
+        """Approximate size of the array storage"""
+        arrays = [self.lat, self.lon, self.type_codes, self.edge_u, self.edge_v, self.edge_distance,
+                  self.edge_traffic, self.edge_closed, self.edge_entries, self.entry_edge,
+                  self.adjacency.data, self.adjacency.indices, self.adjacency.indptr]
+        return int(sum(a.nbytes for a in arrays) + sum(a.nbytes for a in self.attributes.values()))
+
+    # Graph algorithms
+
+    def minimum_spanning_tree(self):
+        """(edges as node-id pairs, total weight) of the minimum spanning forest over open edges"""
+        tree = minimum_spanning_tree(self.open_adjacency()).tocoo()
+        edges = [(self.node_ids[u], self.node_ids[v]) for u, v in zip(tree.row.tolist(), tree.col.tolist())]
+        return edges, float(tree.data.sum())
+
+    def is_connected(self):
+        return connected_components(self.open_adjacency(), directed=False, return_labels=False) == 1
+
+    def average_clustering(self):
+        """Mean local clustering coefficient, from sparse triangle counts"""
+        return float(local_clustering(self.open_adjacency()).mean()) if self.num_nodes else 0.0
+
+    def eccentricities(self, block_size=ECCENTRICITY_BLOCK_SIZE):
+        """Hop-count eccentricity of every node (like ``nx.eccentricity``), one block of BFS sources at a time"""
+        adjacency = self.open_adjacency()
+        result = np.empty(self.num_nodes)
+        for start in range(0, self.num_nodes, block_size):
+            sources = np.arange(start, min(start + block_size, self.num_nodes))
+            hops = shortest_path(adjacency, directed=False, unweighted=True, indices=sources)
+            result[sources] = hops.max(axis=1)
+        return result
+
+    def density(self):
+        n = self.num_nodes
+        open_edges = int((~self.edge_closed).sum())
+        return 2 * open_edges / (n * (n - 1)) if n > 1 else 0.0
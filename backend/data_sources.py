@@ -0,0 +1,208 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Directory with donation/demand/spoilage .parquet or .csv files; synthetic data when unset
+TRAINING_DATA_DIR = os.environ.get('SMARTCARE_TRAINING_DATA')
+
+# Rows read per chunk from training files
+CHUNK_ROWS = 250_000
+
+FRAME_NAMES = ('donation', 'demand', 'spoilage')
+
+HOLIDAY_MONTHS = (11, 12)
+SUMMER_MONTHS = (6, 7, 8)
+WINTER_MONTHS = (12, 1, 2)
+
+
+def add_calendar_features(df, date_column='date'):
+    """Parse the date column and fill in day_of_week/month/is_weekend/is_holiday_season from it"""
+    if date_column not in df:
+        return df
+    dates = pd.to_datetime(df[date_column])
+    derived = {
+        'day_of_week': dates.dt.dayofweek.astype(np.int8),
+        'month': dates.dt.month.astype(np.int8),
+    }
+    derived['is_weekend'] = (derived['day_of_week'] >= 5).astype(np.int8)
+    derived['is_holiday_season'] = derived['month'].isin(HOLIDAY_MONTHS).astype(np.int8)
+    derived = {name: values for name, values in derived.items() if name not in df}
+    return df.assign(**{date_column: dates}, **derived)
+
+
+def downcast(df):
+    """Store floats as float32 and integers in the smallest integer type that fits"""
+    dtypes = {}
+    for column in df.columns:
+        if pd.api.types.is_float_dtype(df[column]):
+            dtypes[column] = np.float32
+        elif pd.api.types.is_integer_dtype(df[column]) or pd.api.types.is_bool_dtype(df[column]):
+            dtypes[column] = pd.to_numeric(df[column].astype(np.int64), downcast='integer').dtype
+    return df.astype(dtypes)
+
+
+class SyntheticDataSource:
+    """Seeded synthetic training history, generated column by column.
+
+    Produces ``series`` independent daily donation and demand series over
+    ``days`` days from ``start`` (rows are series-major, so each series is
+    contiguous and in date order) plus ``spoilage_samples`` storage
+    observations. Weekend, holiday-season, summer, winter and Monday
+    effects follow the original row-by-row generator.
+    """
+
+    def __init__(self, seed=42, start='2022-01-01', days=730, series=1, spoilage_samples=1000):
+        self.seed = seed
+        self.start = start
+        self.days = days
+        self.series = series
+        self.spoilage_samples = spoilage_samples
+
+    def load(self):
+        rng = np.random.default_rng(self.seed)
+        dates = pd.date_range(start=self.start, periods=self.days, freq='D')
+        return {
+            'donation': self._donations(rng, dates),
+            'demand': self._demand(rng, dates),
+            'spoilage': self._spoilage(rng)
+        }
+
+    def _calendar(self, dates):
+        # One row per (series, day), series-major
+        rows = self.series * len(dates)
+        return {
+            'date': np.tile(dates.values, self.series),
+            'series_id': np.repeat(np.arange(self.series, dtype=np.int32), len(dates)),
+            'day_of_week': np.tile(dates.dayofweek.values.astype(np.int8), self.series),
+            'month': np.tile(dates.month.values.astype(np.int8), self.series),
+        }, rows
+
+    def _donations(self, rng, dates):
+        columns, rows = self._calendar(dates)
+        is_weekend = columns['day_of_week'] >= 5
+        is_holiday = np.isin(columns['month'], HOLIDAY_MONTHS)
+        is_summer = np.isin(columns['month'], SUMMER_MONTHS)
+
+        # Higher donations on weekends, in the holiday season and (less so) in summer
+        base = 50 + 20 * is_weekend + 30 * is_holiday + 10 * is_summer
+        amount = np.maximum(0, base + rng.normal(0, 15, rows))
+        return pd.DataFrame({
+            **columns,
+            'temperature': rng.normal(20, 10, rows).astype(np.float32),
+            'is_weekend': is_weekend.astype(np.int8),
+            'is_holiday_season': is_holiday.astype(np.int8),
+            'donation_amount': amount.astype(np.float32)
+        })
+
+    def _demand(self, rng, dates):
+        columns, rows = self._calendar(dates)
+        # Demand is higher in winter and on Mondays
+        base = 60 + 25 * np.isin(columns['month'], WINTER_MONTHS) + 15 * (columns['day_of_week'] == 0)
+        amount = np.maximum(0, base + rng.normal(0, 12, rows))
+        return pd.DataFrame({
+            **columns,
+            'unemployment_rate': rng.uniform(3, 8, rows).astype(np.float32),
+            'economic_index': rng.uniform(80, 120, rows).astype(np.float32),
+            'demand_amount': amount.astype(np.float32)
+        })
+
+    def _spoilage(self, rng):
+        n = self.spoilage_samples
+        temperature = rng.uniform(-2, 10, n)  # Refrigerator temperature
+        humidity = rng.uniform(30, 80, n)
+        days_stored = rng.integers(1, 14, n)
+        food_type = rng.integers(0, 4, n)  # Different food categories
+
+        # Spoilage probability based on conditions
+        probability = 0.1 + 0.3 * (temperature > 4) + 0.2 * (humidity > 70) + 0.4 * (days_stored > 7)
+        return pd.DataFrame({
+            'temperature': temperature.astype(np.float32),
+            'humidity': humidity.astype(np.float32),
+            'days_stored': days_stored.astype(np.int8),
+            'food_type': food_type.astype(np.int8),
+            'is_spoiled': (rng.random(n) < probability).astype(np.int8)
+        })
+
+
+class FileDataSource:
+    """Real training history read from Parquet or CSV files, one per frame.
+
+    ``paths`` maps frame names ('donation', 'demand', 'spoilage') to files.
+    When ``columns`` lists the columns each frame needs, only those (plus
+    ``date``, from which missing calendar features are derived) are read
+    and a file lacking one raises ValueError. Files are read in chunks of
+    ``chunksize`` rows through memory-mapped I/O and downcast chunk by
+    chunk, so peak memory stays close to the size of the final frame.
+    """
+
+    def __init__(self, paths, columns=None, chunksize=CHUNK_ROWS):
+        self.paths = dict(paths)
+        self.columns = columns or {}
+        self.chunksize = chunksize
+
+    @classmethod
+    def from_directory(cls, directory, columns=None, chunksize=CHUNK_ROWS):
+        """Use ``<frame>.parquet`` (preferred) or ``<frame>.csv`` from ``directory``"""
+        paths = {}
+        for name in FRAME_NAMES:
+            for extension in ('.parquet', '.csv'):
+                path = os.path.join(directory, name + extension)
+                if os.path.exists(path):
+                    paths[name] = path
+                    break
+            else:
+                raise ValueError(f"No {name}.parquet or {name}.csv in {directory}")
+        return cls(paths, columns, chunksize)
+
+    def load(self):
+        return {name: self.read(name) for name in self.paths}
+
+    def read(self, name):
+        path = self.paths[name]
+        required = self.columns.get(name)
+        if path.endswith('.parquet'):
+            chunks = self._parquet_chunks(path, required)
+        else:
+            chunks = self._csv_chunks(path, required)
+
+        frames = []
+        for chunk in chunks:
+            chunk = add_calendar_features(chunk)
+            if required is not None:
+                missing = [column for column in required if column not in chunk]
+                if missing:
+                    raise ValueError(f"{path} is missing columns {missing}")
+                chunk = chunk[required + (['date'] if 'date' in chunk else [])]
+            frames.append(downcast(chunk))
+        if not frames:
+            raise ValueError(f"{path} contains no rows")
+        return pd.concat(frames, ignore_index=True)
+
+    def _wanted(self, available, required):
+        # Columns to read: the required ones plus the date they may be derived from
+        if required is None:
+            return None
+        return [column for column in available if column in required or column == 'date']
+
+    def _csv_chunks(self, path, required):
+        header = pd.read_csv(path, nrows=0).columns
+        return pd.read_csv(path, usecols=self._wanted(header, required), chunksize=self.chunksize,
+                           memory_map=True)
+
+    def _parquet_chunks(self, path, required):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet training data requires pyarrow to be installed")
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        columns = self._wanted(parquet_file.schema_arrow.names, required)
+        for batch in parquet_file.iter_batches(batch_size=self.chunksize, columns=columns):
+            yield batch.to_pandas()
+
+
+def default_data_source(seed=42, columns=None):
+    """Files from SMARTCARE_TRAINING_DATA when set, synthetic data otherwise"""
+    if TRAINING_DATA_DIR:
+        return FileDataSource.from_directory(TRAINING_DATA_DIR, columns)
+    return SyntheticDataSource(seed)
@@ -0,0 +1,443 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Reward per unit delivered to a request, i.e. the cost of leaving it unmet
+URGENCY_REWARD = {'low': 100.0, 'medium': 200.0, 'high': 400.0}
+
+# Cost per unit and day of shelf life left, so food that expires soonest goes out first;
+# shelf life beyond the horizon makes no difference
+EXPIRY_COST_PER_DAY = 0.5
+EXPIRY_HORIZON_DAYS = 30
+
+# Travel time used to check that a donation arrives before it expires
+MINUTES_PER_KM = 2.5
+
+EPS = 1e-9
+
+SOURCE, SINK = 's', 't'
+
+
+class DonationMatcher:
+    """Allocates donations to NGO requests as an incremental min-cost flow.
+
+    The network is source -> donation (capacity = quantity) -> request
+    (same food type, reachable before expiry; cost = network distance plus
+    a shelf-life term) -> sink (capacity = quantity needed, cost = minus the
+    urgency reward), closed by a free sink -> source arc. A flow is optimal
+    when its residual graph has no negative cycle.
+
+    Every new donation or request can only create negative cycles through
+    itself, so each event runs successive shortest paths from the new node
+    and augments until no improving cycle remains. A new
+    donation can take over a request from an older one and pass that
+    donation on to someone else, so the plan stays globally optimal
+    without a full re-solve. The searches are Dijkstra on reduced costs,
+    warm-started from node potentials that carry over between events, and
+    never leave the event's food type, which keeps per-event cost
+    independent of the total number of events. Should the potentials ever
+    stop being valid (a negative reduced cost), they are recomputed from
+    scratch with Bellman-Ford and the search is repeated.
+    """
+
+    def __init__(self, graph_optimizer):
+        self.graph = graph_optimizer
+        self.donations = {}
+        self.requests = {}
+        # Compatible (donation, request) pairs and their unit cost
+        self.arcs_from = {}
+        self.arcs_to = {}
+        self.flow_from = {}
+        self.flow_to = {}
+        self._by_type = {}
+        self._ids = 0
+        self._lock = threading.RLock()
+        self.events = 0
+        self.augmentations = 0
+        self.potential_resets = 0
+        self.last_event_ms = 0.0
+
+    def _next_id(self, prefix):
+        self._ids += 1
+        return f"{prefix}_{self._ids}"
+
+    def _members(self, food_type):
+        if food_type not in self._by_type:
+            # Food types never share flow, so each has its own node potentials
+            self._by_type[food_type] = {'donations': set(), 'requests': set(),
+                                        'potentials': {SOURCE: 0.0, SINK: 0.0}}
+        return self._by_type[food_type]
+
+    def _resolve(self, location):
+        nodes, _ = self.graph.resolve_locations([location])
+        if nodes[0] is None:
+            raise ValueError(f"Unknown location: {location}")
+        return nodes[0]
+
+    def _minutes_left(self, donation, now=None):
+        expiry_date = donation['expiry_date']
+        return (expiry_date - (now or datetime.now(expiry_date.tzinfo))).total_seconds() / 60
+
+    def _connect(self, donation_id, request_id, km, now=None):
+        # Only pairs that can be delivered before the food expires get an arc
+        minutes_left = self._minutes_left(self.donations[donation_id], now)
+        if not np.isfinite(km) or minutes_left <= km * MINUTES_PER_KM:
+            return
+        cost = float(km) + EXPIRY_COST_PER_DAY * min(minutes_left / 1440, EXPIRY_HORIZON_DAYS)
+        self.arcs_from[donation_id][request_id] = cost
+        self.arcs_to[request_id][donation_id] = cost
+
+    # Events
+
+    def add_donation(self, donor_id, food_type, quantity, expiry_date, location, now=None):
+        """Add a donation and re-optimize; returns its id and allocations"""
+        with self._lock:
+            started = time.perf_counter()
+            node = self._resolve(location)
+            donation_id = self._next_id('donation')
+            food_type = food_type.strip().lower()
+            donation = {
+                'donation_id': donation_id, 'donor_id': donor_id, 'food_type': food_type,
+                'quantity': float(quantity), 'expiry_date': expiry_date, 'location': location,
+                'node': node, 'used': 0.0
+            }
+            self.donations[donation_id] = donation
+            self.flow_from[donation_id] = {}
+            self.arcs_from[donation_id] = {}
+
+            candidates = sorted(self._members(food_type)['requests'])
+            distances = self.graph.distances_from(donation['node'], [self.requests[r]['node'] for r in candidates])
+            for request_id, km in zip(candidates, distances):
+                self._connect(donation_id, request_id, km, now)
+            members = self._members(food_type)
+            members['donations'].add(donation_id)
+            # Keep reduced costs of the new arcs non-negative
+            potentials = members['potentials']
+            potentials[('d', donation_id)] = max(
+                (potentials[('r', r)] - cost for r, cost in self.arcs_from[donation_id].items()),
+                default=potentials[SOURCE])
+
+            self._place_donation(donation_id)
+            self._finish_event(started)
+            return {'donation_id': donation_id, 'allocations': self._allocations_of_donation(donation_id)}
+
+    def add_request(self, ngo_id, food_type, quantity_needed, urgency, location, now=None):
+        """Add an NGO request and re-optimize; returns its id and allocations"""
+        with self._lock:
+            started = time.perf_counter()
+            node = self._resolve(location)
+            request_id = self._next_id('request')
+            food_type = food_type.strip().lower()
+            request = {
+                'request_id': request_id, 'ngo_id': ngo_id, 'food_type': food_type,
+                'quantity_needed': float(quantity_needed), 'urgency': urgency, 'location': location,
+                'node': node, 'served': 0.0,
+                'reward': URGENCY_REWARD.get(urgency.strip().lower(), URGENCY_REWARD['medium'])
+            }
+            self.requests[request_id] = request
+            self.flow_to[request_id] = {}
+            self.arcs_to[request_id] = {}
+
+            candidates = sorted(self._members(food_type)['donations'])
+            # The graph is undirected, so one row from the request covers every donor
+            distances = self.graph.distances_from(request['node'], [self.donations[d]['node'] for d in candidates])
+            for donation_id, km in zip(candidates, distances):
+                self._connect(donation_id, request_id, km, now)
+            members = self._members(food_type)
+            members['requests'].add(request_id)
+            potentials = members['potentials']
+            potentials[('r', request_id)] = min(
+                (potentials[('d', d)] + cost for d, cost in self.arcs_to[request_id].items()),
+                default=potentials[SINK] + request['reward'])
+
+            self._fill_request(request_id)
+            self._finish_event(started)
+            return {'request_id': request_id, 'allocations': self._allocations_of_request(request_id)}
+
+    def remove_donation(self, donation_id):
+        """Withdraw a donation (collected, expired or cancelled) and re-serve its requests"""
+        with self._lock:
+            started = time.perf_counter()
+            donation = self.donations.pop(donation_id, None)
+            if donation is None:
+                raise KeyError(f"Donation {donation_id} not found")
+            affected = []
+            for request_id, amount in self.flow_from.pop(donation_id).items():
+                self.requests[request_id]['served'] -= amount
+                del self.flow_to[request_id][donation_id]
+                affected.append(request_id)
+            for request_id in self.arcs_from.pop(donation_id):
+                del self.arcs_to[request_id][donation_id]
+            members = self._members(donation['food_type'])
+            members['donations'].discard(donation_id)
+            del members['potentials'][('d', donation_id)]
+
+            for request_id in affected:
+                self._fill_request(request_id)
+            self._finish_event(started)
+
+    def remove_request(self, request_id):
+        """Withdraw a request (fulfilled or cancelled) and re-place its donations"""
+        with self._lock:
+            started = time.perf_counter()
+            request = self.requests.pop(request_id, None)
+            if request is None:
+                raise KeyError(f"Request {request_id} not found")
+            affected = []
+            for donation_id, amount in self.flow_to.pop(request_id).items():
+                self.donations[donation_id]['used'] -= amount
+                del self.flow_from[donation_id][request_id]
+                affected.append(donation_id)
+            for donation_id in self.arcs_to.pop(request_id):
+                del self.arcs_from[donation_id][request_id]
+            members = self._members(request['food_type'])
+            members['requests'].discard(request_id)
+            del members['potentials'][('r', request_id)]
+
+            for donation_id in affected:
+                self._place_donation(donation_id)
+            self._finish_event(started)
+
+    def expire(self, now=None):
+        """Remove donations whose expiry date has passed; returns their ids"""
+        with self._lock:
+            expired = [d for d, donation in self.donations.items() if self._minutes_left(donation, now) <= 0]
+            for donation_id in expired:
+                self.remove_donation(donation_id)
+            return expired
+
+    def _finish_event(self, started):
+        self.events += 1
+        self.last_event_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    # Successive shortest paths
+
+    def _place_donation(self, donation_id):
+        # Cycles through a donation with spare supply: source -> donation -> ... -> source
+        donation = self.donations[donation_id]
+        start = ('d', donation_id)
+        while donation['quantity'] - donation['used'] > EPS:
+            cost, path = self._shortest_path(start, SOURCE, donation['food_type'], closing_cost=0.0)
+            if cost >= -EPS:
+                break
+            amount = min([donation['quantity'] - donation['used']] + [cap for _, _, cap in path])
+            self._push(SOURCE, start, amount)
+            for u, v, _ in path:
+                self._push(u, v, amount)
+            self.augmentations += 1
+
+    def _fill_request(self, request_id):
+        # Cycles through a request with unmet demand: request -> sink -> ... -> request
+        request = self.requests[request_id]
+        goal = ('r', request_id)
+        while request['quantity_needed'] - request['served'] > EPS:
+            cost, path = self._shortest_path(SINK, goal, request['food_type'], closing_cost=-request['reward'])
+            if cost >= -EPS:
+                break
+            amount = min([request['quantity_needed'] - request['served']] + [cap for _, _, cap in path])
+            for u, v, _ in path:
+                self._push(u, v, amount)
+            self._push(goal, SINK, amount)
+            self.augmentations += 1
+
+    def _residual_arcs(self, node, food_type):
+        """(next node, unit cost, capacity) for every residual arc leaving ``node``"""
+        if node == SOURCE:
+            for donation_id in self._members(food_type)['donations']:
+                donation = self.donations[donation_id]
+                if donation['quantity'] - donation['used'] > EPS:
+                    yield ('d', donation_id), 0.0, donation['quantity'] - donation['used']
+        elif node == SINK:
+            yield SOURCE, 0.0, float('inf')
+            # Un-serving a request of another food type never helps this one
+            for request_id in self._members(food_type)['requests']:
+                request = self.requests[request_id]
+                if request['served'] > EPS:
+                    yield ('r', request_id), request['reward'], request['served']
+        elif node[0] == 'd':
+            donation_id = node[1]
+            for request_id, cost in self.arcs_from[donation_id].items():
+                yield ('r', request_id), cost, float('inf')
+            if self.donations[donation_id]['used'] > EPS:
+                yield SOURCE, 0.0, self.donations[donation_id]['used']
+        else:
+            request_id = node[1]
+            request = self.requests[request_id]
+            for donation_id, amount in self.flow_to[request_id].items():
+                yield ('d', donation_id), -self.arcs_to[request_id][donation_id], amount
+            if request['quantity_needed'] - request['served'] > EPS:
+                yield SINK, -request['reward'], request['quantity_needed'] - request['served']
+
+    def _reset_potentials(self, food_type, start):
+        """Recompute the food type's potentials as Bellman-Ford distances from a virtual root.
+
+        Arcs into ``start`` are left out, as in the search: the event's own
+        cycles are the ones still being cancelled. Any other negative cycle
+        means the flow is no longer optimal, which is a bug, not noise.
+        """
+        members = self._members(food_type)
+        nodes = [SOURCE, SINK] + [('d', d) for d in members['donations']] + [('r', r) for r in members['requests']]
+        arcs = [(node, target, cost) for node in nodes
+                for target, cost, capacity in self._residual_arcs(node, food_type)
+                if capacity > EPS and target != start]
+        dist = dict.fromkeys(nodes, 0.0)
+        for _ in range(len(nodes)):
+            changed = False
+            for node, target, cost in arcs:
+                if dist[node] + cost < dist[target] - EPS:
+                    dist[target] = dist[node] + cost
+                    changed = True
+            if not changed:
+                break
+        else:
+            raise RuntimeError(f"Residual graph of {food_type} has a negative cycle; the plan is not optimal")
+        members['potentials'].clear()
+        members['potentials'].update(dist)
+        self.potential_resets += 1
+        print(f"Recomputed matching potentials for {food_type} ({len(nodes)} nodes)")
+
+    def _shortest_path(self, start, goal, food_type, closing_cost, reset=False):
+        """Cheapest residual path start -> goal; returns (cycle cost, path).
+
+        The cycle is closed by the event's own arc goal -> start of cost
+        ``closing_cost``. Dijkstra runs on costs reduced by the food type's
+        node potentials, which every earlier event left valid, and stops as
+        soon as ``goal`` is settled. The potentials are then updated so the
+        new residual arcs (and the closing arc, if it stays open) keep
+        non-negative reduced costs for the next search. A negative reduced
+        cost beyond rounding noise triggers one ``_reset_potentials`` and a
+        fresh search.
+        """
+        potentials = self._members(food_type)['potentials']
+        dist = {start: 0.0}
+        parent = {}
+        settled = {}
+        heap = [(0.0, 0, start)]
+        tie = 1
+        while heap:
+            d, _, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled[node] = d
+            if node == goal:
+                break
+            base = potentials[node]
+            for target, cost, capacity in self._residual_arcs(node, food_type):
+                # Arcs into the start belong to the cycle being closed
+                if capacity <= EPS or target == start or target in settled:
+                    continue
+                reduced = cost + base - potentials[target]
+                # Valid potentials keep reduced costs non-negative; only rounding noise (relative to
+                # potentials that accumulate over many events) is absorbed
+                if reduced < -EPS * (1 + abs(base) + abs(cost)):
+                    if reset:
+                        raise RuntimeError(f"Negative reduced cost {reduced} on {node} -> {target} "
+                                           f"after recomputing potentials")
+                    self._reset_potentials(food_type, start)
+                    return self._shortest_path(start, goal, food_type, closing_cost, reset=True)
+                candidate = d + max(reduced, 0.0)
+                if candidate < dist.get(target, float('inf')) - EPS:
+                    dist[target] = candidate
+                    parent[target] = (node, capacity)
+                    heapq.heappush(heap, (candidate, tie, target))
+                    tie += 1
+
+        if goal in settled:
+            reached = settled[goal]
+            cycle_cost = reached + potentials[goal] - potentials[start] + closing_cost
+            for node in potentials:
+                potentials[node] += min(settled.get(node, reached), reached)
+            path = []
+            node = goal
+            while node != start:
+                previous, capacity = parent[node]
+                path.append((previous, node, capacity))
+                node = previous
+            return cycle_cost, path[::-1]
+
+        # Goal unreachable: no residual arc leaves the settled set, so shifting
+        # it down keeps every reduced cost valid, including the closing arc's
+        furthest = max(settled.values())
+        shift = max(potentials[start] - potentials[goal] - closing_cost, 0.0)
+        for node, d in settled.items():
+            potentials[node] += d - furthest - shift
+        return float('inf'), []
+
+    def _push(self, u, v, amount):
+        """Send ``amount`` along residual arc u -> v"""
+        if u == SOURCE:
+            self.donations[v[1]]['used'] += amount
+        elif u == SINK:
+            if v != SOURCE:
+                self.requests[v[1]]['served'] -= amount
+        elif v == SOURCE:
+            self.donations[u[1]]['used'] -= amount
+        elif v == SINK:
+            self.requests[u[1]]['served'] += amount
+        elif u[0] == 'd':
+            self._add_flow(u[1], v[1], amount)
+        else:
+            self._add_flow(v[1], u[1], -amount)
+
+    def _add_flow(self, donation_id, request_id, amount):
+        flow = self.flow_from[donation_id].get(request_id, 0.0) + amount
+        if flow > EPS:
+            self.flow_from[donation_id][request_id] = flow
+            self.flow_to[request_id][donation_id] = flow
+        else:
+            self.flow_from[donation_id].pop(request_id, None)
+            self.flow_to[request_id].pop(donation_id, None)
+
+    # Reporting
+
+    def _allocation(self, donation_id, request_id, amount):
+        donation, request = self.donations[donation_id], self.requests[request_id]
+        return {
+            'donation_id': donation_id,
+            'request_id': request_id,
+            'donor_id': donation['donor_id'],
+            'ngo_id': request['ngo_id'],
+            'food_type': donation['food_type'],
+            'quantity': round(amount, 2),
+            'from': donation['node'],
+            'to': request['node'],
+            'unit_cost': round(self.arcs_from[donation_id][request_id], 2)
+        }
+
+    def _allocations_of_donation(self, donation_id):
+        return [self._allocation(donation_id, r, amount) for r, amount in self.flow_from[donation_id].items()]
+
+    def _allocations_of_request(self, request_id):
+        return [self._allocation(d, request_id, amount) for d, amount in self.flow_to[request_id].items()]
+
+    def plan(self):
+        """Current allocation plan with unmet demand and unused supply"""
+        with self._lock:
+            allocations = [self._allocation(d, r, amount)
+                           for d, flows in self.flow_from.items() for r, amount in flows.items()]
+            unmet = [{'request_id': r, 'ngo_id': req['ngo_id'], 'food_type': req['food_type'],
+                      'urgency': req['urgency'], 'unmet': round(req['quantity_needed'] - req['served'], 2)}
+                     for r, req in self.requests.items() if req['quantity_needed'] - req['served'] > EPS]
+            unused = [{'donation_id': d, 'donor_id': don['donor_id'], 'food_type': don['food_type'],
+                       'expiry_date': don['expiry_date'], 'unused': round(don['quantity'] - don['used'], 2)}
+                      for d, don in self.donations.items() if don['quantity'] - don['used'] > EPS]
+            return {
+                'allocations': allocations,
+                'unmet_requests': unmet,
+                'unused_donations': unused,
+                'total_allocated': round(sum(a['quantity'] for a in allocations), 2),
+                'total_cost': round(sum(a['quantity'] * a['unit_cost'] for a in allocations), 2)
+            }
+
+    def stats(self):
+        return {
+            'donations': len(self.donations),
+            'requests': len(self.requests),
+            'events': self.events,
+            'augmentations': self.augmentations,
+            'potential_resets': self.potential_resets,
+            'last_event_ms': self.last_event_ms
+        }
@@ -0,0 +1,102 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def make_windows(values, seq_length, groups=None):
+    """Inputs and targets for next-value prediction: every ``seq_length`` run and the value after it.
+
+    The windows are a zero-copy strided view of ``values``. With ``groups``
+    (one label per value, each group contiguous) windows that would span two
+    groups are dropped, which does copy the remaining ones.
+    """
+    values = np.asarray(values)
+    windows = sliding_window_view(values, seq_length)[:-1]
+    targets = values[seq_length:]
+    if groups is not None:
+        groups = np.asarray(groups)
+        same_group = groups[:-seq_length] == groups[seq_length:]
+        if not same_group.all():
+            windows, targets = windows[same_group], targets[same_group]
+    return windows, targets
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def _lstm_layer(inputs, kernel, recurrent_kernel, bias, return_sequences):
+    # Keras gate layout: input, forget, cell, output
+    batch, steps, _ = inputs.shape
+    units = recurrent_kernel.shape[0]
+    h = np.zeros((batch, units), dtype=np.float32)
+    c = np.zeros((batch, units), dtype=np.float32)
+    projected = inputs @ kernel + bias
+    outputs = []
+    for t in range(steps):
+        z = projected[:, t] + h @ recurrent_kernel
+        i, f, g, o = np.split(z, 4, axis=1)
+        c = _sigmoid(f) * c + _sigmoid(i) * np.tanh(g)
+        h = _sigmoid(o) * np.tanh(c)
+        if return_sequences:
+            outputs.append(h)
+    return np.stack(outputs, axis=1) if return_sequences else h
+
+
+class LSTMForecaster:
+    """NumPy re-implementation of the trained donation LSTM's forward pass.
+
+    Holds the exported weights of the stacked LSTM layers and the dense
+    head (dropout is a no-op at inference), plus the scaling applied to the
+    series during training and the last ``seq_length`` observed values, so
+    serving needs neither TensorFlow nor the training data.
+    """
+
+    def __init__(self, lstm_layers, dense_layers, seq_length, mean=0.0, std=1.0, history=None):
+        self.lstm_layers = [tuple(np.asarray(w, dtype=np.float32) for w in layer) for layer in lstm_layers]
+        self.dense_layers = [tuple(np.asarray(w, dtype=np.float32) for w in layer) for layer in dense_layers]
+        self.seq_length = seq_length
+        self.mean = float(mean)
+        self.std = float(std)
+        self.history = None if history is None else np.asarray(history, dtype=np.float32)
+
+    @classmethod
+    def from_stored(cls, stored):
+        return cls(stored['lstm_layers'], stored['dense_layers'], stored['seq_length'],
+                   stored['mean'], stored['std'], stored.get('history'))
+
+    def to_stored(self):
+        return {
+            'lstm_layers': self.lstm_layers,
+            'dense_layers': self.dense_layers,
+            'seq_length': self.seq_length,
+            'mean': self.mean,
+            'std': self.std,
+            'history': self.history
+        }
+
+    def predict(self, windows):
+        """Next value after each window; ``windows`` is (n, seq_length) in original units"""
+        x = ((np.asarray(windows, dtype=np.float32) - self.mean) / self.std)[:, :, None]
+        for k, (kernel, recurrent_kernel, bias) in enumerate(self.lstm_layers):
+            x = _lstm_layer(x, kernel, recurrent_kernel, bias, return_sequences=k < len(self.lstm_layers) - 1)
+        for weights, bias in self.dense_layers:
+            x = x @ weights + bias
+        return x[:, 0] * self.std + self.mean
+
+    def forecast(self, horizon, history=None):
+        """Forecast ``horizon`` steps ahead by feeding predictions back in.
+
+        ``history`` holds the most recent observations (1-D, or one row per
+        series); defaults to the end of the training series. Returns an
+        array of shape (horizon,) or (series, horizon) to match.
+        """
+        history = self.history if history is None else np.asarray(history, dtype=np.float32)
+        if history is None or history.shape[-1] < self.seq_length:
+            raise ValueError(f"At least {self.seq_length} recent values are needed for an LSTM forecast")
+
+        window = np.atleast_2d(history)[:, -self.seq_length:]
+        predictions = np.empty((len(window), horizon), dtype=np.float32)
+        for step in range(horizon):
+            predictions[:, step] = self.predict(window)
+            window = np.column_stack((window[:, 1:], predictions[:, step]))
+        return predictions[0] if history.ndim == 1 else predictions
@@ -0,0 +1,120 @@
+"""Offline training for the donation LSTM.
+
+Run ``python lstm_training.py`` where TensorFlow is installed to (re)train
+the LSTM and save its exported weights to the model store; API workers
+then serve forecasts with the NumPy LSTMForecaster and never import
+TensorFlow.
+"""
+import os
+
+import numpy as np
+
+from lstm_forecaster import LSTMForecaster, make_windows
+
+# Epoch limit when fine-tuning a trained LSTM on newly arrived data
+FINE_TUNE_EPOCHS = 5
+
+
+def _import_keras():
+    try:
+        from tensorflow import keras
+    except ImportError:
+        raise ImportError("TensorFlow is required to train the LSTM; "
+                          "run `python lstm_training.py` where it is installed")
+    return keras
+
+
+def build_model(seq_length, units):
+    """Build and compile the LSTM architecture"""
+    keras = _import_keras()
+    model = keras.models.Sequential([
+        keras.layers.LSTM(units, return_sequences=True, input_shape=(seq_length, 1)),
+        keras.layers.Dropout(0.2),
+        keras.layers.LSTM(units, return_sequences=False),
+        keras.layers.Dropout(0.2),
+        keras.layers.Dense(25),
+        keras.layers.Dense(1)
+    ])
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+
+def export_model(model, seq_length, mean, std, history):
+    """Copy a trained Keras model's weights into an LSTMForecaster"""
+    keras = _import_keras()
+    lstm_layers = [layer.get_weights() for layer in model.layers if isinstance(layer, keras.layers.LSTM)]
+    dense_layers = [layer.get_weights() for layer in model.layers if isinstance(layer, keras.layers.Dense)]
+    return LSTMForecaster(lstm_layers, dense_layers, seq_length, mean, std, history)
+
+
+def load_weights(model, forecaster):
+    """Copy an LSTMForecaster's weights back into a Keras model built by build_model"""
+    keras = _import_keras()
+    lstm_layers, dense_layers = iter(forecaster.lstm_layers), iter(forecaster.dense_layers)
+    for layer in model.layers:
+        if isinstance(layer, keras.layers.LSTM):
+            layer.set_weights(list(next(lstm_layers)))
+        elif isinstance(layer, keras.layers.Dense):
+            layer.set_weights(list(next(dense_layers)))
+
+
+def train_lstm(df, params, checkpoint_path=None, initial=None):
+    """Fit the LSTM on the donation series and export it; returns (forecaster, metrics).
+
+    Training stops once validation loss has not improved for
+    ``params['patience']`` epochs and keeps the best weights. With
+    ``checkpoint_path`` the best weights so far are saved after every
+    improving epoch and an interrupted run resumes from them. With
+    ``initial`` (the previously trained LSTMForecaster) training starts
+    from its weights and scaling and runs at most FINE_TUNE_EPOCHS epochs.
+    """
+    keras = _import_keras()
+    seq_length = params['seq_length']
+
+    order = [column for column in ('series_id', 'date') if column in df]
+    if order:
+        df = df.sort_values(order, kind='stable')
+    values = df['donation_amount'].to_numpy(dtype=np.float32)
+    groups = df['series_id'].to_numpy() if 'series_id' in df else None
+    if initial is not None:
+        mean, std = initial.mean, initial.std
+    else:
+        mean, std = float(values.mean()), float(values.std()) or 1.0
+
+    windows, targets = make_windows(values, seq_length, groups)
+    train_size = int(len(windows) * 0.8)
+    X_train = ((windows[:train_size] - mean) / std)[:, :, None]
+    y_train = (targets[:train_size] - mean) / std
+
+    model = build_model(seq_length, params['units'])
+    epochs = params['epochs']
+    if initial is not None:
+        load_weights(model, initial)
+        epochs = min(epochs, FINE_TUNE_EPOCHS)
+    callbacks = [keras.callbacks.EarlyStopping(monitor='val_loss', patience=params['patience'],
+                                               restore_best_weights=True)]
+    if checkpoint_path is not None:
+        os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+        if os.path.exists(checkpoint_path):
+            print(f"Resuming LSTM training from {checkpoint_path}")
+            model.load_weights(checkpoint_path)
+        callbacks.append(keras.callbacks.ModelCheckpoint(checkpoint_path, monitor='val_loss',
+                                                         save_best_only=True, save_weights_only=True))
+
+    history = model.fit(X_train, y_train, batch_size=params['batch_size'], epochs=epochs,
+                        validation_split=0.1, callbacks=callbacks, verbose=0)
+
+    last_series = values if groups is None else values[groups == groups[-1]]
+    forecaster = export_model(model, seq_length, mean, std, last_series[-seq_length:])
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    # Scored with the exported forecaster, i.e. exactly what is served
+    test_mse = float(np.mean((forecaster.predict(windows[train_size:]) - targets[train_size:]) ** 2))
+    print(f"LSTM model trained in {len(history.history['loss'])} epochs, test MSE {test_mse:.2f}")
+    return forecaster, {'test_mse': round(test_mse, 4), 'epochs': len(history.history['loss'])}
+
+
+if __name__ == "__main__":
+    from ml_models import MLModelManager
+    MLModelManager().retrain('lstm')
@@ -1,14 +1,29 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from typing import List, Dict, Optional
 import asyncio
 import json
+import multiprocessing
+import os
 import random
 from datetime import datetime, timedelta
+from functools import partial
 import uvicorn
-from ml_models import MLModelManager
+import networkx as nx
+from ml_models import MLModelManager, FORECAST_HORIZONS
 from graph_algorithms import GraphOptimizer
+from donation_matching import DonationMatcher
+from columnar import ColumnarFormatError, decode_columns, encode_columns, media_type
+from timeseries_store import SensorTimeSeriesStore
+from sensor_ingest import IngestQueueFull, SensorIngestPipeline, ndjson_chunks
+from sensor_alerts import SensorAlertMonitor
+from realtime_hub import PubSubHub
+from task_executor import ClientDisconnected, TaskExecutor, TaskTimeout
+from result_cache import ResultCache, cached_response
+from spatial_index import parse_coordinates
+from metrics import REGISTRY, MetricsMiddleware
+from profiler import PROFILE_ENABLED, SamplingProfiler
 
 app = FastAPI(title="SmartCare Food Bank API", version="1.0.0")
 
@@ -21,9 +36,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize ML models and graph optimizer
-ml_manager = MLModelManager()
+# Request metrics for /metrics; the profiler (off unless SMARTCARE_PROFILE=1 or
+# switched on at /api/debug/profiler) dumps stacks of requests slower than slow_ms
+profiler = SamplingProfiler()
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+
+# Initialize ML models and graph optimizer. The model version is shared with process-pool
+# workers (SMARTCARE_ML_EXECUTOR=process), which own the served models in that mode
+ml_version = multiprocessing.Value("q", 0)
+ml_manager = MLModelManager(shared_version=ml_version)
 graph_optimizer = GraphOptimizer()
+donation_matcher = DonationMatcher(graph_optimizer)
+
+# CPU-bound ML and graph calls run on worker pools, never on the event loop
+executor = TaskExecutor()
+executor.register("ml", ml_manager, factory=partial(MLModelManager, shared_version=ml_version), isolated=True)
+executor.register("graph", graph_optimizer)
+executor.register("matching", donation_matcher)
+
+# Load ML models in the background at startup (set to 0 to load them on first use)
+WARM_UP_MODELS = os.environ.get("SMARTCARE_WARM_UP", "1") != "0"
+
+# Shared cache for the endpoints the dashboard polls
+result_cache = ResultCache(max_entries=512)
+CACHE_TTL = {"overview": 30, "donations": 60, "demand": 60, "routes": 120}
+
+async def offload(request: Optional[Request], target: str, method: str, *args, **kwargs):
+    # Run a blocking call on the executor, cancelling it if the client disconnects
+    # (pass request=None for computations shared between requests)
+    try:
+        return await executor.run(target, method, *args, request=request, **kwargs)
+    except TaskTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ClientDisconnected as e:
+        raise HTTPException(status_code=499, detail=str(e))
 
 # Data models
 class SensorData(BaseModel):
@@ -33,6 +79,11 @@ class SensorData(BaseModel):
     weight: float
     timestamp: datetime
 
+class SensorRegistration(BaseModel):
+    sensor_id: str
+    food_type: int = 0
+    stocked_at: Optional[datetime] = None
+
 class DonationData(BaseModel):
     donor_id: str
     food_type: str
@@ -47,29 +98,71 @@ class NGORequest(BaseModel):
     urgency: str
     location: str
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+class Vehicle(BaseModel):
+    vehicle_id: str
+    vehicle_type: str
+    capacity: float
+    role: str = "any"
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+class LoadingItem(BaseModel):
+    item_id: Optional[str] = None
+    food_type: str
+    weight: float
+    value: float
+    urgency: str = "medium"
+    spoilage_risk: Optional[float] = None
+    # Storage conditions, used to score spoilage_risk when it is not given
+    temperature: Optional[float] = None
+    humidity: Optional[float] = None
+    days_stored: Optional[int] = None
+    food_category: Optional[int] = None
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+class LoadingRequest(BaseModel):
+    items: List[LoadingItem]
+    vehicles: List[Vehicle]
+    time_budget: float = 0.5
+    # Weights are rounded up to multiples of this for the exact knapsack
+    weight_resolution: float = 1.0
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                pass
+class TrafficUpdate(BaseModel):
+    source: str
+    target: str
+    traffic_factor: Optional[float] = None
+    closed: Optional[bool] = None
 
-manager = ConnectionManager()
+class SpatialQuery(BaseModel):
+    # Query points as parallel coordinate columns and/or location strings
+    lat: List[float] = []
+    lon: List[float] = []
+    locations: List[str] = []
+    node_type: Optional[str] = None
+    k: int = 1
+    radius_km: float = 5.0
+
+class FleetRouteRequest(BaseModel):
+    vehicles: Optional[List[Vehicle]] = None
+    depot: str = "central_hub"
+    time_budget: float = 1.0
+
+class ProfilerSettings(BaseModel):
+    enabled: bool
+    slow_ms: Optional[float] = None
+
+# WebSocket pub/sub hub: one producer per topic, fanned out to all subscribers
+manager = PubSubHub()
+
+async def score_sensor_spoilage(temperature, humidity, days_stored, food_type):
+    # Micro-batches of changed sensors from the alert monitor, scored by the spoilage model
+    return await executor.run("ml", "predict_spoilage_batch", temperature, humidity, days_stored, food_type)
+
+# Anomaly and spoilage state per sensor; only transitions reach "alerts" subscribers
+alert_monitor = SensorAlertMonitor(
+    score=score_sensor_spoilage,
+    on_alert=lambda alert: manager.publish("alerts", alert, key_field="alert_id"))
 
 # Mock data storage (in production, use proper database)
-sensor_readings = []
+sensor_store = SensorTimeSeriesStore()
+ingest_pipeline = SensorIngestPipeline(sensor_store, monitor=alert_monitor)
 donations = []
 ngo_requests = []
 inventory = {}
@@ -82,17 +175,63 @@ def generate_mock_sensor_data():
         "humidity": round(random.uniform(40, 60), 2),
         "weight": round(random.uniform(10, 100), 2),
         "timestamp": datetime.now().isoformat(),
-        "location": random.choice(["Storage A", "Storage B", "Storage C"]),
-        "food_quality": random.choice(["Fresh", "Good", "Warning", "Critical"])
+        "location": random.choice(["Storage A", "Storage B", "Storage C"])
     }
 
+SENSOR_BROADCAST_INTERVAL = 5
+
+def produce_sensor_updates():
+    # Single shared producer for the "sensors" topic
+    readings = [generate_mock_sensor_data()]
+    record_sensor_readings(readings)
+    return readings
+
+# Component counters exported on /metrics, read at scrape time
+REGISTRY.register_stats("smartcare_ws", manager.stats, "Websocket hub",
+                        counters=("published", "sent", "dropped", "coalesced", "disconnected_slow", "send_errors"))
+REGISTRY.register_stats("smartcare_executor", executor.stats, "Task executor",
+                        counters=("completed", "timed_out", "cancelled"))
+REGISTRY.register_stats("smartcare_result_cache", result_cache.stats, "Result cache",
+                        counters=("hits", "misses", "coalesced", "evictions"))
+REGISTRY.register_stats("smartcare_ingest", ingest_pipeline.stats, "Sensor ingest",
+                        counters=("accepted", "rejected", "written"))
+REGISTRY.register_stats("smartcare_sensor_alerts", alert_monitor.stats, "Sensor alerts",
+                        counters=("readings", "scored", "alerts"))
+REGISTRY.register_stats("smartcare_sensor_store", sensor_store.stats, "Sensor time-series store",
+                        counters=("total_readings",))
+
+@app.on_event("startup")
+async def start_background_tasks():
+    if PROFILE_ENABLED:
+        profiler.start()
+    ingest_pipeline.start()
+    alert_monitor.start()
+    manager.start_producer("sensors", produce_sensor_updates, SENSOR_BROADCAST_INTERVAL)
+    # Models load in the background; "/", sensor and analytics endpoints serve right away
+    if WARM_UP_MODELS:
+        executor.warm_up("ml", "warm_up")
+    else:
+        executor.warm_up()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await ingest_pipeline.stop()
+    await alert_monitor.stop()
+    await manager.stop()
+    executor.shutdown()
+    profiler.stop()
+
 # API endpoints
 @app.get("/")
 async def root():
     return {"message": "SmartCare Food Bank API is running"}
 
 @app.get("/api/dashboard/overview")
-async def get_dashboard_overview():
+async def get_dashboard_overview(request: Request):
+    return await cached_response(result_cache, request, "overview", (), len(donations),
+                                 compute_dashboard_overview, CACHE_TTL["overview"])
+
+async def compute_dashboard_overview():
     # Generate real-time statistics
     total_donations = len(donations) + random.randint(150, 200)
     total_distributed = random.randint(120, 180)
@@ -108,31 +247,342 @@ async def get_dashboard_overview():
         "efficiency_improvement": round(random.uniform(35, 45), 1)
     }
 
+def to_epoch(timestamp):
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return datetime.fromisoformat(timestamp).timestamp()
+
+def record_sensor_readings(readings: List[Dict]):
+    # Store readings column-wise in the time-series store and feed the alert monitor
+    sensor_ids = [r["sensor_id"] for r in readings]
+    timestamps = [to_epoch(r["timestamp"]) for r in readings]
+    values = {field: [r[field] for r in readings] for field in sensor_store.fields}
+    sensor_store.append_many(sensor_ids, timestamps, values)
+    alert_monitor.update(sensor_ids, timestamps, values)
+    for reading in readings:
+        reading["food_quality"] = alert_monitor.food_quality(reading["sensor_id"])
+
 @app.get("/api/sensor/realtime")
 async def get_realtime_sensor_data():
     # Generate multiple sensor readings
     sensors = []
     for i in range(6):
         sensors.append(generate_mock_sensor_data())
+    record_sensor_readings(sensors)
     return {"sensors": sensors}
 
+sensor_batch_adapter = TypeAdapter(List[SensorData])
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+NDJSON_CHUNK_LINES = 5000
+
+def sensor_batch_columns(payload: bytes):
+    # Validate a JSON array of readings in one pydantic-core call and return it column-wise
+    readings = sensor_batch_adapter.validate_json(payload)
+    return {
+        "sensor_id": [r.sensor_id for r in readings],
+        "timestamp": [r.timestamp.timestamp() for r in readings],
+        "temperature": [r.temperature for r in readings],
+        "humidity": [r.humidity for r in readings],
+        "weight": [r.weight for r in readings]
+    }
+
+@app.post("/api/sensor/ingest", status_code=202)
+async def ingest_sensor_readings(request: Request):
+    # Batched ingest: a JSON array of SensorData, or an NDJSON stream validated in chunks
+    accepted = 0
+    try:
+        if media_type(request.headers.get("content-type")) in NDJSON_CONTENT_TYPES:
+            async for chunk in ndjson_chunks(request.stream(), NDJSON_CHUNK_LINES):
+                accepted += await ingest_pipeline.submit(await asyncio.to_thread(sensor_batch_columns, chunk))
+        else:
+            # Validation touches no shared state, so a large body is parsed off the event loop
+            body = await request.body()
+            accepted += await ingest_pipeline.submit(await asyncio.to_thread(sensor_batch_columns, body))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail={"accepted": accepted, "errors": e.errors(include_url=False)[:20]})
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=503, detail={"accepted": accepted, "error": str(e)},
+                            headers={"Retry-After": "1"})
+    
+    return {"accepted": accepted}
+
+@app.get("/api/sensor/ingest/stats")
+async def get_ingest_stats():
+    return ingest_pipeline.stats()
+
+@app.get("/api/sensor/alerts")
+async def get_sensor_alerts():
+    # Sensors currently anomalous or at Medium/High spoilage risk
+    return {"alerts": alert_monitor.active_alerts(), "stats": alert_monitor.stats()}
+
+@app.get("/api/sensor/alerts/{sensor_id}")
+async def get_sensor_alert_state(sensor_id: str):
+    state = alert_monitor.state(sensor_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"No readings from sensor {sensor_id}")
+    return state
+
+@app.post("/api/sensor/register")
+async def register_sensor(registration: SensorRegistration):
+    # What a sensor's compartment holds and since when, for spoilage scoring
+    stocked_at = registration.stocked_at.timestamp() if registration.stocked_at else None
+    alert_monitor.register_sensor(registration.sensor_id, registration.food_type, stocked_at)
+    return alert_monitor.state(registration.sensor_id)
+
+@app.get("/api/sensor/history/{sensor_id}")
+async def get_sensor_history(sensor_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                             step: Optional[int] = None):
+    # Raw points (no step) or min/max/mean buckets of `step` seconds, served from rollups
+    end = end or datetime.now()
+    start = start or end - timedelta(hours=1)
+    if step is not None and step <= 0:
+        raise HTTPException(status_code=400, detail="step must be a positive number of seconds")
+    
+    try:
+        history = sensor_store.query(sensor_id, start.timestamp(), end.timestamp(), step)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if history is None:
+        raise HTTPException(status_code=404, detail=f"No readings for sensor {sensor_id}")
+    return {"sensor_id": sensor_id, **history}
+
+def validate_horizon(horizon: int):
+    if horizon not in FORECAST_HORIZONS:
+        raise HTTPException(status_code=400, detail=f"horizon must be one of {list(FORECAST_HORIZONS)}")
+
 @app.get("/api/predictions/donations")
-async def get_donation_predictions():
-    # Use ML model for predictions
-    predictions = ml_manager.predict_donations()
-    return {"predictions": predictions}
+async def get_donation_predictions(request: Request, horizon: int = 7, locations: Optional[List[str]] = Query(None)):
+    # Use ML model for predictions (whole horizon x locations scored in one batch)
+    validate_horizon(horizon)
+    
+    async def compute():
+        return {"predictions": await offload(None, "ml", "predict_donations", horizon, locations)}
+    
+    params = (horizon, tuple(sorted(locations or ())))
+    return await cached_response(result_cache, request, "donations", params, ml_manager.model_version,
+                                 compute, CACHE_TTL["donations"])
+
+@app.get("/api/predictions/donations/lstm")
+async def get_lstm_donation_forecast(request: Request, horizon: int = 7, history: Optional[List[float]] = Query(None)):
+    # Served by the exported NumPy forecaster; training happens offline (lstm_training.py)
+    validate_horizon(horizon)
+    try:
+        forecast = await offload(request, "ml", "forecast_donations_lstm", horizon, history)
+    except ImportError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"forecast": forecast, "model": "lstm"}
 
 @app.get("/api/predictions/demand")
-async def get_demand_forecast():
-    # Use ML model for demand forecasting
-    forecast = ml_manager.predict_demand()
-    return {"forecast": forecast}
+async def get_demand_forecast(request: Request, horizon: int = 7, food_types: Optional[List[str]] = Query(None)):
+    # Use ML model for demand forecasting (whole horizon x food types scored in one batch)
+    validate_horizon(horizon)
+    
+    async def compute():
+        return {"forecast": await offload(None, "ml", "predict_demand", horizon, food_types)}
+    
+    params = (horizon, tuple(sorted(food_types or ())))
+    return await cached_response(result_cache, request, "demand", params, ml_manager.model_version,
+                                 compute, CACHE_TTL["demand"])
+
+SPOILAGE_COLUMNS = ['temperature', 'humidity', 'days_stored', 'food_type']
+
+@app.post("/api/spoilage/batch")
+async def score_spoilage_batch(request: Request):
+    # Columnar input (JSON object of lists, npz or Arrow); response uses the same format
+    content_type = request.headers.get("content-type")
+    try:
+        columns = decode_columns(await request.body(), content_type, SPOILAGE_COLUMNS)
+        result = await offload(request, "ml", "predict_spoilage_batch", *(columns[name] for name in SPOILAGE_COLUMNS))
+    except (ColumnarFormatError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    body, media_type = encode_columns(result, content_type)
+    return Response(content=body, media_type=media_type)
+
+@app.get("/api/spoilage/cache/stats")
+async def get_spoilage_cache_stats():
+    # Counters of the ML worker that serves the call (one per process when the ML pool uses processes)
+    return await offload(None, "ml", "spoilage_cache_stats")
 
 @app.get("/api/optimization/routes")
-async def get_optimized_routes():
+async def get_optimized_routes(request: Request):
     # Use graph algorithms for route optimization
-    routes = graph_optimizer.optimize_delivery_routes()
-    return {"routes": routes}
+    async def compute():
+        return await offload(None, "graph", "optimize_delivery_routes")
+    
+    return await cached_response(result_cache, request, "routes", (), graph_optimizer.network_version,
+                                 compute, CACHE_TTL["routes"])
+
+@app.post("/api/optimization/fleet-routes")
+async def plan_fleet_routes(request: Request, body: FleetRouteRequest):
+    # Capacitated multi-vehicle routing over all NGOs and donors
+    vehicles = [v.model_dump() for v in body.vehicles] if body.vehicles else None
+    try:
+        return await offload(request, "graph", "plan_fleet_routes", vehicles, body.depot, min(body.time_budget, 10.0))
+    except nx.NodeNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/donations")
+async def add_donation(donation: DonationData):
+    # New donations are matched to open NGO requests right away
+    try:
+        result = await offload(None, "matching", "add_donation", donation.donor_id, donation.food_type,
+                               donation.quantity, donation.expiry_date, donation.location)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    donations.append({**donation.model_dump(), "donation_id": result["donation_id"]})
+    return result
+
+@app.delete("/api/donations/{donation_id}")
+async def remove_donation(donation_id: str):
+    try:
+        await offload(None, "matching", "remove_donation", donation_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"removed": donation_id}
+
+@app.post("/api/ngo-requests")
+async def add_ngo_request(ngo_request: NGORequest):
+    # New requests are served from available donations right away
+    try:
+        result = await offload(None, "matching", "add_request", ngo_request.ngo_id, ngo_request.food_type,
+                               ngo_request.quantity_needed, ngo_request.urgency, ngo_request.location)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ngo_requests.append({**ngo_request.model_dump(), "request_id": result["request_id"]})
+    return result
+
+@app.delete("/api/ngo-requests/{request_id}")
+async def remove_ngo_request(request_id: str):
+    try:
+        await offload(None, "matching", "remove_request", request_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"removed": request_id}
+
+@app.get("/api/matching/plan")
+async def get_matching_plan():
+    # Current donation-to-NGO allocation, kept optimal as events arrive
+    # On the executor like the other matching calls: both take the matcher's lock
+    await offload(None, "matching", "expire")
+    plan = await offload(None, "matching", "plan")
+    return {**plan, "stats": donation_matcher.stats()}
+
+@app.get("/api/optimization/routes/flags")
+async def get_flagged_routes():
+    # Served routes whose cost changed (or that were cut off) since they were handed out
+    routes = graph_optimizer.flagged_routes()
+    return {"routes": routes, "count": len(routes), "network_version": graph_optimizer.network_version}
+
+@app.post("/api/network/traffic")
+async def update_traffic(updates: List[TrafficUpdate]):
+    # Live traffic factors and road closures; only the affected shortest paths are repaired
+    changes = [{"from": u.source, "to": u.target, "traffic_factor": u.traffic_factor, "closed": u.closed}
+               for u in updates]
+    try:
+        result = await offload(None, "graph", "apply_traffic_updates", changes)
+    except nx.NetworkXError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    for route in graph_optimizer.flagged_routes():
+        if route["route_id"] in result["flagged_routes"]:
+            manager.publish("routes", route, key_field="route_id")
+    return result
+
+@app.get("/api/network/analysis")
+async def get_network_analysis(mode: str = "auto", sweeps: int = Query(32, ge=1, le=1024),
+                               clustering_samples: int = Query(2000, ge=1)):
+    # Cached per network version; large networks get bounded estimates instead of exact eccentricities
+    try:
+        return await offload(None, "graph", "network_analysis", mode, sweeps, clustering_samples)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def query_points(query: SpatialQuery):
+    # Coordinates of the query: explicit columns plus any resolvable location strings
+    if len(query.lat) != len(query.lon):
+        raise HTTPException(status_code=400, detail="lat and lon must have the same length")
+    lats, lons = list(query.lat), list(query.lon)
+    if query.locations:
+        # Node ids and names stand for their node's coordinates; "lat, lon" strings are used as given
+        points = [None if graph_optimizer.has_node(loc) else parse_coordinates(loc) for loc in query.locations]
+        names = [loc for loc, point in zip(query.locations, points) if point is None]
+        nodes = iter(graph_optimizer.resolve_locations(names)[0])
+        unresolved = []
+        for loc, point in zip(query.locations, points):
+            if point is None:
+                node = next(nodes)
+                if node is None:
+                    unresolved.append(loc)
+                    continue
+                point = graph_optimizer.node_attrs(node)["lat"], graph_optimizer.node_attrs(node)["lon"]
+            lats.append(point[0])
+            lons.append(point[1])
+        if unresolved:
+            raise HTTPException(status_code=404, detail=f"Unknown locations: {unresolved[:10]}")
+    return lats, lons
+
+@app.post("/api/spatial/nearest")
+async def nearest_facilities(request: Request, query: SpatialQuery):
+    # Bulk k-nearest facilities (optionally of one node type) for every query point
+    lats, lons = query_points(query)
+    try:
+        node_ids, distances = await offload(request, "graph", "nearest_nodes", lats, lons, max(query.k, 1), query.node_type)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {
+        "nodes": node_ids.tolist(),
+        "distances_km": [[round(d, 3) if d != float("inf") else None for d in row] for row in distances.tolist()]
+    }
+
+@app.post("/api/spatial/within")
+async def facilities_within_radius(request: Request, query: SpatialQuery):
+    # Bulk radius search: all facilities within radius_km of every query point
+    lats, lons = query_points(query)
+    try:
+        matches = await offload(request, "graph", "nodes_within_radius", lats, lons, query.radius_km, query.node_type)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"matches": [[{"node": node, "distance_km": round(km, 3)} for node, km in row] for row in matches]}
+
+@app.post("/api/spatial/resolve")
+async def resolve_locations(locations: List[str]):
+    # Map location strings (node ids or "lat, lon") to graph nodes
+    nodes, distances = graph_optimizer.resolve_locations(locations)
+    return {"locations": [
+        {"location": location, "node": node, "distance_km": None if node is None else round(float(km), 3)}
+        for location, node, km in zip(locations, nodes, distances)
+    ]}
+
+@app.post("/api/optimization/loading")
+async def optimize_vehicle_loading(request: Request, body: LoadingRequest):
+    # Knapsack loading of inventory lots across vehicles, weighted by urgency and spoilage risk
+    items = [item.model_dump() for item in body.items]
+    if any(item["weight"] < 0 or item["value"] < 0 for item in items):
+        raise HTTPException(status_code=400, detail="Item weights and values must be non-negative")
+    if any(not (0 <= v.capacity < float("inf")) for v in body.vehicles):
+        raise HTTPException(status_code=400, detail="Vehicle capacities must be finite and non-negative")
+    if not (0 < body.weight_resolution < float("inf")):
+        raise HTTPException(status_code=400, detail="weight_resolution must be positive")
+    
+    # Score spoilage for every lot that only reports its storage conditions, in one batch
+    to_score = [item for item in items if item["spoilage_risk"] is None and all(
+        item[field] is not None for field in ("temperature", "humidity", "days_stored", "food_category"))]
+    if to_score:
+        risk = await offload(request, "ml", "predict_spoilage_batch",
+            *([item[field] for item in to_score] for field in ("temperature", "humidity", "days_stored", "food_category")))
+        for item, probability in zip(to_score, risk["spoilage_probability"].tolist()):
+            item["spoilage_risk"] = probability
+    
+    vehicles = [v.model_dump() for v in body.vehicles]
+    return await offload(request, "graph", "capacity_optimization", items, vehicles, min(body.time_budget, 5.0),
+                         body.weight_resolution)
 
 @app.get("/api/analytics/waste-reduction")
 async def get_waste_analytics():
@@ -159,16 +609,66 @@ async def get_efficiency_metrics():
     }
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, topic: Optional[List[str]] = Query(None),
+                             sensor_id: Optional[List[str]] = Query(None),
+                             location: Optional[List[str]] = Query(None)):
+    # Subscribe with query parameters, then adjust with {"action": "subscribe"|"unsubscribe", ...} messages.
+    # Without ?topic= only "sensors" is streamed; "alerts" and "routes" are opt-in
+    subscriber = await manager.connect(websocket, topic, sensor_id, location)
     try:
         while True:
-            # Send real-time sensor updates every 5 seconds
-            sensor_data = generate_mock_sensor_data()
-            await websocket.send_text(json.dumps(sensor_data))
-            await asyncio.sleep(5)
+            message = await websocket.receive_text()
+            try:
+                subscriber.update_filters(json.loads(message))
+            except (ValueError, AttributeError, TypeError):
+                await websocket.send_text(json.dumps({"error": "Expected a JSON subscription message"}))
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    except Exception as e:
+        # Includes receiving on a socket the hub already closed
+        print(f"Websocket receive loop ended: {e!r}")
+    finally:
+        manager.disconnect(subscriber)
+
+@app.get("/api/realtime/stats")
+async def get_realtime_stats():
+    return manager.stats()
+
+@app.get("/api/executor/stats")
+async def get_executor_stats():
+    return executor.stats()
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return result_cache.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus text exposition format
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/debug/profiler")
+async def get_profiler_status():
+    return profiler.status()
+
+@app.post("/api/debug/profiler")
+async def set_profiler(settings: ProfilerSettings):
+    if settings.slow_ms is not None and settings.slow_ms < 0:
+        raise HTTPException(status_code=400, detail="slow_ms must not be negative")
+    if settings.enabled:
+        profiler.start(settings.slow_ms)
+    else:
+        # Joins the sampler thread, which wakes every few milliseconds
+        profiler.stop()
+    return profiler.status()
+
+@app.get("/api/debug/profiler/dumps/{name}")
+async def get_profiler_dump(name: str):
+    # Folded stacks, e.g. for flamegraph.pl or speedscope
+    folded = profiler.read_dump(name)
+    if folded is None:
+        raise HTTPException(status_code=404, detail=f"No profile dump {name}")
+    return Response(folded, media_type="text/plain")
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+``REGISTRY`` collects request metrics (via MetricsMiddleware), timing spans
+around ML and graph methods (``timed``/``span``) and gauges read from other
+components' ``stats()`` at scrape time; ``REGISTRY.render()`` serves them.
+Spans recorded in process-pool workers stay in those workers; the
+executor's own per-call timings cover them from the API process.
+"""
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram buckets: seconds for latencies, bytes for payloads
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Requests buffered by MetricsMiddleware before they are folded into its histograms
+REQUEST_FLUSH_EVERY = 1024
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.type = 'counter'
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, labels), value) for labels, value in values]
+
+
+class Gauge(Counter):
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.type = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set; ``observe`` is a bisect and a few increments under a lock"""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.type = 'histogram'
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        samples = []
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                samples.append((f'{self.name}_bucket', _format_labels(self.labelnames, labels, [f'le="{bound}"']),
+                                cumulative))
+            samples.append((f'{self.name}_sum', _format_labels(self.labelnames, labels), total))
+            samples.append((f'{self.name}_count', _format_labels(self.labelnames, labels), count))
+        return samples
+
+
+class StatsCollector:
+    """Numbers from a component's ``stats()`` dict, read at scrape time as ``<prefix>_<key>``.
+
+    Keys listed in ``counters`` are exported as counters (``_total``), the
+    rest as gauges; non-numeric entries are skipped.
+    """
+
+    def __init__(self, prefix, stats, help, counters=()):
+        self.prefix, self.stats, self.help, self.counters = prefix, stats, help, set(counters)
+
+    def families(self):
+        try:
+            stats = self.stats()
+        except Exception as e:
+            print(f"Collecting {self.prefix} metrics failed: {e!r}")
+            return []
+        families = []
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key in self.counters:
+                name, kind = f'{self.prefix}_{key}_total', 'counter'
+            else:
+                name, kind = f'{self.prefix}_{key}', 'gauge'
+            families.append((name, kind, f'{self.help}: {key}', [(name, '', value)]))
+        return families
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._before_render = []
+
+    def _add(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def register_stats(self, prefix, stats, help, counters=()):
+        """Export ``stats()`` (a dict of numbers) at every scrape"""
+        self._collectors.append(StatsCollector(prefix, stats, help, counters))
+
+    def before_render(self, callback):
+        """Call ``callback()`` at the start of every scrape, e.g. to flush buffered observations"""
+        self._before_render.append(callback)
+
+    def render(self):
+        for callback in self._before_render:
+            callback()
+        families = [(m.name, m.type, m.help, m.samples()) for m in self._metrics.values()]
+        for collector in self._collectors:
+            families.extend(collector.families())
+        lines = []
+        for name, kind, help, samples in families:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{sample}{labels} {_format_value(value)}' for sample, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+SPAN_SECONDS = REGISTRY.histogram('smartcare_span_duration_seconds',
+                                  'Time spent in instrumented ML and graph methods', ('span',))
+
+
+@contextmanager
+def span(name):
+    """Record the time spent in the block under ``name``"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_SECONDS.observe((name,), time.perf_counter() - started)
+
+
+def timed(name):
+    """Decorator form of ``span``"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                SPAN_SECONDS.observe((name,), time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status, in-flight and payload size metrics.
+
+    Requests are labelled with the matched route's path template (so
+    ``/api/sensor/alerts/{sensor_id}`` is one series), or "unmatched".
+    Request sizes come from Content-Length, response sizes from the body
+    actually sent. To keep the per-request cost to a tuple append, requests
+    are buffered and folded into the histograms at scrape time (or every
+    REQUEST_FLUSH_EVERY requests). With a ``profiler`` enabled, requests
+    slower than its threshold have their sampled stacks dumped.
+    """
+
+    def __init__(self, app, registry=REGISTRY, profiler=None):
+        self.app = app
+        self.profiler = profiler
+        self.in_flight = 0
+        self._pending = []
+        self.latency = registry.histogram('smartcare_http_request_duration_seconds',
+                                          'HTTP request latency', ('method', 'route'))
+        self.requests = registry.counter('smartcare_http_requests_total', 'HTTP requests by status',
+                                         ('method', 'route', 'status'))
+        self.request_size = registry.histogram('smartcare_http_request_size_bytes', 'HTTP request body size',
+                                               ('method', 'route'), SIZE_BUCKETS)
+        self.response_size = registry.histogram('smartcare_http_response_size_bytes', 'HTTP response body size',
+                                                ('method', 'route'), SIZE_BUCKETS)
+        registry.register_stats('smartcare_http', lambda: {'requests_in_flight': self.in_flight}, 'HTTP requests')
+        registry.before_render(self.flush)
+
+    def flush(self):
+        # Swapping the list is atomic, so requests finishing meanwhile land in the next batch
+        pending, self._pending = self._pending, []
+        for method, route, status, elapsed, request_size, response_size in pending:
+            labels = (method, route)
+            self.latency.observe(labels, elapsed)
+            self.requests.inc((method, route, str(status)))
+            self.response_size.observe(labels, response_size)
+            if request_size is not None:
+                self.request_size.observe(labels, request_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status, sent = 500, 0
+
+        async def send_wrapper(message):
+            nonlocal status, sent
+            if message['type'] == 'http.response.body':
+                sent += len(message.get('body', b''))
+            elif message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.in_flight -= 1
+            request_size = None
+            for name, value in scope['headers']:
+                if name == b'content-length':
+                    request_size = int(value)
+                    break
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            self._pending.append((scope['method'], route, status, elapsed, request_size, sent))
+            if len(self._pending) >= REQUEST_FLUSH_EVERY:
+                self.flush()
+            if self.profiler is not None and self.profiler.enabled and elapsed >= self.profiler.slow_seconds:
+                self.profiler.request_dump(f"{scope['method']} {route}", started, started + elapsed)
@@ -1,292 +1,387 @@
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import mean_absolute_error, accuracy_score
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense, Dropout
-import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime, timedelta
 import random
-import pickle
+import os
+import threading
+import time
 import warnings
+from contextlib import nullcontext
+from model_store import ModelStore, fingerprint_training_data
+from data_sources import SyntheticDataSource, default_data_source
+from lstm_forecaster import LSTMForecaster
+from spoilage_cache import SpoilageScoreCache
+from metrics import timed
+# scikit-learn and TensorFlow are imported where models are trained, so importing
+# this module (and main) stays cheap; stored models pull in sklearn when unpickled
 warnings.filterwarnings('ignore')
 
+# Feature schema per model: (training frame, feature columns, target column).
+# Part of the model store fingerprint, so editing it triggers a retrain.
+MODEL_SCHEMAS = {
+    'donation': ('donation', ['day_of_week', 'month', 'temperature', 'is_weekend', 'is_holiday_season'], 'donation_amount'),
+    'demand': ('demand', ['day_of_week', 'month', 'unemployment_rate', 'economic_index'], 'demand_amount'),
+    'spoilage': ('spoilage', ['temperature', 'humidity', 'days_stored', 'food_type'], 'is_spoiled'),
+    'lstm': ('donation', [], 'donation_amount'),
+}
+
+MODEL_PARAMS = {
+    'donation': {'n_estimators': 100, 'random_state': 42},
+    'demand': {'n_estimators': 100, 'random_state': 42},
+    'spoilage': {'n_estimators': 100, 'random_state': 42},
+    'lstm': {'seq_length': 7, 'units': 50, 'epochs': 50, 'batch_size': 32, 'patience': 5},
+}
+
+def training_columns():
+    """Columns each training frame must provide, from MODEL_SCHEMAS"""
+    columns = {}
+    for frame_name, features, target in MODEL_SCHEMAS.values():
+        frame_columns = columns.setdefault(frame_name, [])
+        frame_columns.extend(c for c in features + [target] if c not in frame_columns)
+    return columns
+
+# Forecast horizons (in days) supported by the prediction endpoints
+FORECAST_HORIZONS = (7, 30, 90)
+
+# Spoilage probability > 0.4 is Medium risk, > 0.7 is High risk
+RISK_THRESHOLDS = np.array([0.4, 0.7])
+RISK_LEVELS = np.array(['Low', 'Medium', 'High'])
+
+# Batches at least this large are scored with all CPU cores
+PARALLEL_PREDICT_MIN_ROWS = 20000
+
 class MLModelManager:
-    def __init__(self):
-        self.donation_model = None
-        self.demand_model = None
-        self.spoilage_model = None
-        self.lstm_model = None
-        self.scaler = StandardScaler()
-        self.initialize_models()
+    def __init__(self, store=None, seed=42, data_source=None, shared_version=None):
+        # Models are loaded from the store (or trained) on first access
+        self.store = store or ModelStore()
+        self.seed = seed
+        self.data_source = data_source or default_data_source(seed, training_columns())
+        self.model_fingerprints = {}
+        # Bumped whenever a model is retrained, so cached predictions can be keyed on it. Process-pool
+        # workers each own a manager, so they bump a ``shared_version`` (multiprocessing.Value) the API reads
+        self._shared_version = shared_version
+        self._version = 0
+        # Spoilage scores by quantized conditions; cleared when the spoilage model changes
+        self.spoilage_cache = SpoilageScoreCache()
+        self._models = {}
+        self._training_frames = None
+        self._lock = threading.RLock()
+
+    @property
+    def model_version(self):
+        if self._shared_version is not None:
+            return self._shared_version.value
+        return self._version
+
+    def _bump_version(self):
+        if self._shared_version is not None:
+            with self._shared_version.get_lock():
+                self._shared_version.value += 1
+        else:
+            self._version += 1
+
+    @property
+    def donation_model(self):
+        return self._get_model('donation')
+
+    @donation_model.setter
+    def donation_model(self, model):
+        self._models['donation'] = model
+
+    @property
+    def demand_model(self):
+        return self._get_model('demand')
+
+    @demand_model.setter
+    def demand_model(self, model):
+        self._models['demand'] = model
+
+    @property
+    def spoilage_model(self):
+        return self._get_model('spoilage')
+
+    @spoilage_model.setter
+    def spoilage_model(self, model):
+        self._models['spoilage'] = model
+
+    @property
+    def lstm_model(self):
+        return self._get_model('lstm')
+
+    @lstm_model.setter
+    def lstm_model(self, model):
+        self._models['lstm'] = model
+
+    def _get_training_frames(self):
+        if self._training_frames is None:
+            self._training_frames = self.data_source.load()
+        return self._training_frames
+
+    def _fingerprint(self, name):
+        frame_name, features, target = MODEL_SCHEMAS[name]
+        df = self._get_training_frames()[frame_name]
+        return df, fingerprint_training_data(df, features, target, MODEL_PARAMS[name])
+
+    def _get_model(self, name, force_retrain=False):
+        """Return a fitted model, loading it from the store or training it if needed"""
+        model = self._models.get(name)
+        if model is not None and not force_retrain:
+            return model
+
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None and not force_retrain:
+                return model
+
+            df, fingerprint = self._fingerprint(name)
+            stored = None if force_retrain else self.store.load(name, fingerprint)
+            if stored is not None:
+                self._install(name, self._deserialize_model(name, stored), fingerprint)
+                print(f"Loaded {name} model from store ({fingerprint})")
+            else:
+                metrics = getattr(self, f'train_{name}_model')(df)
+                # The row count lets the next training run refit incrementally (see model_training)
+                metrics['rows'] = len(df)
+                self.store.save(name, fingerprint, self._serialize_model(name, self._models[name]), metrics)
+                self._install(name, self._models[name], fingerprint, retrained=True)
+            
+            model = self._models[name]
+            self._release_training_frames()
+            return model
     
+    def _install(self, name, model, fingerprint, retrained=False):
+        """Serve ``model`` as ``name`` from now on"""
+        self._models[name] = model
+        if retrained or self.model_fingerprints.get(name, fingerprint) != fingerprint:
+            self._bump_version()
+        self.model_fingerprints[name] = fingerprint
+    
+    def _release_training_frames(self):
+        # The training frames are only needed until every model is in memory
+        if all(self._models.get(n) is not None for n in MODEL_SCHEMAS):
+            self._training_frames = None
+
+    def _serialize_model(self, name, model):
+        if name == 'lstm':
+            # Plain NumPy weights, so loading the LSTM does not need TensorFlow
+            return model.to_stored()
+        return model
+
+    def _deserialize_model(self, name, stored):
+        if name == 'lstm':
+            return LSTMForecaster.from_stored(stored)
+        return stored
+
+    @timed('ml.retrain')
+    def retrain(self, name=None):
+        """Force retraining of one model (or all of them, concurrently) and update the store"""
+        from model_training import TrainingOrchestrator
+        
+        return TrainingOrchestrator(self, incremental=False).run([name] if name else None, force=True)
+
     def generate_synthetic_data(self):
         """Generate synthetic training data for demonstration"""
-        # Generate donation data
-        dates = pd.date_range(start='2022-01-01', end='2023-12-31', freq='D')
-        donation_data = []
-        
-        for date in dates:
-            # Simulate seasonal patterns and weekly cycles
-            day_of_week = date.dayofweek
-            month = date.month
-            
-            # Higher donations on weekends and holidays
-            base_donation = 50
-            if day_of_week >= 5:  # Weekend
-                base_donation += 20
-            
-            # Seasonal variations
-            if month in [11, 12]:  # Holiday season
-                base_donation += 30
-            elif month in [6, 7, 8]:  # Summer
-                base_donation += 10
-                
-            # Add random variation
-            donation_amount = base_donation + np.random.normal(0, 15)
-            donation_amount = max(0, donation_amount)
-            
-            donation_data.append({
-                'date': date,
-                'day_of_week': day_of_week,
-                'month': month,
-                'temperature': np.random.normal(20, 10),
-                'is_weekend': 1 if day_of_week >= 5 else 0,
-                'is_holiday_season': 1 if month in [11, 12] else 0,
-                'donation_amount': donation_amount
-            })
-        
-        # Generate demand data
-        demand_data = []
-        for date in dates:
-            # Demand typically higher in winter and economic stress periods
-            base_demand = 60
-            if date.month in [12, 1, 2]:  # Winter
-                base_demand += 25
-            
-            # Higher demand on certain days
-            if date.dayofweek == 0:  # Monday
-                base_demand += 15
-                
-            demand_amount = base_demand + np.random.normal(0, 12)
-            demand_amount = max(0, demand_amount)
-            
-            demand_data.append({
-                'date': date,
-                'day_of_week': date.dayofweek,
-                'month': date.month,
-                'unemployment_rate': np.random.uniform(3, 8),
-                'economic_index': np.random.uniform(80, 120),
-                'demand_amount': demand_amount
-            })
-        
-        # Generate spoilage data
-        spoilage_data = []
-        for i in range(1000):
-            temp = np.random.uniform(-2, 10)  # Refrigerator temperature
-            humidity = np.random.uniform(30, 80)
-            days_stored = np.random.randint(1, 14)
-            food_type = np.random.choice([0, 1, 2, 3])  # Different food categories
-            
-            # Spoilage probability based on conditions
-            spoilage_prob = 0.1
-            if temp > 4:  # Above optimal refrigerator temp
-                spoilage_prob += 0.3
-            if humidity > 70:
-                spoilage_prob += 0.2
-            if days_stored > 7:
-                spoilage_prob += 0.4
-                
-            is_spoiled = 1 if np.random.random() < spoilage_prob else 0
-            
-            spoilage_data.append({
-                'temperature': temp,
-                'humidity': humidity,
-                'days_stored': days_stored,
-                'food_type': food_type,
-                'is_spoiled': is_spoiled
-            })
-        
-        return pd.DataFrame(donation_data), pd.DataFrame(demand_data), pd.DataFrame(spoilage_data)
+        # Seeded so that the data (and therefore the model store fingerprint) is stable
+        frames = SyntheticDataSource(self.seed).load()
+        return frames['donation'], frames['demand'], frames['spoilage']
+    
+    def set_data_source(self, data_source):
+        """Train on a different data source (SyntheticDataSource or FileDataSource).
+        
+        Models are reloaded on next access: from the store if one was saved
+        for the new data's fingerprint, otherwise retrained.
+        """
+        with self._lock:
+            self.data_source = data_source
+            self._training_frames = None
+            self._models = {}
     
+    @timed('ml.warm_up')
+    def warm_up(self):
+        """Load every model (and the libraries behind it) before the first request needs it.
+        
+        Unlike initialize_models, a model that cannot be loaded here (the
+        LSTM without an exported copy or TensorFlow) is skipped and left to
+        fail on the endpoint that uses it.
+        """
+        started = time.perf_counter()
+        loaded = []
+        for name in MODEL_SCHEMAS:
+            try:
+                self._get_model(name)
+                loaded.append(name)
+            except ImportError as e:
+                print(f"Skipping {name} model warm-up: {e}")
+        if 'spoilage' in loaded:
+            # Binds the score cache to the model, building its lookup grid if enabled
+            self.predict_spoilage_batch([5.0], [50.0], [1], [0])
+        elapsed = time.perf_counter() - started
+        print(f"Warmed up ML models {loaded} in {elapsed:.2f}s")
+        return {'loaded': loaded, 'elapsed_ms': round(elapsed * 1000, 2)}
+    
+    @timed('ml.initialize_models')
     def initialize_models(self):
-        """Initialize and train all ML models"""
-        print("Initializing ML models...")
+        """Load (or train, if the stored copy is stale) all ML models up front.
         
-        # Generate training data
-        donation_df, demand_df, spoilage_df = self.generate_synthetic_data()
-        
-        # Train donation prediction model
-        self.train_donation_model(donation_df)
-        
-        # Train demand forecasting model
-        self.train_demand_model(demand_df)
-        
-        # Train spoilage prediction model
-        self.train_spoilage_model(spoilage_df)
-        
-        # Train LSTM for time series forecasting
-        self.train_lstm_model(donation_df)
+        Stale models are fitted concurrently, incrementally where the store
+        holds a model trained on an earlier cut of the same data; returns
+        the TrainingOrchestrator report with per-stage timings.
+        """
+        from model_training import TrainingOrchestrator
         
+        print("Initializing ML models...")
+        report = TrainingOrchestrator(self).run()
         print("All ML models initialized successfully!")
+        return report
     
     def train_donation_model(self, df):
         """Train donation prediction model using Random Forest"""
-        features = ['day_of_week', 'month', 'temperature', 'is_weekend', 'is_holiday_season']
-        X = df[features]
-        y = df['donation_amount']
+        from model_training import fit_forest
         
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        
-        self.donation_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        self.donation_model.fit(X_train, y_train)
-        
-        # Evaluate model
-        y_pred = self.donation_model.predict(X_test)
-        mae = mean_absolute_error(y_test, y_pred)
-        print(f"Donation model MAE: {mae:.2f}")
+        # All cores for a single forest; TrainingOrchestrator splits them when fitting several
+        self.donation_model, metrics = fit_forest('donation', df, n_jobs=-1)
+        return metrics
     
     def train_demand_model(self, df):
         """Train demand forecasting model"""
-        features = ['day_of_week', 'month', 'unemployment_rate', 'economic_index']
-        X = df[features]
-        y = df['demand_amount']
-        
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        from model_training import fit_forest
         
-        self.demand_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        self.demand_model.fit(X_train, y_train)
-        
-        # Evaluate model
-        y_pred = self.demand_model.predict(X_test)
-        mae = mean_absolute_error(y_test, y_pred)
-        print(f"Demand model MAE: {mae:.2f}")
+        # All cores for a single forest; TrainingOrchestrator splits them when fitting several
+        self.demand_model, metrics = fit_forest('demand', df, n_jobs=-1)
+        return metrics
     
     def train_spoilage_model(self, df):
         """Train spoilage prediction model"""
-        features = ['temperature', 'humidity', 'days_stored', 'food_type']
-        X = df[features]
-        y = df['is_spoiled']
-        
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        from model_training import fit_forest
         
-        self.spoilage_model = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.spoilage_model.fit(X_train, y_train)
-        
-        # Evaluate model
-        y_pred = self.spoilage_model.predict(X_test)
-        accuracy = accuracy_score(y_test, y_pred)
-        print(f"Spoilage model accuracy: {accuracy:.3f}")
+        # All cores for a single forest; TrainingOrchestrator splits them when fitting several
+        self.spoilage_model, metrics = fit_forest('spoilage', df, n_jobs=-1)
+        return metrics
     
+    @timed('ml.train_lstm_model')
     def train_lstm_model(self, df):
-        """Train LSTM model for time series forecasting"""
-        # Prepare time series data
-        donations = df['donation_amount'].values
-        
-        # Create sequences for LSTM
-        def create_sequences(data, seq_length=7):
-            X, y = [], []
-            for i in range(len(data) - seq_length):
-                X.append(data[i:(i + seq_length)])
-                y.append(data[i + seq_length])
-            return np.array(X), np.array(y)
+        """Train LSTM model for time series forecasting.
         
-        X, y = create_sequences(donations)
-        X = X.reshape((X.shape[0], X.shape[1], 1))
+        Needs TensorFlow (imported only here); normally run offline via
+        ``python lstm_training.py``, after which workers load the exported
+        NumPy forecaster from the store.
+        """
+        from lstm_training import train_lstm
         
-        # Split data
-        train_size = int(len(X) * 0.8)
-        X_train, X_test = X[:train_size], X[train_size:]
-        y_train, y_test = y[:train_size], y[train_size:]
-        
-        # Build LSTM model
-        self.lstm_model = Sequential([
-            LSTM(50, return_sequences=True, input_shape=(7, 1)),
-            Dropout(0.2),
-            LSTM(50, return_sequences=False),
-            Dropout(0.2),
-            Dense(25),
-            Dense(1)
-        ])
+        _, features, target = MODEL_SCHEMAS['lstm']
+        params = MODEL_PARAMS['lstm']
+        fingerprint = fingerprint_training_data(df, features, target, params)
+        checkpoint_path = os.path.join(self.store.root, 'lstm', f'checkpoint-{fingerprint}.weights.h5')
         
-        self.lstm_model.compile(optimizer='adam', loss='mean_squared_error')
-        
-        # Train model (reduce epochs for demo)
-        self.lstm_model.fit(X_train, y_train, batch_size=32, epochs=10, verbose=0)
-        
-        print("LSTM model trained successfully!")
+        self.lstm_model, metrics = train_lstm(df, params, checkpoint_path)
+        return metrics
+    
+    def _horizon_grid(self, horizon, groups):
+        """Build the (day, group) cross-product for a forecast as flat index arrays"""
+        if horizon not in FORECAST_HORIZONS:
+            raise ValueError(f"horizon must be one of {FORECAST_HORIZONS}, got {horizon}")
+        
+        dates = pd.date_range(datetime.now(), periods=horizon, freq='D')
+        groups = list(groups) if groups else [None]
+        
+        # Row r covers day r % horizon for group r // horizon
+        day_idx = np.tile(np.arange(horizon), len(groups))
+        group_idx = np.repeat(np.arange(len(groups)), horizon)
+        return dates, groups, day_idx, group_idx
     
-    def predict_donations(self):
-        """Predict donations for the next 7 days"""
+    def _forecast_records(self, dates, groups, day_idx, group_idx, group_key, value_key, values, confidence):
+        """Turn flat prediction arrays back into the per-day response records"""
+        date_strings = dates.strftime('%Y-%m-%d')
+        values = np.round(np.maximum(values, 0), 1).tolist()
+        confidence = np.round(confidence, 2).tolist()
+        
+        records = []
+        for row, (d, g) in enumerate(zip(day_idx.tolist(), group_idx.tolist())):
+            record = {
+                'date': date_strings[d],
+                value_key: values[row],
+                'confidence': confidence[row]
+            }
+            if groups[g] is not None:
+                record[group_key] = groups[g]
+            records.append(record)
+        return records
+    
+    @timed('ml.predict_donations')
+    def predict_donations(self, horizon=7, locations=None):
+        """Predict donations for the next ``horizon`` days, optionally per location.
+        
+        The whole horizon x locations grid is scored with a single predict call.
+        """
         if self.donation_model is None:
             return {"error": "Donation model not initialized"}
         
-        predictions = []
-        current_date = datetime.now()
-        
-        for i in range(7):
-            future_date = current_date + timedelta(days=i)
-            features = [
-                future_date.weekday(),
-                future_date.month,
-                np.random.normal(20, 5),  # Temperature
-                1 if future_date.weekday() >= 5 else 0,  # Weekend
-                1 if future_date.month in [11, 12] else 0  # Holiday season
-            ]
-            
-            prediction = self.donation_model.predict([features])[0]
-            predictions.append({
-                'date': future_date.strftime('%Y-%m-%d'),
-                'predicted_amount': round(max(0, prediction), 1),
-                'confidence': round(np.random.uniform(0.75, 0.95), 2)
-            })
+        dates, groups, day_idx, group_idx = self._horizon_grid(horizon, locations)
+        n_rows = len(day_idx)
+        weekday = dates.dayofweek.values[day_idx]
+        month = dates.month.values[day_idx]
+        
+        features = np.column_stack([
+            weekday,
+            month,
+            np.random.normal(20, 5, n_rows),  # Temperature
+            (weekday >= 5).astype(int),  # Weekend
+            np.isin(month, [11, 12]).astype(int)  # Holiday season
+        ])
         
-        return predictions
+        predictions = self.donation_model.predict(features)
+        confidence = np.random.uniform(0.75, 0.95, n_rows)
+        return self._forecast_records(dates, groups, day_idx, group_idx, 'location',
+                                      'predicted_amount', predictions, confidence)
     
-    def predict_demand(self):
-        """Predict demand for the next 7 days"""
+    @timed('ml.predict_demand')
+    def predict_demand(self, horizon=7, food_types=None):
+        """Predict demand for the next ``horizon`` days, optionally per food type.
+        
+        The whole horizon x food types grid is scored with a single predict call.
+        """
         if self.demand_model is None:
             return {"error": "Demand model not initialized"}
         
-        predictions = []
-        current_date = datetime.now()
+        dates, groups, day_idx, group_idx = self._horizon_grid(horizon, food_types)
+        n_rows = len(day_idx)
         
-        for i in range(7):
-            future_date = current_date + timedelta(days=i)
-            features = [
-                future_date.weekday(),
-                future_date.month,
-                np.random.uniform(4, 7),  # Unemployment rate
-                np.random.uniform(90, 110)  # Economic index
-            ]
-            
-            prediction = self.demand_model.predict([features])[0]
-            predictions.append({
-                'date': future_date.strftime('%Y-%m-%d'),
-                'predicted_demand': round(max(0, prediction), 1),
-                'confidence': round(np.random.uniform(0.70, 0.90), 2)
-            })
+        features = np.column_stack([
+            dates.dayofweek.values[day_idx],
+            dates.month.values[day_idx],
+            np.random.uniform(4, 7, n_rows),  # Unemployment rate
+            np.random.uniform(90, 110, n_rows)  # Economic index
+        ])
         
-        return predictions
+        predictions = self.demand_model.predict(features)
+        confidence = np.random.uniform(0.70, 0.90, n_rows)
+        return self._forecast_records(dates, groups, day_idx, group_idx, 'food_type',
+                                      'predicted_demand', predictions, confidence)
+    
+    @timed('ml.forecast_donations_lstm')
+    def forecast_donations_lstm(self, horizon=7, history=None):
+        """Forecast total daily donations with the LSTM, feeding each prediction back in.
+        
+        ``history`` holds recent observed daily amounts (at least
+        ``seq_length``); defaults to the end of the training series.
+        """
+        if horizon not in FORECAST_HORIZONS:
+            raise ValueError(f"horizon must be one of {FORECAST_HORIZONS}, got {horizon}")
+        
+        forecast = self.lstm_model.forecast(horizon, history)
+        dates = pd.date_range(datetime.now(), periods=horizon, freq='D').strftime('%Y-%m-%d')
+        return [{'date': date, 'predicted_amount': amount}
+                for date, amount in zip(dates, np.round(np.maximum(forecast, 0).astype(np.float64), 1).tolist())]
     
+    @timed('ml.predict_spoilage_risk')
     def predict_spoilage_risk(self, temperature, humidity, days_stored, food_type):
         """Predict spoilage risk for given conditions"""
         if self.spoilage_model is None:
             return {"error": "Spoilage model not initialized"}
         
-        features = [[temperature, humidity, days_stored, food_type]]
-        probability = self.spoilage_model.predict_proba(features)[0][1]
-        
-        risk_level = "Low"
-        if probability > 0.7:
-            risk_level = "High"
-        elif probability > 0.4:
-            risk_level = "Medium"
+        batch = self.predict_spoilage_batch([temperature], [humidity], [days_stored], [food_type])
+        probability = float(batch['spoilage_probability'][0])
+        risk_level = str(batch['risk_level'][0])
         
         return {
             'spoilage_probability': round(probability, 3),
@@ -294,6 +389,46 @@ class MLModelManager:
             'recommendations': self.get_spoilage_recommendations(risk_level)
         }
     
+    @timed('ml.predict_spoilage_batch')
+    def predict_spoilage_batch(self, temperature, humidity, days_stored, food_type):
+        """Predict spoilage risk for many items at once.
+        
+        Takes one array-like per feature and returns a dict of NumPy columns
+        (``spoilage_probability`` and ``risk_level``) in the same row order,
+        using a single predict_proba call for the whole batch. Scores are
+        served from ``spoilage_cache`` where possible, so only conditions not
+        seen since the model was last (re)trained reach the model.
+        """
+        columns = [np.asarray(col, dtype=np.float32).ravel()
+                   for col in (temperature, humidity, days_stored, food_type)]
+        n_items = len(columns[0])
+        if any(len(col) != n_items for col in columns):
+            raise ValueError("All spoilage feature columns must have the same length")
+        if n_items == 0:
+            return {'spoilage_probability': np.empty(0), 'risk_level': np.empty(0, dtype=RISK_LEVELS.dtype)}
+        
+        model = self.spoilage_model
+        
+        def score(features):
+            # Spread large batches over all cores; small ones are cheaper without the pool. The
+            # joblib context is per thread, so the shared model's own n_jobs is never touched
+            parallel = nullcontext()
+            if len(features) >= PARALLEL_PREDICT_MIN_ROWS:
+                import joblib
+                parallel = joblib.parallel_backend('threading', n_jobs=-1)
+            with parallel:
+                return model.predict_proba(features.astype(np.float32))[:, 1]
+        
+        probability = self.spoilage_cache.lookup(model, score, *columns)
+        
+        return {
+            'spoilage_probability': np.round(probability, 3),
+            'risk_level': RISK_LEVELS[np.searchsorted(RISK_THRESHOLDS, probability, side='left')]
+        }
+    
+    def spoilage_cache_stats(self):
+        return self.spoilage_cache.stats()
+    
     def get_spoilage_recommendations(self, risk_level):
         """Get recommendations based on spoilage risk"""
         recommendations = {
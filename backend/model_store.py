@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+
+# Bump when the on-disk layout or the training code changes in a way that
+# makes previously saved models unusable.
+STORE_VERSION = 1
+
+DEFAULT_STORE_DIR = os.environ.get(
+    'SMARTCARE_MODEL_STORE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_store')
+)
+
+
+def fingerprint_training_data(df, features, target, params=None):
+    """Hash the training frame together with its feature schema.
+
+    Any change to the rows, the selected features/target, their dtypes or the
+    model hyperparameters produces a different fingerprint, which forces a
+    retrain on the next load.
+    """
+    digest = hashlib.sha256()
+    schema = {
+        'store_version': STORE_VERSION,
+        'features': list(features),
+        'target': target,
+        'dtypes': {col: str(df[col].dtype) for col in list(features) + [target]},
+        'params': params or {},
+    }
+    digest.update(json.dumps(schema, sort_keys=True, default=str).encode())
+    columns = df[list(features) + [target]]
+    digest.update(pd.util.hash_pandas_object(columns, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+class ModelStore:
+    """Versioned on-disk store for fitted models.
+
+    Models are pickled to ``<root>/<name>/<fingerprint>.pkl`` and a small
+    ``manifest.json`` per model records which fingerprint is current.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+
+    def _model_dir(self, name):
+        return os.path.join(self.root, name)
+
+    def _manifest_path(self, name):
+        return os.path.join(self._model_dir(name), 'manifest.json')
+
+    def manifest(self, name):
+        """Return the manifest for ``name`` or None if nothing is stored"""
+        try:
+            with open(self._manifest_path(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, name, fingerprint):
+        """Load a model if one was saved for exactly this fingerprint"""
+        path = os.path.join(self._model_dir(name), f'{fingerprint}.pkl')
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"Discarding unreadable stored model {name}/{fingerprint}: {e}")
+            return None
+
+    def save(self, name, fingerprint, model, metrics=None):
+        """Atomically persist a fitted model and mark it as current"""
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+
+        path = os.path.join(model_dir, f'{fingerprint}.pkl')
+        fd, tmp_path = tempfile.mkstemp(dir=model_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        previous = self.manifest(name)
+        manifest = {
+            'name': name,
+            'fingerprint': fingerprint,
+            'store_version': STORE_VERSION,
+            'saved_at': datetime.now().isoformat(),
+            'metrics': metrics or {},
+        }
+        with open(self._manifest_path(name), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        # Keep only the current artifact around
+        if previous and previous.get('fingerprint') != fingerprint:
+            stale = os.path.join(model_dir, f"{previous['fingerprint']}.pkl")
+            if os.path.exists(stale):
+                os.remove(stale)
+        return path
+
+    def clear(self, name=None):
+        """Remove stored artifacts for one model or for all of them"""
+        names = [name] if name else (os.listdir(self.root) if os.path.isdir(self.root) else [])
+        for model_name in names:
+            model_dir = self._model_dir(model_name)
+            if not os.path.isdir(model_dir):
+                continue
+            for filename in os.listdir(model_dir):
+                os.remove(os.path.join(model_dir, filename))
+            os.rmdir(model_dir)
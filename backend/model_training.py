@@ -0,0 +1,247 @@
+"""Training orchestration for the ML models.
+
+Run ``python model_training.py`` (e.g. nightly) to bring every stored
+model up to date with the training data: independent models are fitted
+concurrently in worker processes, forests use the cores left over, and a
+model whose training data only gained rows since it was stored is
+refitted incrementally instead of from scratch.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from model_store import fingerprint_training_data
+from ml_models import MODEL_SCHEMAS, MODEL_PARAMS, MLModelManager
+
+FOREST_TYPES = {
+    'donation': 'RandomForestRegressor',
+    'demand': 'RandomForestRegressor',
+    'spoilage': 'RandomForestClassifier',
+}
+
+# Refit from scratch instead of incrementally once this share of rows is new
+INCREMENTAL_MAX_NEW_FRACTION = 0.25
+
+# Fewest trees replaced by an incremental forest refit
+INCREMENTAL_MIN_TREES = 10
+
+
+def incremental_trees(n_estimators, new_rows, total_rows):
+    """Trees to replace when ``new_rows`` of ``total_rows`` are new: at least the new rows' share"""
+    share = math.ceil(n_estimators * new_rows / total_rows)
+    return min(n_estimators, max(INCREMENTAL_MIN_TREES, share))
+
+
+def test_rows(n_rows, test_size=0.2):
+    """Held-out rows: chosen by a hash of the row position, so rows keep their split as data is appended
+
+    An incrementally refitted forest is therefore never scored on rows its
+    older trees were trained on.
+    """
+    return pd.util.hash_array(np.arange(n_rows, dtype=np.int64)) % 1000 < test_size * 1000
+
+
+def fit_forest(name, df, n_jobs=None, previous=None, new_rows=0):
+    """Fit one of the random forest models; returns (model, metrics).
+
+    With ``previous`` (the forest trained before the last ``new_rows``
+    rows were appended) the oldest trees are replaced by new ones grown
+    on the updated data, so the forest keeps its size and the refit costs
+    a fraction of a full one.
+    """
+    from sklearn import ensemble
+    from sklearn.metrics import accuracy_score, mean_absolute_error
+
+    _, features, target = MODEL_SCHEMAS[name]
+    params = MODEL_PARAMS[name]
+    test = test_rows(len(df))
+    X_train, X_test = df[features][~test], df[features][test]
+    y_train, y_test = df[target][~test], df[target][test]
+
+    if previous is None:
+        model = getattr(ensemble, FOREST_TYPES[name])(**params, n_jobs=n_jobs)
+        model.fit(X_train, y_train)
+        fitted = params['n_estimators']
+    else:
+        model = previous
+        fitted = incremental_trees(params['n_estimators'], new_rows, len(df))
+        # A fresh seed per data size, so successive refits do not regrow the same trees
+        model.set_params(warm_start=True, n_jobs=n_jobs, n_estimators=len(model.estimators_) + fitted,
+                         random_state=params['random_state'] + len(df))
+        model.fit(X_train, y_train)
+        del model.estimators_[:fitted]
+        model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+    model.set_params(n_jobs=None)
+
+    y_pred = model.predict(X_test)
+    kind = 'incrementally refitted' if previous is not None else 'trained'
+    if FOREST_TYPES[name] == 'RandomForestClassifier':
+        accuracy = accuracy_score(y_test, y_pred)
+        print(f"{name.capitalize()} model {kind}, accuracy: {accuracy:.3f}")
+        metrics = {'accuracy': round(float(accuracy), 4)}
+    else:
+        mae = mean_absolute_error(y_test, y_pred)
+        print(f"{name.capitalize()} model {kind}, MAE: {mae:.2f}")
+        metrics = {'mae': round(float(mae), 4)}
+    metrics.update({'trees_fitted': fitted, 'incremental': previous is not None})
+    return model, metrics
+
+
+def _fit_job(name, df, n_jobs, previous, new_rows, checkpoint_path):
+    # Runs in a worker process; returns (model, metrics, fit seconds)
+    started = time.perf_counter()
+    if name == 'lstm':
+        from lstm_training import train_lstm
+        model, metrics = train_lstm(df, MODEL_PARAMS['lstm'], checkpoint_path, initial=previous)
+        metrics['incremental'] = previous is not None
+    else:
+        model, metrics = fit_forest(name, df, n_jobs, previous, new_rows)
+    return model, metrics, time.perf_counter() - started
+
+
+class TrainingOrchestrator:
+    """Brings a MLModelManager's models up to date with its data source.
+
+    ``run`` loads the training frames once, skips models whose stored copy
+    matches the data's fingerprint, and fits the rest concurrently in up to
+    ``max_workers`` processes, giving each forest an equal share of the
+    cores. A model is refitted incrementally when the store holds one
+    trained on a prefix of the current data (the rows it was trained on
+    hash to its stored fingerprint) and at most
+    INCREMENTAL_MAX_NEW_FRACTION of the rows are new. Fitted models are
+    saved to the store and installed in the manager.
+    """
+
+    def __init__(self, manager, max_workers=None, incremental=True):
+        self.manager = manager
+        self.max_workers = max_workers or len(MODEL_SCHEMAS)
+        self.incremental = incremental
+
+    def _previous(self, name, df):
+        # (previous model, new row count) when ``df`` only appended rows to what it was trained on
+        manifest = self.manager.store.manifest(name)
+        rows = (manifest or {}).get('metrics', {}).get('rows')
+        if not self.incremental or not rows or not 0 < len(df) - rows <= INCREMENTAL_MAX_NEW_FRACTION * len(df):
+            return None, 0
+        _, features, target = MODEL_SCHEMAS[name]
+        if fingerprint_training_data(df.iloc[:rows], features, target, MODEL_PARAMS[name]) != manifest['fingerprint']:
+            return None, 0
+        stored = self.manager.store.load(name, manifest['fingerprint'])
+        if stored is None:
+            return None, 0
+        return self.manager._deserialize_model(name, stored), len(df) - rows
+
+    def _plan(self, names, force, report):
+        frames = self.manager._get_training_frames()
+        jobs = []
+        for name in names:
+            started = time.perf_counter()
+            frame_name, features, target = MODEL_SCHEMAS[name]
+            df = frames[frame_name]
+            fingerprint = fingerprint_training_data(df, features, target, MODEL_PARAMS[name])
+            stored = None if force else self.manager.store.load(name, fingerprint)
+            if stored is not None:
+                self.manager._install(name, self.manager._deserialize_model(name, stored), fingerprint)
+                report[name] = {'status': 'current'}
+            else:
+                previous, new_rows = (None, 0) if force else self._previous(name, df)
+                columns = list(features) + [target] + [c for c in ('series_id', 'date') if name == 'lstm' and c in df]
+                jobs.append((name, df[columns], fingerprint, previous, new_rows))
+            report.setdefault(name, {})['timings_ms'] = {'plan': round((time.perf_counter() - started) * 1000, 2)}
+        return jobs
+
+    def run(self, names=None, force=False):
+        """Train what is stale (everything with ``force``); returns per-model status, metrics and stage timings"""
+        names = list(names or MODEL_SCHEMAS)
+        timings = {}
+        started = time.perf_counter()
+        report = {}
+
+        with self.manager._lock:
+            self.manager._get_training_frames()
+            timings['load_data'] = time.perf_counter() - started
+
+            stage = time.perf_counter()
+            jobs = self._plan(names, force, report)
+            timings['plan'] = time.perf_counter() - stage
+
+            stage = time.perf_counter()
+            # More processes than cores only adds start-up cost
+            workers = min(self.max_workers, len(jobs), os.cpu_count() or 1)
+            n_jobs = max(1, (os.cpu_count() or 1) // max(workers, 1))
+            save_seconds = 0.0
+            for name, fingerprint, df, result in self._fit(jobs, workers, n_jobs):
+                if isinstance(result, ImportError):
+                    # The LSTM without TensorFlow; it keeps being served from its stored copy
+                    print(f"Skipping {name} model training: {result}")
+                    report[name].update({'status': 'skipped', 'error': str(result)})
+                    continue
+                if isinstance(result, Exception):
+                    print(f"Training {name} model failed: {result!r}")
+                    report[name].update({'status': 'failed', 'error': str(result)})
+                    continue
+                model, metrics, fit_seconds = result
+                saving = time.perf_counter()
+                metrics['rows'] = len(df)
+                self.manager.store.save(name, fingerprint, self.manager._serialize_model(name, model), metrics)
+                self.manager._install(name, model, fingerprint, retrained=True)
+                save_seconds += time.perf_counter() - saving
+                report[name].update({'status': 'incremental' if metrics['incremental'] else 'trained',
+                                     'metrics': metrics})
+                report[name]['timings_ms'].update({'fit': round(fit_seconds * 1000, 2),
+                                                   'save': round((time.perf_counter() - saving) * 1000, 2)})
+            timings['fit'] = time.perf_counter() - stage - save_seconds
+            timings['save'] = save_seconds
+            self.manager._release_training_frames()
+
+        timings['total'] = time.perf_counter() - started
+        timings = {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
+        print(f"Model training finished: {({name: entry['status'] for name, entry in report.items()})}, "
+              f"stage timings (ms) {timings}")
+        return {'models': report, 'timings_ms': timings, 'workers': workers, 'n_jobs': n_jobs}
+
+    def _fit(self, jobs, workers, n_jobs):
+        # Yields (name, fingerprint, df, (model, metrics, seconds) or the exception raised)
+        def job_args(name, df, previous, new_rows, fingerprint):
+            checkpoint_path = os.path.join(self.manager.store.root, 'lstm', f'checkpoint-{fingerprint}.weights.h5')
+            return name, df, n_jobs, previous, new_rows, checkpoint_path
+
+        if workers <= 1:
+            for name, df, fingerprint, previous, new_rows in jobs:
+                try:
+                    result = _fit_job(*job_args(name, df, previous, new_rows, fingerprint))
+                except Exception as e:
+                    result = e
+                yield name, fingerprint, df, result
+            return
+
+        # Spawned rather than forked: the API process may hold threads (and TensorFlow must not be forked)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [(name, fingerprint, df, pool.submit(_fit_job, *job_args(name, df, previous, new_rows, fingerprint)))
+                       for name, df, fingerprint, previous, new_rows in jobs]
+            for name, fingerprint, df, future in futures:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                yield name, fingerprint, df, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train stale ML models (incrementally where possible)")
+    parser.add_argument('models', nargs='*', help=f"models to train, of {list(MODEL_SCHEMAS)} (default: all)")
+    parser.add_argument('--full', action='store_true', help="retrain from scratch even if the stored model is current")
+    parser.add_argument('--workers', type=int, default=None, help="models fitted at once")
+    args = parser.parse_args()
+    unknown = set(args.models) - set(MODEL_SCHEMAS)
+    if unknown:
+        parser.error(f"unknown models {sorted(unknown)}")
+    orchestrator = TrainingOrchestrator(MLModelManager(), max_workers=args.workers, incremental=not args.full)
+    print(json.dumps(orchestrator.run(args.models, force=args.full), indent=2, default=str))
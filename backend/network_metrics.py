@@ -0,0 +1,97 @@
+import math
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# Confidence level of the sampled clustering margin
+CLUSTERING_CONFIDENCE = 0.95
+
+
+def binary_adjacency(adjacency):
+    """0/1 copy of a CSR adjacency matrix (edge weights dropped)"""
+    return csr_matrix((np.ones(len(adjacency.data)), adjacency.indices, adjacency.indptr), shape=adjacency.shape)
+
+
+def local_clustering(adjacency, rows=None):
+    """Local clustering coefficient of ``rows`` (all nodes by default), from sparse triangle counts"""
+    binary = binary_adjacency(adjacency)
+    selected = binary if rows is None else binary[rows]
+    triangles = np.asarray((selected @ binary).multiply(selected).sum(axis=1)).ravel() / 2
+    degree = np.diff(selected.indptr)
+    possible = degree * (degree - 1) / 2
+    return np.divide(triangles, possible, out=np.zeros(len(degree)), where=possible > 0)
+
+
+def sampled_clustering(adjacency, samples, rng=None):
+    """Average clustering estimated from ``samples`` random nodes.
+
+    Returns (estimate, margin): every local coefficient lies in [0, 1], so
+    by Hoeffding's inequality the true average is within ``margin`` of the
+    estimate with probability CLUSTERING_CONFIDENCE. With ``samples`` at
+    least the node count the exact average is returned with margin 0.
+    """
+    n = adjacency.shape[0]
+    if n == 0:
+        return 0.0, 0.0
+    if samples >= n:
+        return float(local_clustering(adjacency).mean()), 0.0
+    rng = rng if rng is not None else np.random.default_rng()
+    rows = rng.choice(n, size=samples, replace=False)
+    margin = math.sqrt(math.log(2 / (1 - CLUSTERING_CONFIDENCE)) / (2 * samples))
+    return float(local_clustering(adjacency, rows).mean()), margin
+
+
+def eccentricity_bounds(adjacency, max_sweeps, weighted=False):
+    """Lower/upper bounds on every node's eccentricity from a few BFS (or Dijkstra) sweeps.
+
+    Uses the bounding scheme of Takes and Kosters: a sweep from ``v`` gives
+    ``max(ecc(v) - d(v, w), d(v, w)) <= ecc(w) <= ecc(v) + d(v, w)`` for
+    every node ``w``. Sources alternate between the node with the largest
+    upper bound (tightens the diameter) and the smallest lower bound
+    (tightens the radius/center), skipping nodes whose bounds already
+    meet, so the bounds are often exact long before every node is swept.
+    The graph must be connected. Returns (lower, upper, sweeps).
+    """
+    n = adjacency.shape[0]
+    lower = np.zeros(n)
+    upper = np.full(n, np.inf)
+    degree = np.diff(adjacency.indptr)
+    # Start from the best-connected node, a good center candidate
+    source = int(np.argmax(degree)) if n else None
+
+    sweeps = 0
+    while sweeps < max_sweeps and source is not None:
+        distances = dijkstra(adjacency, directed=False, unweighted=not weighted, indices=source)
+        eccentricity = distances.max()
+        lower = np.maximum(lower, np.maximum(eccentricity - distances, distances))
+        upper = np.minimum(upper, eccentricity + distances)
+        lower[source] = upper[source] = eccentricity
+        sweeps += 1
+
+        unresolved = np.nonzero(lower < upper)[0]
+        if not len(unresolved):
+            break
+        if sweeps % 2:
+            source = int(unresolved[np.argmin(lower[unresolved] - 1e-9 * degree[unresolved])])
+        else:
+            source = int(unresolved[np.argmax(upper[unresolved] + 1e-9 * degree[unresolved])])
+    return lower, upper, sweeps
+
+
+def diameter_and_center(lower, upper):
+    """Diameter, radius and center estimates from eccentricity bounds.
+
+    Returns a dict with ``diameter_bounds`` and ``radius_bounds`` (each
+    [low, high], equal when exact), ``center_nodes``: the node indices
+    with the smallest proven upper bound, and ``center_exact``: whether no
+    other node can still reach that eccentricity.
+    """
+    radius_high = upper.min()
+    center = upper == radius_high
+    return {
+        'diameter_bounds': [float(lower.max()), float(upper.max())],
+        'radius_bounds': [float(lower.min()), float(radius_high)],
+        'center_nodes': np.nonzero(center)[0],
+        'center_exact': bool(np.all(center | (lower > radius_high)))
+    }
@@ -0,0 +1,148 @@
+"""Opt-in sampling profiler for slow requests.
+
+While enabled, a background thread samples every thread's Python stack
+every few milliseconds into a ring buffer. When a request takes longer
+than ``slow_ms`` the samples taken during it are written out as folded
+stacks (``thread;outer;...;inner count`` per line), ready for
+flamegraph.pl, speedscope or inferno. The sampler thread writes them
+too, so slow requests are not also charged for the disk I/O. Disabled,
+it costs nothing: no thread runs and the middleware only checks a flag.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+PROFILE_ENABLED = os.environ.get('SMARTCARE_PROFILE', '0') == '1'
+PROFILE_SLOW_MS = float(os.environ.get('SMARTCARE_PROFILE_SLOW_MS', '500'))
+PROFILE_INTERVAL_MS = float(os.environ.get('SMARTCARE_PROFILE_INTERVAL_MS', '5'))
+PROFILE_DIR = os.environ.get('SMARTCARE_PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'profiles'))
+
+# Samples kept (about a minute of one busy thread at 5ms) and dump files kept
+MAX_SAMPLES = 20_000
+MAX_DUMPS = 50
+
+# Leaf frames of threads that are only waiting; left out so dumps show work
+IDLE_LEAVES = {('selectors.py', 'select'), ('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock')}
+
+
+class SamplingProfiler:
+    def __init__(self, slow_ms=PROFILE_SLOW_MS, interval_ms=PROFILE_INTERVAL_MS, directory=PROFILE_DIR,
+                 max_samples=MAX_SAMPLES, max_dumps=MAX_DUMPS):
+        self.slow_seconds = slow_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self.enabled = False
+        self.dumps = deque(maxlen=max_dumps)
+        # (perf_counter time, thread name, stack from outermost frame)
+        self._samples = deque(maxlen=max_samples)
+        self._labels = {}
+        # (label, start, end) of slow requests waiting for the sampler thread to write them out
+        self._requested = deque()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, slow_ms=None):
+        with self._lock:
+            if slow_ms is not None:
+                self.slow_seconds = slow_ms / 1000
+            if self.enabled:
+                return
+            self.enabled = True
+            self._thread = threading.Thread(target=self._run, name='smartcare-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self.enabled = False
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+        self._samples.clear()
+
+    def request_dump(self, label, start, end):
+        """Have the sampler thread ``dump`` a request's samples; returns at once"""
+        self._requested.append((label, start, end))
+
+    def _write_requested(self):
+        while self._requested:
+            label, start, end = self._requested.popleft()
+            try:
+                self.dump(label, start, end)
+            except OSError as e:
+                print(f"Failed to write profile of {label}: {e}")
+
+    def _run(self):
+        own = threading.get_ident()
+        while self.enabled:
+            self._write_requested()
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = self._stack(frame)
+                if stack is not None:
+                    self._samples.append((now, names.get(ident, str(ident)), stack))
+            time.sleep(self.interval)
+        # Requests that finished just before stop() still get their dump
+        self._write_requested()
+
+    def _stack(self, frame):
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+            return None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = (f'{code.co_name} ({os.path.basename(code.co_filename)}:'
+                                              f'{code.co_firstlineno})').replace(';', ':')
+            stack.append(label)
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def dump(self, label, start, end):
+        """Write the samples taken between ``start`` and ``end`` (perf_counter times) as folded stacks"""
+        # list() copies the deque without letting the sampler thread append mid-copy
+        samples = [(thread, stack) for at, thread, stack in list(self._samples) if start <= at <= end]
+        if not samples:
+            return None
+        folded = Counter(';'.join((thread,) + stack) for thread, stack in samples)
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int((end - start) * 1000)}ms-" \
+               f"{re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')}.folded"
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.writelines(f'{stack} {count}\n' for stack, count in folded.most_common())
+
+        if len(self.dumps) == self.dumps.maxlen:
+            try:
+                os.remove(os.path.join(self.directory, self.dumps[0]['file']))
+            except OSError:
+                pass
+        self.dumps.append({'file': name, 'label': label, 'duration_ms': round((end - start) * 1000, 1),
+                           'samples': len(samples)})
+        print(f"Profiled slow request {label} ({(end - start) * 1000:.0f}ms): {name}")
+        return name
+
+    def read_dump(self, name):
+        """Folded stacks of a dump listed in ``dumps``, or None"""
+        if not any(dump['file'] == name for dump in self.dumps):
+            return None
+        try:
+            with open(os.path.join(self.directory, name)) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def status(self):
+        return {
+            'enabled': self.enabled,
+            'slow_ms': self.slow_seconds * 1000,
+            'interval_ms': self.interval * 1000,
+            'samples': len(self._samples),
+            'dumps': list(self.dumps)
+        }
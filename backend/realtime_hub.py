@@ -0,0 +1,210 @@
+import asyncio
+import itertools
+import json
+from collections import OrderedDict
+
+from fastapi import WebSocket
+
+# Close codes for connections the hub drops: too slow to keep up, or a failed send
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_INTERNAL_ERROR = 1011
+
+# Topics of a connection that names none: the sensor readings /ws has always streamed.
+# Other topics (e.g. "alerts", "routes") are opt-in
+DEFAULT_TOPICS = ('sensors',)
+
+
+class Subscriber:
+    """One websocket connection with its filters and a bounded send queue.
+
+    Pending messages are keyed (e.g. by sensor id): a newer message for a
+    key that is still queued replaces the old one, and when the queue is
+    full the oldest pending message is dropped. A slow client therefore
+    only ever receives the freshest data and never holds up anyone else.
+    Without ``topics`` a subscriber gets ``DEFAULT_TOPICS`` only; without
+    ``sensor_ids`` or ``locations`` those are not filtered on.
+    """
+
+    def __init__(self, websocket: WebSocket, topics=None, sensor_ids=None, locations=None, max_pending=32):
+        self.websocket = websocket
+        self.topics = set(topics) if topics else set(DEFAULT_TOPICS)
+        self.sensor_ids = set(sensor_ids) if sensor_ids else None
+        self.locations = set(locations) if locations else None
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.ready = asyncio.Event()
+        self.sender = None
+
+    def matches(self, topic, message):
+        if topic not in self.topics:
+            return False
+        if self.sensor_ids is not None and message.get('sensor_id') not in self.sensor_ids:
+            return False
+        if self.locations is not None and message.get('location') not in self.locations:
+            return False
+        return True
+
+    def offer(self, key, payload):
+        """Queue a payload; returns 'coalesced' or 'dropped' when an older message was discarded"""
+        outcome = None
+        if key in self.pending:
+            outcome = 'coalesced'
+        elif len(self.pending) >= self.max_pending:
+            self.pending.popitem(last=False)
+            outcome = 'dropped'
+        self.pending[key] = payload
+        self.ready.set()
+        return outcome
+
+    def update_filters(self, request):
+        """Apply a subscribe/unsubscribe message from the client"""
+        action = request.get('action', 'subscribe')
+        for field in ('topics', 'sensor_ids', 'locations'):
+            values = request.get(field)
+            if values is None:
+                continue
+            current = getattr(self, field)
+            if action == 'subscribe':
+                setattr(self, field, (current or set()) | set(values))
+            elif action == 'unsubscribe' and current is not None:
+                remaining = current - set(values)
+                # No topics left means nothing is delivered; no sensor ids or locations means no filter
+                setattr(self, field, remaining if field == 'topics' or remaining else None)
+
+
+class PubSubHub:
+    """Topic-based websocket fan-out with one producer per topic.
+
+    Each message is serialized once and offered to the queue of every
+    matching subscriber; per-subscriber sender tasks do the actual socket
+    writes concurrently, with a send timeout after which the client is
+    disconnected. Connections are kept in a set, so connect and disconnect
+    are O(1).
+    """
+
+    def __init__(self, max_pending=32, send_timeout=5.0):
+        self.subscribers = set()
+        self.max_pending = max_pending
+        self.send_timeout = send_timeout
+        self.published = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.disconnected_slow = 0
+        self.send_errors = 0
+        self._producers = {}
+        self._closing = set()
+        self._message_ids = itertools.count()
+
+    async def connect(self, websocket: WebSocket, topics=None, sensor_ids=None, locations=None):
+        await websocket.accept()
+        subscriber = Subscriber(websocket, topics, sensor_ids, locations, self.max_pending)
+        subscriber.sender = asyncio.create_task(self._sender(subscriber))
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber, code=None):
+        """Stop delivering to ``subscriber``; with a close ``code`` the hub also closes its socket"""
+        self.subscribers.discard(subscriber)
+        if subscriber.sender is not None and subscriber.sender is not asyncio.current_task():
+            subscriber.sender.cancel()
+        if code is not None:
+            # Closing makes the endpoint's receive loop end, so the client notices and can reconnect
+            task = asyncio.create_task(self._close(subscriber.websocket, code))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket: WebSocket, code):
+        try:
+            await asyncio.wait_for(websocket.close(code), self.send_timeout)
+        except Exception:
+            # Already closed, or the client is gone; either way nothing is left to clean up
+            pass
+
+    def publish(self, topic, message, key_field='sensor_id'):
+        """Queue ``message`` for every subscriber of ``topic`` whose filters match"""
+        payload = json.dumps(message)
+        key = (topic, message.get(key_field)) if message.get(key_field) is not None else next(self._message_ids)
+        for subscriber in self.subscribers:
+            if subscriber.matches(topic, message):
+                outcome = subscriber.offer(key, payload)
+                if outcome == 'dropped':
+                    self.dropped += 1
+                elif outcome == 'coalesced':
+                    self.coalesced += 1
+        self.published += 1
+
+    async def broadcast(self, message: str):
+        """Send a message to every connection right away, concurrently"""
+        subscribers = list(self.subscribers)
+        results = await asyncio.gather(
+            *(asyncio.wait_for(s.websocket.send_text(message), self.send_timeout) for s in subscribers),
+            return_exceptions=True
+        )
+        for subscriber, result in zip(subscribers, results):
+            if isinstance(result, Exception):
+                self.send_errors += 1
+                print(f"Dropping websocket after failed broadcast: {result!r}")
+                self.disconnect(subscriber, CLOSE_TRY_AGAIN_LATER if isinstance(result, asyncio.TimeoutError)
+                                else CLOSE_INTERNAL_ERROR)
+
+    async def _sender(self, subscriber: Subscriber):
+        try:
+            while True:
+                await subscriber.ready.wait()
+                while subscriber.pending:
+                    _, payload = subscriber.pending.popitem(last=False)
+                    await asyncio.wait_for(subscriber.websocket.send_text(payload), self.send_timeout)
+                    self.sent += 1
+                subscriber.ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.disconnected_slow += 1
+            self.disconnect(subscriber, CLOSE_TRY_AGAIN_LATER)
+        except Exception as e:
+            self.send_errors += 1
+            print(f"Dropping websocket after send error: {e!r}")
+            self.disconnect(subscriber, CLOSE_INTERNAL_ERROR)
+
+    def start_producer(self, topic, produce, interval):
+        """Run ``produce()`` every ``interval`` seconds and publish its messages to ``topic``"""
+        if topic in self._producers and not self._producers[topic].done():
+            return
+
+        async def run():
+            while True:
+                try:
+                    for message in produce():
+                        self.publish(topic, message)
+                except Exception as e:
+                    print(f"Producer for topic {topic} failed: {e!r}")
+                await asyncio.sleep(interval)
+
+        self._producers[topic] = asyncio.create_task(run())
+
+    async def stop(self):
+        tasks = list(self._producers.values()) + [s.sender for s in self.subscribers if s.sender] + list(self._closing)
+        pending = set(tasks)
+        while pending:
+            for task in pending:
+                task.cancel()
+            # Re-cancelled until done: before Python 3.12, wait_for swallows a cancellation that arrives
+            # as the send completes, leaving a sender waiting on its next message
+            _, pending = await asyncio.wait(pending, timeout=0.1)
+        self._producers.clear()
+        self.subscribers.clear()
+
+    def stats(self):
+        depths = [len(s.pending) for s in self.subscribers]
+        return {
+            'connections': len(depths),
+            'published': self.published,
+            'queued': sum(depths),
+            'max_queue_depth': max(depths, default=0),
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'disconnected_slow': self.disconnected_slow,
+            'send_errors': self.send_errors
+        }
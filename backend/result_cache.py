@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+class CacheEntry:
+    def __init__(self, body: bytes, expires_at: float):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.expires_at = expires_at
+
+
+class ResultCache:
+    """Shared TTL + LRU cache of serialized endpoint results.
+
+    Keys combine the endpoint, its parameters and the version of the data
+    behind it (model fingerprints, network version), so retraining a model
+    or changing the graph makes old entries unreachable and they age out of
+    the LRU. Versions must reflect the process that owns the state: the ML
+    model version is shared with process-pool workers, and the graph always
+    runs in the API process. Concurrent misses for the same key share one
+    computation.
+    """
+
+    def __init__(self, max_entries=256, default_ttl=60.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def get_or_compute(self, key, compute, ttl=None):
+        """Return the cached entry for ``key`` = (endpoint, params, version).
+
+        On a miss ``await compute()`` runs once; concurrent callers for the
+        same key wait for that result instead of computing it again.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            del self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            body = json.dumps(jsonable_encoder(value), separators=(',', ':')).encode()
+            entry = CacheEntry(body, time.monotonic() + (ttl if ttl is not None else self.default_ttl))
+            self._store(key, entry)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _store(self, key, entry):
+        # Entries for the same endpoint and parameters but an older data version are dead
+        endpoint, params, version = key
+        for stale in [k for k in self._entries if k[0] == endpoint and k[1] == params and k[2] != version]:
+            del self._entries[stale]
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, endpoint=None):
+        """Drop all entries, or only those of one endpoint"""
+        if endpoint is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == endpoint]:
+            del self._entries[key]
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions
+        }
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+async def cached_response(cache: ResultCache, request: Request, endpoint, params, version, compute, ttl=None):
+    """Serve ``compute()`` through the cache with ETag / If-None-Match support"""
+    key = (endpoint, params, version)
+    entry = await cache.get_or_compute(key, compute, ttl)
+    max_age = max(0, int(entry.expires_at - time.monotonic()))
+    headers = {'ETag': entry.etag, 'Cache-Control': f'private, max-age={max_age}'}
+
+    if etag_matches(request.headers.get('if-none-match'), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type='application/json', headers=headers)
@@ -0,0 +1,340 @@
+import asyncio
+import time
+
+import numpy as np
+from scipy.signal import lfilter
+
+from timeseries_store import SENSOR_FIELDS
+
+# Spoilage risk levels in increasing order, as returned by predict_spoilage_batch
+RISK_LEVELS = ('Low', 'Medium', 'High')
+
+# food_quality reported with a sensor's readings, by its current risk level
+FOOD_QUALITY = {None: 'Fresh', 'Low': 'Good', 'Medium': 'Warning', 'High': 'Critical'}
+
+# Food category assumed for sensors that were never registered
+DEFAULT_FOOD_TYPE = 0
+
+SECONDS_PER_DAY = 86400
+
+# Sensors with at least this many readings in one batch are folded in as a series (one filter pass)
+# rather than one round per reading
+SERIES_MIN_READINGS = 16
+
+
+class SensorAlertMonitor:
+    """Online anomaly and spoilage alerting over the sensor stream.
+
+    Per sensor it keeps an exponentially weighted mean and variance of
+    every field (O(1) memory, in column arrays indexed by a slot per
+    sensor). A reading is anomalous when any field's z-score against the
+    state before it exceeds ``z_threshold``, once the sensor has ``warmup``
+    readings. Sensors whose spoilage inputs (temperature, humidity, days
+    stored, food type) moved by more than the tolerances since they were
+    last scored are marked dirty; ``run`` scores all dirty sensors in one
+    call to ``score`` every ``score_interval`` seconds, so unchanged
+    sensors are never re-scored. Only state transitions are passed to
+    ``on_alert``.
+    """
+
+    def __init__(self, score=None, on_alert=None, fields=SENSOR_FIELDS, alpha=0.1, z_threshold=3.0, warmup=10,
+                 score_interval=0.25, temperature_tolerance=0.25, humidity_tolerance=1.0, capacity=1024):
+        # score: async (temperature, humidity, days_stored, food_type) -> {'spoilage_probability', 'risk_level'}
+        self.score = score
+        self.on_alert = on_alert
+        self.fields = tuple(fields)
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.score_interval = score_interval
+        self.tolerances = np.array([temperature_tolerance, humidity_tolerance])
+        self._temperature = self.fields.index('temperature')
+        self._humidity = self.fields.index('humidity')
+
+        self.slots = {}
+        self.sensor_ids = []
+        self._allocate(capacity)
+        self.readings = 0
+        self.scored = 0
+        self.alerts = 0
+        self.last_score_ms = 0.0
+        self.max_alert_latency_ms = 0.0
+        self._scorer = None
+
+    def _allocate(self, capacity):
+        n_fields = len(self.fields)
+        old = getattr(self, 'count', None)
+        arrays = {
+            'count': np.zeros(capacity, dtype=np.int64),
+            'mean': np.zeros((capacity, n_fields)),
+            'var': np.zeros((capacity, n_fields)),
+            'zscores': np.zeros((capacity, n_fields)),
+            'last': np.full((capacity, n_fields), np.nan),
+            'last_timestamp': np.full(capacity, np.nan),
+            'anomalous': np.zeros(capacity, dtype=bool),
+            'food_type': np.full(capacity, DEFAULT_FOOD_TYPE, dtype=np.int64),
+            'stocked_at': np.full(capacity, np.nan),
+            # Inputs last scored: temperature, humidity, days stored, food type
+            'scored_inputs': np.full((capacity, 4), np.nan),
+            'risk': np.full(capacity, -1, dtype=np.int8),
+            'probability': np.full(capacity, np.nan),
+            'dirty': np.zeros(capacity, dtype=bool),
+            'dirty_since': np.zeros(capacity),
+        }
+        if old is not None:
+            for name, array in arrays.items():
+                array[:len(old)] = getattr(self, name)
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    def _slot(self, sensor_id):
+        slot = self.slots.get(sensor_id)
+        if slot is None:
+            slot = self.slots[sensor_id] = len(self.sensor_ids)
+            self.sensor_ids.append(sensor_id)
+            if slot >= len(self.count):
+                self._allocate(2 * len(self.count))
+        return slot
+
+    def register_sensor(self, sensor_id, food_type=DEFAULT_FOOD_TYPE, stocked_at=None):
+        """Record what a sensor's compartment holds and since when (epoch seconds, default now)"""
+        slot = self._slot(sensor_id)
+        self.food_type[slot] = food_type
+        self.stocked_at[slot] = time.time() if stocked_at is None else stocked_at
+        self._mark_dirty(np.array([slot]))
+
+    def update(self, sensor_ids, timestamps, values):
+        """Fold a batch of readings into the running statistics; returns the alerts raised.
+
+        ``values`` is an (n, len(fields)) array or a dict of field columns.
+        Readings of one sensor are applied in timestamp order. Sensors with
+        few readings are handled in rounds, the k-th reading of every such
+        sensor at once; sensors with many are each folded in with a single
+        recurrence over their readings, so a batch costs O(n) either way.
+        """
+        if isinstance(values, dict):
+            values = np.column_stack([np.asarray(values[field], dtype=np.float64) for field in self.fields])
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.fields))
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if not len(timestamps):
+            return []
+
+        slots = np.array([self._slot(sensor_id) for sensor_id in sensor_ids], dtype=np.int64)
+        order = np.lexsort((timestamps, slots))
+        slots, timestamps, values = slots[order], timestamps[order], values[order]
+        starts = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+        ends = np.r_[starts[1:], len(slots)]
+        lengths = ends - starts
+        rank = np.arange(len(slots)) - np.repeat(starts, lengths)
+
+        alerts = []
+        short = np.repeat(lengths < SERIES_MIN_READINGS, lengths)
+        for r in range(min(int(rank.max()) + 1, SERIES_MIN_READINGS - 1)):
+            rows = short & (rank == r)
+            if rows.any():
+                alerts += self._observe(slots[rows], timestamps[rows], values[rows])
+        for start, end in zip(starts[lengths >= SERIES_MIN_READINGS].tolist(),
+                              ends[lengths >= SERIES_MIN_READINGS].tolist()):
+            alerts += self._observe_series(int(slots[start]), timestamps[start:end], values[start:end])
+        self.readings += len(slots)
+
+        touched = slots[starts]
+        new = np.isnan(self.stocked_at[touched])
+        self.stocked_at[touched[new]] = self.last_timestamp[touched[new]]
+        self._mark_dirty(touched)
+        self._emit(alerts)
+        return alerts
+
+    def _observe(self, slots, timestamps, x):
+        # One reading for each of ``slots`` (all distinct)
+        count, mean, var = self.count[slots], self.mean[slots], self.var[slots]
+        std = np.sqrt(var)
+        z = np.divide(x - mean, std, out=np.zeros_like(x), where=std > 0)
+        anomalous = (count >= self.warmup) & (np.abs(z) > self.z_threshold).any(axis=1)
+
+        # Exponentially weighted mean and variance; the first reading seeds the mean
+        mean = np.where((count == 0)[:, None], x, mean)
+        diff = x - mean
+        increment = self.alpha * diff
+        self.mean[slots] = mean + increment
+        self.var[slots] = (1 - self.alpha) * (var + diff * increment)
+        self.count[slots] = count + 1
+        self.zscores[slots] = z
+        self.last[slots] = x
+        self.last_timestamp[slots] = timestamps
+
+        alerts = []
+        for i in np.flatnonzero(anomalous != self.anomalous[slots]).tolist():
+            slot = int(slots[i])
+            alerts.append({
+                'alert_id': f"{self.sensor_ids[slot]}:anomaly",
+                'sensor_id': self.sensor_ids[slot],
+                'type': 'anomaly',
+                'state': 'anomaly' if anomalous[i] else 'normal',
+                'timestamp': float(timestamps[i]),
+                'values': dict(zip(self.fields, x[i].tolist())),
+                'z_scores': {field: round(v, 2) for field, v in zip(self.fields, z[i].tolist())}
+            })
+        self.anomalous[slots] = anomalous
+        return alerts
+
+    def _observe_series(self, slot, timestamps, x):
+        # Consecutive readings of one sensor; the same updates as _observe, as linear recurrences
+        count, mean, var = self.count[slot], self.mean[slot], self.var[slot]
+        decay = 1 - self.alpha
+        if count == 0:
+            mean = x[0]
+        # Running mean after each reading, then the mean and variance each reading is compared against
+        after = lfilter([self.alpha], [1, -decay], x, axis=0, zi=(decay * mean)[None, :])[0]
+        means = np.vstack((mean, after[:-1]))
+        diff = x - means
+        var_after = lfilter([decay * self.alpha], [1, -decay], diff * diff, axis=0, zi=(decay * var)[None, :])[0]
+        std = np.sqrt(np.vstack((var, var_after[:-1])))
+        z = np.divide(diff, std, out=np.zeros_like(x), where=std > 0)
+        counts = count + np.arange(len(x))
+        anomalous = (counts >= self.warmup) & (np.abs(z) > self.z_threshold).any(axis=1)
+
+        self.mean[slot] = after[-1]
+        self.var[slot] = var_after[-1]
+        self.count[slot] = count + len(x)
+        self.zscores[slot] = z[-1]
+        self.last[slot] = x[-1]
+        self.last_timestamp[slot] = timestamps[-1]
+
+        previous = np.r_[self.anomalous[slot], anomalous[:-1]]
+        alerts = [{
+            'alert_id': f"{self.sensor_ids[slot]}:anomaly",
+            'sensor_id': self.sensor_ids[slot],
+            'type': 'anomaly',
+            'state': 'anomaly' if anomalous[i] else 'normal',
+            'timestamp': float(timestamps[i]),
+            'values': dict(zip(self.fields, x[i].tolist())),
+            'z_scores': {field: round(v, 2) for field, v in zip(self.fields, z[i].tolist())}
+        } for i in np.flatnonzero(anomalous != previous).tolist()]
+        self.anomalous[slot] = anomalous[-1]
+        return alerts
+
+    def _inputs(self, slots):
+        # Spoilage model inputs: latest temperature/humidity, whole days stored (from 1), food type
+        days = 1 + np.floor((self.last_timestamp[slots] - self.stocked_at[slots]) / SECONDS_PER_DAY)
+        return np.column_stack((self.last[slots, self._temperature], self.last[slots, self._humidity],
+                                np.maximum(days, 1), self.food_type[slots]))
+
+    def _mark_dirty(self, slots):
+        slots = slots[~np.isnan(self.last_timestamp[slots])]
+        inputs, scored = self._inputs(slots), self.scored_inputs[slots]
+        moved = ((self.risk[slots] < 0)
+                 | (np.abs(inputs[:, :2] - scored[:, :2]) > self.tolerances).any(axis=1)
+                 | (inputs[:, 2:] != scored[:, 2:]).any(axis=1))
+        newly = slots[moved & ~self.dirty[slots]]
+        self.dirty[newly] = True
+        self.dirty_since[newly] = time.monotonic()
+
+    async def score_pending(self):
+        """Score every dirty sensor in one batch; returns the spoilage alerts raised"""
+        slots = np.flatnonzero(self.dirty[:len(self.sensor_ids)])
+        if not len(slots) or self.score is None:
+            return []
+        started = time.monotonic()
+        # Cleared up front so readings that arrive while scoring mark their sensor again
+        since = self.dirty_since[slots].copy()
+        self.dirty[slots] = False
+        inputs = self._inputs(slots)
+        try:
+            result = await self.score(*inputs.T)
+        except BaseException:
+            # Not scored: keep the sensors pending (since their first change) for the next round
+            self.dirty[slots] = True
+            self.dirty_since[slots] = since
+            raise
+
+        self.scored_inputs[slots] = inputs
+        self.probability[slots] = result['spoilage_probability']
+        risk = np.array([RISK_LEVELS.index(level) for level in np.asarray(result['risk_level']).tolist()],
+                        dtype=np.int8)
+        # Unscored sensors count as Low, so a fleet coming online does not alert
+        changed = np.flatnonzero(risk != np.maximum(self.risk[slots], 0))
+        alerts = [{
+            'alert_id': f"{self.sensor_ids[slot]}:spoilage",
+            'sensor_id': self.sensor_ids[slot],
+            'type': 'spoilage',
+            'state': RISK_LEVELS[risk[i]],
+            'previous': RISK_LEVELS[max(self.risk[slot], 0)],
+            'spoilage_probability': float(self.probability[slot]),
+            'timestamp': float(self.last_timestamp[slot])
+        } for i, slot in zip(changed.tolist(), slots[changed].tolist())]
+        self.risk[slots] = risk
+
+        finished = time.monotonic()
+        self.scored += len(slots)
+        self.last_score_ms = round((finished - started) * 1000, 2)
+        self.max_alert_latency_ms = round(float((finished - since.min()) * 1000), 2)
+        self._emit(alerts)
+        return alerts
+
+    def _emit(self, alerts):
+        self.alerts += len(alerts)
+        if self.on_alert is not None:
+            for alert in alerts:
+                self.on_alert(alert)
+
+    def start(self):
+        if self._scorer is None or self._scorer.done():
+            self._scorer = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._scorer is None:
+            return
+        self._scorer.cancel()
+        try:
+            await self._scorer
+        except asyncio.CancelledError:
+            pass
+        self._scorer = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.score_interval)
+            try:
+                await self.score_pending()
+            except Exception as e:
+                print(f"Spoilage scoring of sensor stream failed: {e!r}")
+
+    def food_quality(self, sensor_id):
+        slot = self.slots.get(sensor_id)
+        risk = None if slot is None or self.risk[slot] < 0 else RISK_LEVELS[self.risk[slot]]
+        return FOOD_QUALITY[risk]
+
+    def state(self, sensor_id):
+        """Current statistics and alert state of one sensor, or None"""
+        slot = self.slots.get(sensor_id)
+        if slot is None:
+            return None
+        return {
+            'sensor_id': sensor_id,
+            'readings': int(self.count[slot]),
+            'anomalous': bool(self.anomalous[slot]),
+            'mean': dict(zip(self.fields, np.round(self.mean[slot], 3).tolist())),
+            'std': dict(zip(self.fields, np.round(np.sqrt(self.var[slot]), 3).tolist())),
+            'z_scores': dict(zip(self.fields, np.round(self.zscores[slot], 2).tolist())),
+            'risk_level': RISK_LEVELS[self.risk[slot]] if self.risk[slot] >= 0 else None,
+            'spoilage_probability': None if np.isnan(self.probability[slot]) else float(self.probability[slot]),
+            'food_quality': self.food_quality(sensor_id)
+        }
+
+    def active_alerts(self):
+        """States of sensors currently anomalous or at Medium/High spoilage risk"""
+        n = len(self.sensor_ids)
+        active = np.flatnonzero(self.anomalous[:n] | (self.risk[:n] > 0))
+        return [self.state(self.sensor_ids[slot]) for slot in active.tolist()]
+
+    def stats(self):
+        return {
+            'sensors': len(self.sensor_ids),
+            'readings': self.readings,
+            'scored': self.scored,
+            'pending_scores': int(self.dirty[:len(self.sensor_ids)].sum()),
+            'alerts': self.alerts,
+            'last_score_ms': self.last_score_ms,
+            'max_alert_latency_ms': self.max_alert_latency_ms
+        }
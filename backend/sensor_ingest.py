@@ -0,0 +1,130 @@
+import asyncio
+
+import numpy as np
+
+
+async def ndjson_chunks(stream, max_lines):
+    """Regroup a byte stream of NDJSON into JSON-array byte strings of up to ``max_lines`` records"""
+    buffer = b''
+    lines = []
+    async for data in stream:
+        buffer += data
+        *complete, buffer = buffer.split(b'\n')
+        lines.extend(line for line in complete if line.strip())
+        while len(lines) >= max_lines:
+            yield b'[' + b','.join(lines[:max_lines]) + b']'
+            lines = lines[max_lines:]
+    if buffer.strip():
+        lines.append(buffer)
+    if lines:
+        yield b'[' + b','.join(lines) + b']'
+
+
+class IngestQueueFull(Exception):
+    """Raised when the ingest queue stays full for longer than the put timeout"""
+
+
+class SensorIngestPipeline:
+    """Bounded asyncio queue between the ingest endpoint and the time-series store.
+
+    Producers submit already-validated batches in columnar form and wait at
+    most ``put_timeout`` seconds for room in the queue, which is how
+    backpressure reaches the HTTP clients. A single background consumer
+    drains the queue and merges small batches up to ``max_write_rows``. It
+    writes them to the store with ``append_many`` and hands them to the
+    alert ``monitor``, if there is one, in steps of at most ``max_step_rows``
+    rows (whole sensors where they fit, consecutive slices of one sensor's
+    readings where they do not). It yields to the event loop between steps,
+    so a large batch never stalls other handlers for longer than one step.
+    """
+
+    def __init__(self, store, max_pending_batches=256, max_write_rows=20000, max_step_rows=500,
+                 put_timeout=1.0, monitor=None):
+        self.store = store
+        self.monitor = monitor
+        self.queue = asyncio.Queue(maxsize=max_pending_batches)
+        self.max_write_rows = max_write_rows
+        self.max_step_rows = max_step_rows
+        self.put_timeout = put_timeout
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self._consumer = None
+
+    def start(self):
+        if self._consumer is None or self._consumer.done():
+            self._consumer = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Flush everything that was accepted, then stop the consumer"""
+        if self._consumer is None:
+            return
+        await self.queue.join()
+        self._consumer.cancel()
+        try:
+            await self._consumer
+        except asyncio.CancelledError:
+            pass
+        self._consumer = None
+
+    async def submit(self, batch):
+        """Queue a columnar batch (dict with sensor_id, timestamp and field columns)"""
+        rows = len(batch['sensor_id'])
+        if not rows:
+            return 0
+        try:
+            await asyncio.wait_for(self.queue.put(batch), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += rows
+            raise IngestQueueFull(f"Ingest queue is full ({self.queue.maxsize} batches pending)")
+        self.accepted += rows
+        return rows
+
+    async def run(self):
+        while True:
+            batches = [await self.queue.get()]
+            rows = len(batches[0]['sensor_id'])
+            # Coalesce whatever else is already waiting into one store write
+            while rows < self.max_write_rows and not self.queue.empty():
+                batch = self.queue.get_nowait()
+                batches.append(batch)
+                rows += len(batch['sensor_id'])
+            try:
+                await self._write(batches)
+            except Exception as e:
+                print(f"Failed to write {rows} sensor readings: {e}")
+            finally:
+                for _ in batches:
+                    self.queue.task_done()
+
+    async def _write(self, batches):
+        merged = {key: np.concatenate([np.asarray(b[key]) for b in batches]) for key in batches[0]}
+        # Grouped by sensor (stable, so each sensor's readings keep their order) and cut at the last
+        # sensor boundary within a step, so most sensors are written once per batch; a sensor with
+        # more readings than fit in a step is written in consecutive slices
+        order = np.argsort(merged['sensor_id'], kind='stable')
+        merged = {key: column[order] for key, column in merged.items()}
+        sensor_ids = merged['sensor_id']
+        boundaries = np.flatnonzero(sensor_ids[1:] != sensor_ids[:-1]) + 1
+        start = 0
+        while start < len(sensor_ids):
+            limit = min(start + self.max_step_rows, len(sensor_ids))
+            cut = np.searchsorted(boundaries, limit, side='right') - 1
+            end = int(boundaries[cut]) if limit < len(sensor_ids) and cut >= 0 and boundaries[cut] > start \
+                else limit
+            step = slice(start, end)
+            values = {field: merged[field][step] for field in self.store.fields}
+            self.store.append_many(sensor_ids[step], merged['timestamp'][step], values)
+            self.written += end - start
+            if self.monitor is not None:
+                self.monitor.update(sensor_ids[step].tolist(), merged['timestamp'][step], values)
+            start = end
+            await asyncio.sleep(0)
+
+    def stats(self):
+        return {
+            'pending_batches': self.queue.qsize(),
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'written': self.written
+        }
@@ -0,0 +1,255 @@
+import warnings
+from collections import OrderedDict
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import SparseEfficiencyWarning
+from scipy.sparse.csgraph import dijkstra
+
+# Predecessor value scipy uses for "no predecessor"
+NO_PREDECESSOR = -9999
+
+
+class ShortestPathBase:
+    """Node lookup and edge-weight writes shared by the path stores below"""
+
+    def index_of(self, node):
+        try:
+            return self.index[node]
+        except KeyError:
+            raise nx.NodeNotFound(f"Node {node} not in the distribution network")
+
+    def _set_adjacency(self, i, j, weight):
+        # Adding a brand-new edge changes the CSR sparsity structure; that is
+        # rare enough here that the efficiency warning is not useful.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', SparseEfficiencyWarning)
+            self.adjacency[i, j] = weight
+            self.adjacency[j, i] = weight
+
+
+class ShortestPathMatrix(ShortestPathBase):
+    """Dense all-pairs shortest-path distances and predecessors for a graph.
+
+    Built once with scipy's Dijkstra over a CSR copy of the edge weights;
+    route queries are then an O(1) distance lookup plus path reconstruction.
+    Edge-weight changes are applied incrementally (see ``update_edges``).
+    The graph is undirected, so row ``i`` doubles as column ``i``.
+    """
+
+    def __init__(self, graph, weight='weight'):
+        nodes = list(graph.nodes())
+        self._build(nodes, nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=weight, format='csr'))
+
+    @classmethod
+    def from_adjacency(cls, nodes, adjacency):
+        """Build from node ids and a symmetric CSR weight matrix (e.g. a CompactNetwork's)"""
+        paths = cls.__new__(cls)
+        paths._build(list(nodes), adjacency)
+        return paths
+
+    def _build(self, nodes, adjacency):
+        self.nodes = nodes
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.adjacency = adjacency.astype(np.float64)
+        self.distances, self.predecessors = dijkstra(
+            self.adjacency, directed=True, return_predecessors=True)
+        # Source rows invalidated by weight increases, recomputed when next read
+        self.stale = np.zeros(len(self.nodes), dtype=bool)
+
+    def distance(self, source, target):
+        """Shortest-path length between two nodes (inf if unreachable)"""
+        i = self.index_of(source)
+        self._refresh([i])
+        return float(self.distances[i, self.index_of(target)])
+
+    def path(self, source, target):
+        """Reconstruct the shortest path as a list of node ids, or None if unreachable"""
+        i, j = self.index_of(source), self.index_of(target)
+        self._refresh([i])
+        if not np.isfinite(self.distances[i, j]):
+            return None
+
+        row = self.predecessors[i]
+        path = [j]
+        while j != i:
+            j = row[j]
+            path.append(j)
+        return [self.nodes[k] for k in reversed(path)]
+
+    def submatrix(self, nodes):
+        """Distance matrix restricted to ``nodes`` (in the given order)"""
+        idx = np.array([self.index_of(node) for node in nodes], dtype=np.intp)
+        self._refresh(idx)
+        return self.distances[np.ix_(idx, idx)]
+
+    def distances_from(self, source, targets):
+        """Distances from one node to each of ``targets``"""
+        i = self.index_of(source)
+        self._refresh([i])
+        return self.distances[i, [self.index_of(node) for node in targets]]
+
+    def update_edge(self, u, v, weight):
+        """Change the weight of edge (u, v) and repair the matrices in place"""
+        return self.update_edges([(u, v, weight)])
+
+    def update_edges(self, updates):
+        """Apply a batch of (u, v, weight) changes and repair the matrices in place.
+
+        Decreases are applied first, each with one vectorized relaxation
+        through the edge that only touches rows able to benefit from it.
+        Increases (a closure is an increase to inf) only invalidate sources
+        whose shortest-path tree uses one of the edges; those rows are marked
+        stale and re-run through Dijkstra the next time they are read, so a
+        burst of updates costs nothing for rows nobody queries. Returns the
+        indices of the source rows that changed or were marked stale.
+        """
+        # Only the last update of each edge in the batch counts
+        latest = {}
+        for u, v, weight in updates:
+            i, j = self.index_of(u), self.index_of(v)
+            latest[(min(i, j), max(i, j))] = float(weight)
+
+        decreases, increases = [], []
+        for (i, j), weight in latest.items():
+            old_weight = self.adjacency[i, j] if self.adjacency[i, j] != 0 else np.inf
+            if weight < old_weight:
+                decreases.append((i, j, weight))
+            elif weight > old_weight:
+                increases.append((i, j, weight))
+
+        changed = [np.empty(0, dtype=np.intp)]
+        for i, j, weight in decreases:
+            # The endpoint rows stand in for their columns during relaxation,
+            # so they must be exact for the graph before this change
+            self._refresh([i, j])
+            self._set_adjacency(i, j, weight)
+            changed.append(self._relax_through_edge(i, j, weight))
+
+        if increases:
+            affected = np.zeros(len(self.nodes), dtype=bool)
+            for i, j, weight in increases:
+                affected |= (self.predecessors[:, j] == i) | (self.predecessors[:, i] == j)
+                self._set_adjacency(i, j, weight)
+            rows = np.nonzero(affected & ~self.stale)[0]
+            self.stale[rows] = True
+            changed.append(rows)
+
+        return np.unique(np.concatenate(changed))
+
+    def _refresh(self, rows):
+        rows = np.asarray(rows, dtype=np.intp)
+        rows = np.unique(rows[self.stale[rows]])
+        if len(rows):
+            self._recompute_rows(rows)
+            self.stale[rows] = False
+
+    def _relax_through_edge(self, u, v, weight):
+        # Stale rows may pick up values here but stay stale until recomputed
+        dist_u = self.distances[u].copy()
+        dist_v = self.distances[v].copy()
+        pred_u = self.predecessors[u].copy()
+        pred_v = self.predecessors[v].copy()
+        pred_u[u] = v
+        pred_v[v] = u
+
+        changed = []
+        # Rows that now reach v faster through u (and symmetrically u through v)
+        for dist_near, dist_far, pred_far in ((dist_u, dist_v, pred_v), (dist_v, dist_u, pred_u)):
+            rows = np.nonzero(dist_near + weight < dist_far)[0]
+            if not len(rows):
+                continue
+            candidate = dist_near[rows, None] + weight + dist_far[None, :]
+            current = self.distances[rows]
+            better = candidate < current
+            self.distances[rows] = np.where(better, candidate, current)
+            self.predecessors[rows] = np.where(better, pred_far[None, :], self.predecessors[rows])
+            changed.append(rows)
+        return np.concatenate(changed) if changed else np.empty(0, dtype=np.intp)
+
+    def _recompute_rows(self, rows):
+        distances, predecessors = dijkstra(
+            self.adjacency, directed=True, indices=rows, return_predecessors=True)
+        self.distances[rows] = distances
+        self.predecessors[rows] = predecessors
+
+
+class ShortestPathRows(ShortestPathBase):
+    """Shortest paths for networks too large for a dense all-pairs matrix.
+
+    Same interface as ShortestPathMatrix, but rows (one Dijkstra run per
+    source) are computed on demand and kept in an LRU cache of at most
+    ``max_rows`` sources, so memory is O(max_rows * n). Edge updates drop
+    only the cached rows they can affect.
+    """
+
+    def __init__(self, nodes, adjacency, max_rows=256):
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.adjacency = adjacency.astype(np.float64)
+        self.max_rows = max_rows
+        self._rows = OrderedDict()
+
+    def _row(self, i):
+        return self._fetch([i])[0]
+
+    def _fetch(self, rows):
+        """(distances, predecessors) for each source index, computing missing rows in one call"""
+        missing = sorted({i for i in rows if i not in self._rows})
+        if missing:
+            distances, predecessors = dijkstra(
+                self.adjacency, directed=True, indices=missing, return_predecessors=True)
+            for k, i in enumerate(missing):
+                self._rows[i] = (distances[k], predecessors[k])
+        result = []
+        for i in rows:
+            self._rows.move_to_end(i)
+            result.append(self._rows[i])
+        while len(self._rows) > max(self.max_rows, len(set(rows))):
+            self._rows.popitem(last=False)
+        return result
+
+    def distance(self, source, target):
+        """Shortest-path length between two nodes (inf if unreachable)"""
+        return float(self._row(self.index_of(source))[0][self.index_of(target)])
+
+    def path(self, source, target):
+        """Reconstruct the shortest path as a list of node ids, or None if unreachable"""
+        i, j = self.index_of(source), self.index_of(target)
+        distances, predecessors = self._row(i)
+        if not np.isfinite(distances[j]):
+            return None
+
+        path = [j]
+        while j != i:
+            j = predecessors[j]
+            path.append(j)
+        return [self.nodes[k] for k in reversed(path)]
+
+    def submatrix(self, nodes):
+        """Distance matrix restricted to ``nodes`` (in the given order)"""
+        idx = [self.index_of(node) for node in nodes]
+        rows = self._fetch(idx)
+        return np.array([distances[idx] for distances, _ in rows]).reshape(len(idx), len(idx))
+
+    def distances_from(self, source, targets):
+        """Distances from one node to each of ``targets``, from a single Dijkstra row"""
+        return self._row(self.index_of(source))[0][[self.index_of(node) for node in targets]]
+
+    def update_edges(self, updates):
+        """Apply (u, v, weight) changes; returns the cached source rows that were dropped"""
+        dropped = []
+        for u, v, weight in updates:
+            i, j = self.index_of(u), self.index_of(v)
+            old_weight = self.adjacency[i, j] if self.adjacency[i, j] != 0 else np.inf
+            self._set_adjacency(i, j, float(weight))
+            for row, (distances, predecessors) in list(self._rows.items()):
+                if weight < old_weight:
+                    # The row improves if the cheaper edge now shortcuts either endpoint
+                    affected = min(distances[i] + weight - distances[j], distances[j] + weight - distances[i]) < 0
+                else:
+                    affected = predecessors[j] == i or predecessors[i] == j
+                if affected:
+                    del self._rows[row]
+                    dropped.append(row)
+        return np.unique(np.array(dropped, dtype=np.intp))
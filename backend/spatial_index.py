@@ -0,0 +1,108 @@
+import re
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371
+
+# "lat, lon" location strings, e.g. "40.7128,-74.0060"
+COORDINATE_PATTERN = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$')
+
+
+def unit_vectors(lats, lons):
+    """Points on the unit sphere for arrays of latitudes and longitudes (degrees)"""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+def km_to_chord(km):
+    return 2 * np.sin(np.minimum(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def parse_coordinates(location):
+    """(lat, lon) from a "lat, lon" string, or None"""
+    match = COORDINATE_PATTERN.match(location)
+    if match is None:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+class SpatialIndex:
+    """KD-trees over node coordinates for nearest-facility and radius queries.
+
+    Coordinates are mapped to 3D points on the unit sphere, where the
+    straight-line (chord) distance is monotonic in the great-circle
+    distance, so a plain Euclidean KD-tree answers haversine queries
+    exactly. One tree covers all nodes and one more is kept per node type,
+    so "nearest storage" never has to skip over donors and NGOs. All
+    queries take arrays of points and run in one vectorized call.
+    """
+
+    def __init__(self, node_ids, lats, lons, node_types):
+        self.node_ids = np.asarray(node_ids, dtype=object)
+        self.node_types = np.asarray(node_types, dtype=object)
+        self.points = unit_vectors(lats, lons)
+        self._trees = {None: (cKDTree(self.points), np.arange(len(self.node_ids)))}
+        for node_type in np.unique(self.node_types):
+            members = np.nonzero(self.node_types == node_type)[0]
+            self._trees[node_type] = (cKDTree(self.points[members]), members)
+
+    @classmethod
+    def from_graph(cls, graph):
+        nodes = list(graph.nodes(data=True))
+        return cls([node for node, _ in nodes],
+                   [attrs['lat'] for _, attrs in nodes],
+                   [attrs['lon'] for _, attrs in nodes],
+                   [attrs.get('type', 'location') for _, attrs in nodes])
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def _tree(self, node_type):
+        if node_type not in self._trees:
+            raise KeyError(f"No nodes of type {node_type!r} in the network")
+        return self._trees[node_type]
+
+    def nearest(self, lats, lons, k=1, node_type=None):
+        """The ``k`` nearest nodes (optionally of one type) to every query point.
+
+        Returns (node_ids, distances_km), each shaped (len(lats), k) and
+        ordered nearest first; missing neighbours (k larger than the number
+        of candidates) are None / inf.
+        """
+        tree, members = self._tree(node_type)
+        points = unit_vectors(lats, lons)
+        chords, idx = tree.query(points, k=k)
+        chords, idx = chords.reshape(len(points), k), idx.reshape(len(points), k)
+
+        found = idx < len(members)
+        node_ids = np.full(idx.shape, None, dtype=object)
+        node_ids[found] = self.node_ids[members[idx[found]]]
+        distances = np.where(found, chord_to_km(np.where(found, chords, 0)), np.inf)
+        return node_ids, distances
+
+    def within_radius(self, lats, lons, radius_km, node_type=None):
+        """Nodes within ``radius_km`` of every query point, nearest first.
+
+        Returns a list with one list of (node_id, distance_km) pairs per point.
+        """
+        tree, members = self._tree(node_type)
+        queries = cKDTree(unit_vectors(lats, lons))
+        pairs = queries.sparse_distance_matrix(tree, km_to_chord(radius_km), output_type='ndarray')
+
+        order = np.lexsort((pairs['v'], pairs['i']))
+        rows, idx, distances = pairs['i'][order], pairs['j'][order], chord_to_km(pairs['v'][order])
+        node_ids = self.node_ids[members[idx]].tolist()
+        bounds = np.searchsorted(rows, np.arange(len(queries.data) + 1)).tolist()
+        distances = distances.tolist()
+        return [list(zip(node_ids[start:stop], distances[start:stop]))
+                for start, stop in zip(bounds[:-1], bounds[1:])]
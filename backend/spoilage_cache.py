@@ -0,0 +1,148 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Resolution of the optional dense grid: temperature (°C), humidity (%), days stored, food type
+GRID_STEPS = (0.05, 0.5, 1, 1)
+
+# Operating range covered by the grid, per feature in the same order
+GRID_RANGE = ((2.0, 8.0), (40.0, 60.0), (1, 14), (0, 3))
+
+# Build the dense grid whenever the spoilage model changes (~280k cells, ~2MB, ~1s)
+GRID_ENABLED = os.environ.get('SMARTCARE_SPOILAGE_GRID', '0') == '1'
+
+
+def split_points(model, n_features):
+    """Sorted distinct split thresholds per feature over all trees of a fitted forest"""
+    points = [[] for _ in range(n_features)]
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        for feature in range(n_features):
+            points[feature].append(tree.threshold[tree.feature == feature])
+    return [np.unique(np.concatenate(p)) for p in points]
+
+
+class SpoilageScoreCache:
+    """Memoized spoilage probabilities keyed on quantized storage conditions.
+
+    Each condition is quantized to the interval between the forest's
+    consecutive split thresholds on that feature it falls in. Every tree
+    sends all conditions with the same key down the same path, so a cached
+    score is exactly what the model would return. Each batch is reduced to
+    its distinct keys, looked up in an LRU of ``max_entries`` and the misses
+    are scored together. A lookup with a different model than the last one
+    (after a retrain) clears everything first.
+
+    With ``grid`` enabled the model is also scored once over GRID_RANGE at
+    GRID_STEPS and conditions inside it are answered by a single array
+    index, with the score at the nearest grid point; this trades exactness
+    for speed, as the forest splits far finer than the grid.
+    """
+
+    def __init__(self, max_entries=100_000, grid=GRID_ENABLED):
+        self.max_entries = max_entries
+        self.grid_enabled = grid
+        self.model = None
+        self._split_points = None
+        self._entries = OrderedDict()
+        self._grid = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.grid_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _bind(self, model, score):
+        if model is self.model:
+            return
+        self.model = model
+        self._split_points = split_points(model, 4)
+        self._entries.clear()
+        self._grid = None
+        self.invalidations += 1
+        if self.grid_enabled:
+            self._build_grid(score)
+
+    def _build_grid(self, score):
+        steps = np.array(GRID_STEPS, dtype=np.float64)
+        axes = [np.arange(low, high + step / 2, step) for (low, high), step in zip(GRID_RANGE, steps)]
+        conditions = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 4)
+        low = np.array([low for low, _ in GRID_RANGE], dtype=np.float64)
+        shape = np.array([len(axis) for axis in axes])
+        self._grid = (low, steps, shape, score(conditions).reshape(tuple(shape.tolist())))
+
+    def lookup(self, model, score, temperature, humidity, days_stored, food_type):
+        """Spoilage probability for every row.
+
+        ``score`` maps an (n, 4) array of conditions to ``model``'s spoilage
+        probabilities; it is only called for conditions not cached yet.
+        """
+        conditions = np.column_stack([np.asarray(c, dtype=np.float32).ravel()
+                                      for c in (temperature, humidity, days_stored, food_type)])
+        with self._lock:
+            self._bind(model, score)
+            probability = np.empty(len(conditions))
+            pending = np.ones(len(conditions), dtype=bool)
+
+            if self._grid is not None:
+                low, steps, shape, grid = self._grid
+                cells = np.round((conditions - low) / steps).astype(np.int64)
+                inside = ((cells >= 0) & (cells < shape)).all(axis=1)
+                cells = cells[inside]
+                probability[inside] = grid[cells[:, 0], cells[:, 1], cells[:, 2], cells[:, 3]]
+                pending &= ~inside
+                self.grid_hits += int(inside.sum())
+
+            rows = np.flatnonzero(pending)
+            if len(rows):
+                probability[rows] = self._lookup_entries(score, conditions[rows])
+            return probability
+
+    def _lookup_entries(self, score, conditions):
+        # A tree sends x left when x <= threshold, so the key is the number of thresholds below x
+        keys = np.column_stack([np.searchsorted(points, conditions[:, j], side='left')
+                                for j, points in enumerate(self._split_points)])
+        unique, first, inverse, counts = np.unique(keys, axis=0, return_index=True, return_inverse=True,
+                                                   return_counts=True)
+        inverse = inverse.ravel()
+        values = np.empty(len(unique))
+        missing = []
+        for i, key in enumerate(map(tuple, unique.tolist())):
+            value = self._entries.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                self._entries.move_to_end(key)
+                values[i] = value
+
+        if missing:
+            scored = score(conditions[first[missing]])
+            values[missing] = scored
+            for key, value in zip(map(tuple, unique[missing].tolist()), scored.tolist()):
+                self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        missed = np.zeros(len(unique), dtype=bool)
+        missed[missing] = True
+        self.misses += int(counts[missed].sum())
+        self.hits += int(counts[~missed].sum())
+        return values[inverse]
+
+    def stats(self):
+        lookups = self.hits + self.grid_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'grid_cells': int(self._grid[3].size) if self._grid is not None else 0,
+            'hits': self.hits,
+            'grid_hits': self.grid_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.grid_hits) / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
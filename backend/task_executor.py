@@ -0,0 +1,169 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from metrics import REGISTRY
+
+# 'thread' or 'process'; only targets registered as isolated use this pool kind
+ISOLATED_POOL_KIND = os.environ.get('SMARTCARE_ML_EXECUTOR', 'thread')
+POOL_SIZE = int(os.environ.get('SMARTCARE_POOL_SIZE', min(4, os.cpu_count() or 1)))
+TASK_TIMEOUT = float(os.environ.get('SMARTCARE_TASK_TIMEOUT', 30))
+
+# How often a running task checks whether its client went away
+DISCONNECT_POLL_INTERVAL = 0.2
+
+# Per call, including time queued for a worker; covers calls whose own spans stay in a process-pool worker
+TASK_SECONDS = REGISTRY.histogram('smartcare_task_duration_seconds', 'Offloaded call time, including queueing',
+                                  ('target', 'method'))
+
+# Objects built once per process-pool worker by _init_worker
+_worker_targets = {}
+
+
+class TaskTimeout(Exception):
+    """Raised when an offloaded call does not finish within its timeout"""
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away before an offloaded call finished"""
+
+
+def _init_worker(factories):
+    for name, factory in factories.items():
+        _worker_targets[name] = factory()
+
+
+def _call_in_worker(target, method, args, kwargs):
+    return getattr(_worker_targets[target], method)(*args, **kwargs)
+
+
+def _report_warm_up_failure(name, future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Warm-up call {name} failed: {future.exception()}")
+
+
+class TaskExecutor:
+    """Runs blocking ML and graph calls off the event loop.
+
+    Targets registered with ``isolated=True`` (stateless services such as
+    the ML models) run on a pool whose kind is configurable: a thread pool
+    sharing the in-process instance, or a process pool in which every
+    worker builds its own instance once via the target's factory. Stateful
+    targets (the graph, which receives live edge updates) always run on a
+    thread pool against the shared instance.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, isolated_kind=ISOLATED_POOL_KIND, timeout=TASK_TIMEOUT):
+        if isolated_kind not in ('thread', 'process'):
+            raise ValueError("isolated_kind must be 'thread' or 'process'")
+        self.pool_size = pool_size
+        self.isolated_kind = isolated_kind
+        self.timeout = timeout
+        self._targets = {}
+        self._factories = {}
+        self._shared_pool = None
+        self._isolated_pool = None
+        self.completed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+
+    def register(self, name, instance, factory=None, isolated=False):
+        """Make ``instance`` callable as ``name``; isolated targets need a picklable ``factory`` for process pools"""
+        self._targets[name] = (instance, isolated)
+        if isolated:
+            self._factories[name] = factory or type(instance)
+
+    def _pool_for(self, isolated):
+        if isolated and self.isolated_kind == 'process':
+            if self._isolated_pool is None:
+                self._isolated_pool = ProcessPoolExecutor(
+                    max_workers=self.pool_size, initializer=_init_worker, initargs=(self._factories,))
+            return self._isolated_pool
+        if self._shared_pool is None:
+            self._shared_pool = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='smartcare-task')
+        return self._shared_pool
+
+    async def run(self, target, method, *args, timeout=None, request=None, **kwargs):
+        """Call ``target.method(*args, **kwargs)`` on a pool and await the result.
+
+        Raises TaskTimeout after ``timeout`` seconds and ClientDisconnected if
+        ``request`` (a Starlette request) disconnects first. In both cases a
+        call that has not started yet is cancelled; one that is already
+        running finishes in the background and its result is discarded.
+        """
+        instance, isolated = self._targets[target]
+        pool = self._pool_for(isolated)
+        if pool is self._isolated_pool:
+            func = partial(_call_in_worker, target, method, args, kwargs)
+        else:
+            func = partial(getattr(instance, method), *args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        future = loop.run_in_executor(pool, func)
+        watcher = asyncio.create_task(self._wait_for_disconnect(request)) if request is not None else None
+        waiting = {future, watcher} - {None}
+
+        try:
+            done, _ = await asyncio.wait(waiting, timeout=timeout or self.timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            TASK_SECONDS.observe((target, method), time.perf_counter() - started)
+
+        if future in done:
+            self.completed += 1
+            return future.result()
+
+        future.cancel()
+        if watcher is not None and watcher in done:
+            self.cancelled += 1
+            raise ClientDisconnected(f"Client disconnected during {target}.{method}")
+        self.timed_out += 1
+        raise TaskTimeout(f"{target}.{method} did not finish within {timeout or self.timeout}s")
+
+    async def _wait_for_disconnect(self, request):
+        while not await request.is_disconnected():
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+    def warm_up(self, target=None, method=None):
+        """Start every process-pool worker now, optionally calling ``target.method`` in the background.
+
+        The call runs once on the shared instance, or once per process-pool
+        worker (best effort: the pool decides which worker takes each call).
+        Nothing is awaited, so startup is not delayed.
+        """
+        if self.isolated_kind == 'process' and self._factories:
+            pool = self._pool_for(True)
+            for _ in range(self.pool_size):
+                pool.submit(os.getpid)
+        if target is None:
+            return
+
+        instance, isolated = self._targets[target]
+        pool = self._pool_for(isolated)
+        if pool is self._isolated_pool:
+            calls = [partial(_call_in_worker, target, method, (), {})] * self.pool_size
+        else:
+            calls = [getattr(instance, method)]
+        for call in calls:
+            pool.submit(call).add_done_callback(partial(_report_warm_up_failure, f"{target}.{method}"))
+
+    def shutdown(self):
+        for pool in (self._shared_pool, self._isolated_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._shared_pool = None
+        self._isolated_pool = None
+
+    def stats(self):
+        return {
+            'pool_size': self.pool_size,
+            'isolated_kind': self.isolated_kind,
+            'completed': self.completed,
+            'timed_out': self.timed_out,
+            'cancelled': self.cancelled
+        }
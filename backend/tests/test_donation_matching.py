@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from donation_matching import SOURCE, DonationMatcher
+
+NOW = datetime(2026, 1, 1)
+
+
+class PlaneGraph:
+    """Locations are 'x,y' points; distances are straight-line km"""
+
+    def resolve_locations(self, locations):
+        return list(locations), None
+
+    def distances_from(self, node, targets):
+        origin = np.array(node.split(','), dtype=float)
+        return [float(np.hypot(*(np.array(t.split(','), dtype=float) - origin))) for t in targets]
+
+
+def events(seed=0, n=40):
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        location = f"{rng.uniform(0, 20):.2f},{rng.uniform(0, 20):.2f}"
+        if rng.random() < 0.5:
+            yield 'add_donation', (f'donor_{i}', 'rice', float(rng.integers(5, 50)),
+                                   NOW + timedelta(days=float(rng.uniform(1, 10))), location, NOW)
+        else:
+            yield 'add_request', (f'ngo_{i}', 'rice', float(rng.integers(5, 50)),
+                                  str(rng.choice(['low', 'medium', 'high'])), location, NOW)
+
+
+def total_cost(matcher):
+    plan = matcher.plan()
+    reward = sum(r['reward'] * r['served'] for r in matcher.requests.values())
+    return plan['total_cost'] - reward
+
+
+def test_invalid_potentials_are_recomputed():
+    clean, corrupted = DonationMatcher(PlaneGraph()), DonationMatcher(PlaneGraph())
+    for method, args in events():
+        getattr(clean, method)(*args)
+        if method == 'add_request':
+            # Request searches start at the sink, whose first arc sink -> source now has a negative reduced cost
+            corrupted._members('rice')['potentials'][SOURCE] += 1000.0
+        getattr(corrupted, method)(*args)
+
+    assert corrupted.potential_resets > 0
+    assert clean.potential_resets == 0
+    assert abs(total_cost(corrupted) - total_cost(clean)) < 1e-6
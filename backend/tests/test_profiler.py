@@ -0,0 +1,45 @@
+import os
+import threading
+import time
+
+from profiler import SamplingProfiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+
+def test_slow_request_dump_is_written_by_the_sampler_thread(tmp_path):
+    directory = tmp_path / 'profiles'
+    profiler = SamplingProfiler(interval_ms=1, directory=str(directory))
+    writers = []
+    dump = profiler.dump
+    profiler.dump = lambda *args: writers.append(threading.current_thread().name) or dump(*args)
+    profiler.start()
+    try:
+        started = time.perf_counter()
+        busy(0.05)
+        profiler.request_dump('GET /api/slow', started, time.perf_counter())
+        deadline = time.perf_counter() + 2
+        while not profiler.dumps and time.perf_counter() < deadline:
+            time.sleep(0.01)
+    finally:
+        profiler.stop()
+
+    assert writers == ['smartcare-profiler']
+    [dump] = profiler.dumps
+    assert dump['label'] == 'GET /api/slow'
+    assert 'busy (test_profiler.py' in (directory / dump['file']).read_text()
+    assert os.listdir(directory) == [dump['file']]
+
+
+def test_dump_requested_just_before_stop_is_still_written(tmp_path):
+    profiler = SamplingProfiler(interval_ms=1, directory=str(tmp_path))
+    profiler.start()
+    started = time.perf_counter()
+    busy(0.05)
+    profiler.request_dump('POST /api/slow', started, time.perf_counter())
+    profiler.stop()
+    assert [dump['label'] for dump in profiler.dumps] == ['POST /api/slow']
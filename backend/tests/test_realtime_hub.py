@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+from realtime_hub import PubSubHub
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+
+async def deliver(hub, subscriber_args, publish):
+    websocket = FakeWebSocket()
+    subscriber = await hub.connect(websocket, **subscriber_args)
+    publish(subscriber)
+    await asyncio.sleep(0.01)
+    await hub.stop()
+    return websocket.sent
+
+
+def publish_all(hub):
+    def publish(subscriber):
+        hub.publish('sensors', {'sensor_id': 'fridge_1', 'temperature': 4.0})
+        hub.publish('alerts', {'alert_id': 'fridge_1:anomaly', 'sensor_id': 'fridge_1', 'type': 'anomaly'},
+                    key_field='alert_id')
+        hub.publish('routes', {'route_id': 'route_1', 'stops': []}, key_field='route_id')
+    return publish
+
+
+def test_default_subscriber_only_receives_sensor_readings():
+    hub = PubSubHub()
+    sent = asyncio.run(deliver(hub, {}, publish_all(hub)))
+    assert sent == [{'sensor_id': 'fridge_1', 'temperature': 4.0}]
+
+
+def test_other_topics_are_opt_in():
+    hub = PubSubHub()
+    sent = asyncio.run(deliver(hub, {'topics': ['alerts']}, publish_all(hub)))
+    assert [message.get('type') for message in sent] == ['anomaly']
+
+
+def test_subscribe_message_adds_to_default_topics():
+    hub = PubSubHub()
+    publish = publish_all(hub)
+
+    def subscribe_then_publish(subscriber):
+        subscriber.update_filters({'action': 'subscribe', 'topics': ['routes']})
+        publish(subscriber)
+
+    sent = asyncio.run(deliver(hub, {}, subscribe_then_publish))
+    assert [set(message) for message in sent] == [{'sensor_id', 'temperature'}, {'route_id', 'stops'}]
+
+
+def test_unsubscribing_every_topic_delivers_nothing():
+    hub = PubSubHub()
+    publish = publish_all(hub)
+
+    def unsubscribe_then_publish(subscriber):
+        subscriber.update_filters({'action': 'unsubscribe', 'topics': ['sensors']})
+        publish(subscriber)
+
+    assert asyncio.run(deliver(hub, {}, unsubscribe_then_publish)) == []
+
+
+def test_stop_finishes_when_cancelled_mid_send():
+    async def main():
+        hub = PubSubHub()
+        websocket = FakeWebSocket()
+        subscriber = await hub.connect(websocket)
+        hub.publish('sensors', {'sensor_id': 'fridge_1', 'temperature': 4.0})
+        # The sender is mid-send when stop() cancels it
+        await asyncio.sleep(0)
+        await asyncio.wait_for(hub.stop(), timeout=2)
+        return websocket.sent, subscriber.sender.done()
+
+    sent, done = asyncio.run(main())
+    assert sent == [{'sensor_id': 'fridge_1', 'temperature': 4.0}]
+    assert done
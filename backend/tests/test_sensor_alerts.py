@@ -0,0 +1,34 @@
+import numpy as np
+
+import sensor_alerts
+from sensor_alerts import SensorAlertMonitor
+
+
+def readings(n=3000, seed=1):
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(['fridge_1', 'fridge_2'] + [f'sensor_{i}' for i in range(100)], n,
+                     p=[0.35, 0.35] + [0.3 / 100] * 100)
+    values = rng.normal(5, 1, (n, 3))
+    values[rng.random(n) < 0.02] += 20
+    return ids, rng.permutation(n).astype(np.float64), values
+
+
+def feed(monitor, ids, timestamps, values):
+    alerts = []
+    for rows in np.array_split(np.arange(len(ids)), 3):
+        alerts += monitor.update(ids[rows].tolist(), timestamps[rows], values[rows])
+    return sorted((a['sensor_id'], a['timestamp'], a['state']) for a in alerts)
+
+
+def test_series_update_matches_one_reading_at_a_time(monkeypatch):
+    ids, timestamps, values = readings()
+    series = SensorAlertMonitor()
+    series_alerts = feed(series, ids, timestamps, values)
+    monkeypatch.setattr(sensor_alerts, 'SERIES_MIN_READINGS', len(ids) + 1)
+    rounds = SensorAlertMonitor()
+    round_alerts = feed(rounds, ids, timestamps, values)
+
+    assert series_alerts == round_alerts
+    assert any(state == 'anomaly' for _, _, state in series_alerts)
+    for name in ('count', 'mean', 'var', 'zscores', 'last', 'last_timestamp', 'anomalous'):
+        np.testing.assert_allclose(getattr(series, name), getattr(rounds, name), err_msg=name)
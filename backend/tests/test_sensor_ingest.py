@@ -0,0 +1,80 @@
+import asyncio
+
+import numpy as np
+
+from sensor_alerts import SensorAlertMonitor
+from sensor_ingest import SensorIngestPipeline
+from timeseries_store import SENSOR_FIELDS, SensorTimeSeriesStore
+
+
+class RecordingStore(SensorTimeSeriesStore):
+    """Store that records the size of every append_many call"""
+
+    def __init__(self):
+        super().__init__(raw_capacity=50000)
+        self.steps = []
+
+    def append_many(self, sensor_ids, timestamps, values):
+        self.steps.append(len(sensor_ids))
+        return super().append_many(sensor_ids, timestamps, values)
+
+
+def batch(sensor_ids, start=1_700_000_000.0):
+    n = len(sensor_ids)
+    rng = np.random.default_rng(0)
+    columns = {field: rng.uniform(0, 10, n) for field in SENSOR_FIELDS}
+    return {'sensor_id': np.asarray(sensor_ids), 'timestamp': start + np.arange(n, dtype=np.float64), **columns}
+
+
+async def ingest(pipeline, batches):
+    pipeline.start()
+    for b in batches:
+        await pipeline.submit(b)
+    await pipeline.stop()
+
+
+def test_single_sensor_batch_is_written_in_bounded_steps():
+    store = RecordingStore()
+    monitor = SensorAlertMonitor()
+    pipeline = SensorIngestPipeline(store, max_step_rows=500, monitor=monitor)
+    asyncio.run(ingest(pipeline, [batch(['fridge_1'] * 20000)]))
+
+    assert max(store.steps) <= 500
+    assert sum(store.steps) == 20000
+    assert pipeline.written == 20000
+    assert monitor.state('fridge_1')['readings'] == 20000
+
+
+def test_small_sensors_are_not_split():
+    store = RecordingStore()
+    pipeline = SensorIngestPipeline(store, max_step_rows=500)
+    ids = np.repeat([f'sensor_{i}' for i in range(40)], 30)
+    asyncio.run(ingest(pipeline, [batch(ids)]))
+
+    assert max(store.steps) <= 500
+    assert all(step % 30 == 0 for step in store.steps)
+    assert sum(store.steps) == len(ids)
+
+
+def test_event_loop_gap_stays_small_for_large_single_sensor_batch():
+    gaps = []
+
+    async def heartbeat(stop):
+        last = asyncio.get_running_loop().time()
+        while not stop.is_set():
+            await asyncio.sleep(0)
+            now = asyncio.get_running_loop().time()
+            gaps.append(now - last)
+            last = now
+
+    async def main():
+        pipeline = SensorIngestPipeline(SensorTimeSeriesStore(raw_capacity=50000), max_step_rows=500,
+                                        monitor=SensorAlertMonitor())
+        stop = asyncio.Event()
+        beat = asyncio.create_task(heartbeat(stop))
+        await ingest(pipeline, [batch(['fridge_1'] * 20000)])
+        stop.set()
+        await beat
+
+    asyncio.run(main())
+    assert max(gaps) < 0.25
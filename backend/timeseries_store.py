@@ -0,0 +1,342 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Columns stored for every sensor reading
+SENSOR_FIELDS = ('temperature', 'humidity', 'weight')
+
+# Rollup resolution (seconds) -> number of buckets retained
+ROLLUP_RETENTION = {
+    60: 6 * 60,        # 1-minute buckets for 6 hours
+    3600: 7 * 24,      # 1-hour buckets for a week
+    86400: 365         # 1-day buckets for a year
+}
+
+# Raw readings kept per sensor, and sensors kept before the least recently updated is evicted.
+# A sensor's buffers start at INITIAL_SLOTS rows/buckets and double as data arrives, so a full
+# sensor takes about 110 KB (1024 raw rows + 893 rollup buckets, 3 fields) and the store at
+# most ~220 MB at 2000 sensors; see SensorTimeSeriesStore.max_bytes().
+RAW_CAPACITY = int(os.environ.get('SMARTCARE_SENSOR_RAW_CAPACITY', 1024))
+MAX_SENSORS = int(os.environ.get('SMARTCARE_MAX_SENSORS', 2000))
+INITIAL_SLOTS = 16
+
+
+class RawBuffer:
+    """Ring buffer of raw readings stored column-wise, grown on demand up to ``capacity``"""
+
+    def __init__(self, capacity, n_fields):
+        self.capacity = capacity
+        allocated = min(INITIAL_SLOTS, capacity)
+        self.timestamps = np.full(allocated, np.nan)
+        self.values = np.full((allocated, n_fields), np.nan)
+        self.head = 0
+        self.size = 0
+
+    @property
+    def nbytes(self):
+        return self.timestamps.nbytes + self.values.nbytes
+
+    def _grow(self, needed):
+        allocated = len(self.timestamps)
+        new_size = allocated
+        while new_size < needed:
+            new_size *= 2
+        new_size = min(new_size, self.capacity)
+        # Oldest first, so the ring restarts unwrapped
+        slots = (self.head - self.size + np.arange(self.size)) % allocated
+        timestamps = np.full(new_size, np.nan)
+        values = np.full((new_size, self.values.shape[1]), np.nan)
+        timestamps[:self.size] = self.timestamps[slots]
+        values[:self.size] = self.values[slots]
+        self.timestamps, self.values = timestamps, values
+        self.head = self.size % new_size
+
+    def append_many(self, timestamps, values):
+        n = len(timestamps)
+        if n >= self.capacity:
+            # Only the newest `capacity` points survive anyway
+            timestamps, values = timestamps[-self.capacity:], values[-self.capacity:]
+            n = self.capacity
+        if self.size + n > len(self.timestamps) and len(self.timestamps) < self.capacity:
+            self._grow(self.size + n)
+        allocated = len(self.timestamps)
+        slots = (self.head + np.arange(n)) % allocated
+        self.timestamps[slots] = timestamps
+        self.values[slots] = values
+        self.head = (self.head + n) % allocated
+        self.size = min(self.size + n, allocated)
+
+    def range(self, start, end):
+        """Points with start <= timestamp < end, in time order"""
+        mask = (self.timestamps >= start) & (self.timestamps < end)
+        order = np.argsort(self.timestamps[mask], kind='stable')
+        return self.timestamps[mask][order], self.values[mask][order]
+
+    def oldest(self):
+        """Timestamp of the oldest point still held, or None"""
+        return float(np.nanmin(self.timestamps)) if self.size else None
+
+    def latest(self):
+        if not self.size:
+            return None
+        slot = (self.head - 1) % len(self.timestamps)
+        return self.timestamps[slot], self.values[slot]
+
+
+class RollupBuffer:
+    """Min/max/sum/count buckets at a fixed resolution, addressed by time.
+
+    Bucket ``b = floor(t / resolution)`` lives in slot ``b % allocated``, so
+    ingest is O(1) per bucket and old buckets are overwritten in place once
+    they fall out of the retention window of ``n_buckets``. Storage starts
+    small and doubles (re-slotting the live buckets) while the span of live
+    buckets outgrows it, up to ``n_buckets`` slots.
+    """
+
+    def __init__(self, resolution, n_buckets, n_fields):
+        self.resolution = resolution
+        self.n_buckets = n_buckets
+        self.newest = -1
+        self._allocate(min(INITIAL_SLOTS, n_buckets), n_fields)
+
+    def _allocate(self, slots, n_fields):
+        self.bucket_ids = np.full(slots, -1, dtype=np.int64)
+        self.counts = np.zeros(slots, dtype=np.int64)
+        self.sums = np.zeros((slots, n_fields))
+        self.mins = np.full((slots, n_fields), np.inf)
+        self.maxs = np.full((slots, n_fields), -np.inf)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.bucket_ids, self.counts, self.sums, self.mins, self.maxs))
+
+    def _live(self, newest):
+        return (self.counts > 0) & (self.bucket_ids > newest - self.n_buckets)
+
+    def _fit(self, oldest, newest):
+        """Grow so buckets ``oldest..newest`` get distinct slots"""
+        allocated = len(self.bucket_ids)
+        live = self._live(newest)
+        if live.any():
+            oldest = min(oldest, int(self.bucket_ids[live].min()))
+        span = newest - oldest + 1
+        if span <= allocated or allocated == self.n_buckets:
+            return
+        slots = allocated
+        while slots < span:
+            slots *= 2
+        old = (self.bucket_ids[live], self.counts[live], self.sums[live], self.mins[live], self.maxs[live])
+        self._allocate(min(slots, self.n_buckets), self.sums.shape[1])
+        moved = old[0] % len(self.bucket_ids)
+        self.bucket_ids[moved], self.counts[moved], self.sums[moved], self.mins[moved], self.maxs[moved] = old
+
+    def add_many(self, timestamps, values):
+        buckets = np.floor_divide(timestamps, self.resolution).astype(np.int64)
+        newest = max(self.newest, int(buckets.max()))
+        # Drop points older than the retention window
+        keep = buckets > newest - self.n_buckets
+        buckets, values = buckets[keep], values[keep]
+        if not len(buckets):
+            return
+
+        # Pre-aggregate the batch per bucket, then merge into the slots
+        order = np.argsort(buckets, kind='stable')
+        buckets, values = buckets[order], values[order]
+        unique, starts = np.unique(buckets, return_index=True)
+        counts = np.diff(np.append(starts, len(buckets)))
+        sums = np.add.reduceat(values, starts, axis=0)
+        mins = np.minimum.reduceat(values, starts, axis=0)
+        maxs = np.maximum.reduceat(values, starts, axis=0)
+
+        self._fit(int(unique[0]), newest)
+        slots = unique % len(self.bucket_ids)
+        stale = self.bucket_ids[slots] != unique
+        reset = slots[stale]
+        self.counts[reset] = 0
+        self.sums[reset] = 0
+        self.mins[reset] = np.inf
+        self.maxs[reset] = -np.inf
+        self.bucket_ids[slots] = unique
+
+        self.counts[slots] += counts
+        self.sums[slots] += sums
+        self.mins[slots] = np.minimum(self.mins[slots], mins)
+        self.maxs[slots] = np.maximum(self.maxs[slots], maxs)
+        self.newest = newest
+
+    def range(self, start, end):
+        """Live buckets overlapping [start, end), in time order"""
+        first = int(np.floor(start / self.resolution))
+        last = int(np.ceil(end / self.resolution)) - 1
+        mask = ((self.bucket_ids >= max(first, self.newest - self.n_buckets + 1))
+                & (self.bucket_ids <= last) & (self.counts > 0))
+        slots = np.nonzero(mask)[0]
+        slots = slots[np.argsort(self.bucket_ids[slots])]
+        return (self.bucket_ids[slots] * self.resolution, self.counts[slots],
+                self.sums[slots], self.mins[slots], self.maxs[slots])
+
+
+class SensorSeries:
+    def __init__(self, raw_capacity, n_fields):
+        self.raw = RawBuffer(raw_capacity, n_fields)
+        self.rollups = {res: RollupBuffer(res, n, n_fields) for res, n in ROLLUP_RETENTION.items()}
+
+    @property
+    def nbytes(self):
+        return self.raw.nbytes + sum(rollup.nbytes for rollup in self.rollups.values())
+
+    def add_many(self, timestamps, values):
+        self.raw.append_many(timestamps, values)
+        for rollup in self.rollups.values():
+            rollup.add_many(timestamps, values)
+
+
+class SensorTimeSeriesStore:
+    """Bounded in-process time-series store for sensor readings.
+
+    Every sensor gets a raw ring buffer plus 1-minute, 1-hour and 1-day
+    min/max/mean rollups that are maintained on ingest, so range and
+    downsample queries never scan raw history. Memory is bounded per sensor
+    (buffers grow on demand up to ``max_bytes() / max_sensors``) and the
+    least recently updated sensors are evicted beyond ``max_sensors``.
+    Timestamps are Unix epoch seconds.
+    """
+
+    def __init__(self, raw_capacity=RAW_CAPACITY, max_sensors=MAX_SENSORS, fields=SENSOR_FIELDS):
+        self.raw_capacity = raw_capacity
+        self.max_sensors = max_sensors
+        self.fields = tuple(fields)
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_readings = 0
+
+    def _get_series(self, sensor_id):
+        series = self._series.get(sensor_id)
+        if series is None:
+            series = SensorSeries(self.raw_capacity, len(self.fields))
+            self._series[sensor_id] = series
+            while len(self._series) > self.max_sensors:
+                self._series.popitem(last=False)
+        else:
+            self._series.move_to_end(sensor_id)
+        return series
+
+    def append(self, sensor_id, timestamp, **values):
+        """Record a single reading"""
+        row = np.array([[values[field] for field in self.fields]], dtype=np.float64)
+        self.append_many([sensor_id], [timestamp], row)
+
+    def append_many(self, sensor_ids, timestamps, values):
+        """Record a batch of readings given as columns.
+
+        ``values`` is an (n, len(fields)) array or a dict of field columns.
+        """
+        if isinstance(values, dict):
+            values = np.column_stack([np.asarray(values[field], dtype=np.float64) for field in self.fields])
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.fields))
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        sensor_ids = np.asarray(sensor_ids)
+        if not len(timestamps):
+            return
+
+        unique, inverse = np.unique(sensor_ids, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        starts = np.searchsorted(inverse[order], np.arange(len(unique)))
+        ends = np.append(starts[1:], len(order))
+
+        with self._lock:
+            for sensor_id, start, end in zip(unique.tolist(), starts.tolist(), ends.tolist()):
+                rows = order[start:end]
+                self._get_series(sensor_id).add_many(timestamps[rows], values[rows])
+            self.total_readings += len(timestamps)
+
+    def sensors(self):
+        with self._lock:
+            return list(self._series)
+
+    def max_bytes(self):
+        """Memory the buffers can reach with ``max_sensors`` sensors that all have full history"""
+        n_fields = len(self.fields)
+        per_sensor = self.raw_capacity * (1 + n_fields) * 8 + sum(ROLLUP_RETENTION.values()) * (2 + 3 * n_fields) * 8
+        return per_sensor * self.max_sensors
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sensors': len(self._series),
+                'total_readings': self.total_readings,
+                'memory_bytes': sum(series.nbytes for series in self._series.values()),
+                'max_memory_bytes': self.max_bytes()
+            }
+
+    def latest(self, sensor_id):
+        """Most recent raw reading of a sensor, or None"""
+        with self._lock:
+            series = self._series.get(sensor_id)
+            latest = series.raw.latest() if series else None
+        if latest is None:
+            return None
+        timestamp, values = latest
+        return {'timestamp': float(timestamp), **{f: float(v) for f, v in zip(self.fields, values)}}
+
+    def query(self, sensor_id, start, end, step=None):
+        """Readings of ``sensor_id`` in [start, end).
+
+        Without ``step`` the raw points still held in the ring buffer are
+        returned. With ``step`` (seconds) the coarsest rollup whose resolution
+        divides ``step`` is re-aggregated into ``step``-wide buckets with
+        count and per-field mean/min/max. Steps that no rollup divides (e.g.
+        90s, or under a minute) are aggregated from the raw points (with
+        ``resolution`` None) when the ring buffer still covers ``start``, and
+        raise ValueError otherwise,
+        rather than silently using buckets that straddle the step edges.
+        Results are dicts of lists.
+        """
+        with self._lock:
+            series = self._series.get(sensor_id)
+            if series is None:
+                return None
+            if step is None:
+                timestamps, values = series.raw.range(start, end)
+                result = {'timestamp': timestamps.tolist()}
+                for i, field in enumerate(self.fields):
+                    result[field] = values[:, i].tolist()
+                return result
+
+            resolution = max((res for res in series.rollups if step % res == 0), default=None)
+            if resolution is not None:
+                bucket_starts, counts, sums, mins, maxs = series.rollups[resolution].range(start, end)
+            else:
+                oldest = series.raw.oldest()
+                if oldest is not None and oldest > start and series.raw.size == series.raw.capacity:
+                    raise ValueError(f"step must be a multiple of {min(series.rollups)}s for ranges older than "
+                                     f"the raw buffer")
+                bucket_starts, values = series.raw.range(start, end)
+                counts, sums, mins, maxs = np.ones(len(bucket_starts), dtype=np.int64), values, values, values
+
+        return self._downsample(bucket_starts, counts, sums, mins, maxs, step, resolution)
+
+    def _downsample(self, bucket_starts, counts, sums, mins, maxs, step, resolution):
+        result = {'resolution': resolution, 'step': step}
+        if not len(bucket_starts):
+            result.update({'timestamp': [], 'count': []})
+            for field in self.fields:
+                result.update({f'{field}_mean': [], f'{field}_min': [], f'{field}_max': []})
+            return result
+
+        groups = np.floor_divide(bucket_starts, step).astype(np.int64)
+        unique, starts = np.unique(groups, return_index=True)
+        count = np.add.reduceat(counts, starts)
+        total = np.add.reduceat(sums, starts, axis=0)
+        low = np.minimum.reduceat(mins, starts, axis=0)
+        high = np.maximum.reduceat(maxs, starts, axis=0)
+
+        result['timestamp'] = (unique * step).astype(np.float64).tolist()
+        result['count'] = count.tolist()
+        for i, field in enumerate(self.fields):
+            result[f'{field}_mean'] = np.round(total[:, i] / count, 3).tolist()
+            result[f'{field}_min'] = low[:, i].tolist()
+            result[f'{field}_max'] = high[:, i].tolist()
+        return result
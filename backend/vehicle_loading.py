@@ -0,0 +1,147 @@
+import time
+
+import numpy as np
+
+# How much more an urgent item is worth than its nominal value
+URGENCY_WEIGHTS = {'high': 1.5, 'medium': 1.0, 'low': 0.7}
+
+# Largest DP table (items x capacity cells) solved exactly
+EXACT_CELL_LIMIT = 20_000_000
+
+
+def item_score(item):
+    """Loading priority of an item: value boosted by urgency and spoilage risk.
+
+    Food that is likely to spoil soon is worth more on today's truck than
+    on tomorrow's, so the spoilage probability scales the value up.
+    """
+    urgency = URGENCY_WEIGHTS.get(str(item.get('urgency', 'medium')).lower(), 1.0)
+    spoilage_risk = float(item.get('spoilage_risk') or 0.0)
+    return float(item['value']) * urgency * (1.0 + spoilage_risk)
+
+
+def knapsack_dp(weights, scores, capacity):
+    """Exact 0/1 knapsack over integer weights; returns the selected indices.
+
+    Each item is one vectorized pass over the capacity axis; a boolean
+    ``keep`` table of shape (items, capacity + 1) is kept for reconstruction.
+    """
+    weights = np.asarray(weights, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    capacity = int(capacity)
+    best = np.zeros(capacity + 1)
+    keep = np.zeros((len(weights), capacity + 1), dtype=bool)
+
+    for k, (w, score) in enumerate(zip(weights.tolist(), scores.tolist())):
+        if w > capacity or score <= 0:
+            continue
+        if w == 0:
+            keep[k, :] = True
+            best += score
+            continue
+        candidate = best[:-w] + score
+        take = candidate > best[w:]
+        keep[k, w:] = take
+        best[w:] = np.where(take, candidate, best[w:])
+
+    selected = []
+    c = capacity
+    for k in range(len(weights) - 1, -1, -1):
+        if keep[k, c]:
+            selected.append(k)
+            c -= int(weights[k])
+    return selected[::-1]
+
+
+def knapsack_greedy(weights, scores, capacity, deadline):
+    """Density-ordered greedy fill followed by 1-for-1 swaps until ``deadline``"""
+    weights = np.asarray(weights, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    order = np.argsort(-scores / np.maximum(weights, 1e-9), kind='stable')
+
+    selected = np.zeros(len(weights), dtype=bool)
+    load = 0.0
+    for k in order.tolist():
+        if scores[k] > 0 and load + weights[k] <= capacity:
+            selected[k] = True
+            load += weights[k]
+
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        inside = np.nonzero(selected)[0]
+        outside = np.nonzero(~selected & (scores > 0))[0]
+        if not len(inside) or not len(outside):
+            break
+        # Score gain and new load of every (remove i, add j) swap at once
+        gain = scores[outside][None, :] - scores[inside][:, None]
+        new_load = load - weights[inside][:, None] + weights[outside][None, :]
+        gain[new_load > capacity] = 0
+        best = np.unravel_index(np.argmax(gain), gain.shape)
+        if gain[best] > 1e-9:
+            i, j = inside[best[0]], outside[best[1]]
+            selected[i], selected[j] = False, True
+            load += weights[j] - weights[i]
+            improved = True
+
+    return np.nonzero(selected)[0].tolist()
+
+
+def load_vehicles(items, vehicles, weight_resolution=1.0, time_budget=0.5,
+                  exact_cell_limit=EXACT_CELL_LIMIT):
+    """Assign inventory lots to vehicles, maximizing urgency/spoilage-weighted value.
+
+    Vehicles are filled largest first, each one solved on the lots that are
+    still unassigned. A vehicle is solved exactly with the DP knapsack when
+    its table (lots x capacity / ``weight_resolution``) fits in
+    ``exact_cell_limit`` cells, otherwise with the time-bounded greedy
+    heuristic.
+    """
+    if not weight_resolution > 0:
+        raise ValueError("weight_resolution must be positive")
+    if any(not float(v['capacity']) >= 0 for v in vehicles):
+        raise ValueError("Vehicle capacities must be non-negative")
+    deadline = time.perf_counter() + time_budget
+    remaining = list(range(len(items)))
+    scores = np.array([item_score(item) for item in items], dtype=np.float64)
+    weights = np.array([float(item['weight']) for item in items], dtype=np.float64)
+
+    loads = []
+    for vehicle in sorted(vehicles, key=lambda v: v['capacity'], reverse=True):
+        capacity = float(vehicle['capacity'])
+        idx = np.array(remaining, dtype=np.intp)
+        chosen = []
+        method = 'exact'
+        if len(idx):
+            # Round weights up so a solution never exceeds the real capacity
+            units = np.ceil(weights[idx] / weight_resolution - 1e-9).astype(np.int64)
+            cap_units = int(capacity // weight_resolution)
+            if len(idx) * (cap_units + 1) <= exact_cell_limit:
+                chosen = knapsack_dp(units, scores[idx], cap_units)
+            else:
+                method = 'heuristic'
+                per_vehicle_deadline = time.perf_counter() + max(0.0, deadline - time.perf_counter()) / len(vehicles)
+                chosen = knapsack_greedy(weights[idx], scores[idx], capacity, per_vehicle_deadline)
+
+        chosen_items = [int(idx[k]) for k in chosen]
+        chosen_set = set(chosen_items)
+        remaining = [k for k in remaining if k not in chosen_set]
+
+        total_weight = float(weights[chosen_items].sum()) if chosen_items else 0.0
+        total_value = sum(float(items[k]['value']) for k in chosen_items)
+        loads.append({
+            'vehicle_id': vehicle.get('vehicle_id'),
+            'capacity': capacity,
+            'method': method,
+            'selected_items': [items[k] for k in chosen_items],
+            'total_weight': round(total_weight, 2),
+            'total_value': round(total_value, 2),
+            'total_score': round(float(scores[chosen_items].sum()) if chosen_items else 0.0, 2),
+            'capacity_utilization': round(total_weight / capacity * 100, 1) if capacity else 0.0,
+            'efficiency_score': round(total_value / total_weight, 2) if total_weight else 0.0
+        })
+
+    return {
+        'vehicles': loads,
+        'unassigned_items': [items[k] for k in remaining]
+    }
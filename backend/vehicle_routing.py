@@ -0,0 +1,237 @@
+import time
+
+import numpy as np
+
+# Above this many visits, savings are only listed for each visit's SAVINGS_NEIGHBOURS nearest
+# visits: O(n k) candidate merges instead of all n^2 / 2 pairs
+FULL_SAVINGS_MAX_VISITS = 300
+SAVINGS_NEIGHBOURS = 30
+
+
+class VehicleRoutingSolver:
+    """Capacitated vehicle routing over a precomputed distance matrix.
+
+    Index 0 of ``distances`` is the depot and indices 1..n are the stops.
+    Routes are built with Clarke-Wright savings and then improved with
+    2-opt and Or-opt moves until no move helps or ``time_budget`` seconds
+    have passed. The budget covers the improvement phase; construction is
+    not interrupted but is kept near-linear for large stop sets by only
+    considering merges with nearby stops. Vehicles may run several trips, so every stop is served as
+    long as no single demand is larger than the biggest vehicle (larger
+    demands are split into several visits).
+    """
+
+    def __init__(self, distances, demands, vehicle_capacities, time_budget=1.0):
+        self.distances = np.asarray(distances, dtype=np.float64)
+        self.vehicle_capacities = [float(c) for c in vehicle_capacities]
+        if not self.vehicle_capacities or max(self.vehicle_capacities) <= 0:
+            raise ValueError("At least one vehicle with positive capacity is required")
+        self.max_capacity = max(self.vehicle_capacities)
+        self.time_budget = time_budget
+
+        # Split oversized demands into several visits of the same stop
+        self.visit_stop = [0]
+        self.visit_demand = [0.0]
+        for stop, demand in enumerate(demands, start=1):
+            remaining = float(demand)
+            while remaining > self.max_capacity:
+                self.visit_stop.append(stop)
+                self.visit_demand.append(self.max_capacity)
+                remaining -= self.max_capacity
+            if remaining > 0:
+                self.visit_stop.append(stop)
+                self.visit_demand.append(remaining)
+
+        visit_stop = np.array(self.visit_stop, dtype=np.intp)
+        self.cost = self.distances[np.ix_(visit_stop, visit_stop)]
+
+    def solve(self):
+        """Return a list of trips: dicts with ``vehicle``, ``stops``, ``load`` and ``distance``"""
+        deadline = time.perf_counter() + self.time_budget
+        routes = self._savings_routes()
+        routes = self._local_search(routes, deadline)
+        return self._assign_vehicles(routes)
+
+    def _route_length(self, route):
+        if not route:
+            return 0.0
+        cost = self.cost
+        length = cost[0, route[0]] + cost[route[-1], 0]
+        for a, b in zip(route, route[1:]):
+            length += cost[a, b]
+        return float(length)
+
+    def _load(self, route):
+        return sum(self.visit_demand[v] for v in route)
+
+    def _savings_routes(self):
+        """Clarke-Wright parallel savings construction"""
+        n = len(self.visit_stop) - 1
+        if n == 0:
+            return []
+
+        cost = self.cost
+        route_of = list(range(n + 1))
+        routes = {v: [v] for v in range(1, n + 1)}
+        loads = {v: self.visit_demand[v] for v in range(1, n + 1)}
+
+        i_idx, j_idx = self._savings_pairs(n)
+        savings = cost[0, i_idx] + cost[0, j_idx] - cost[i_idx, j_idx]
+        # Pairs with an unreachable leg (inf - inf is NaN) are never merged
+        savings[~np.isfinite(savings)] = 0.0
+        order = np.argsort(-savings, kind='stable')
+
+        for k in order.tolist():
+            if savings[k] <= 0:
+                break
+            i, j = int(i_idx[k]), int(j_idx[k])
+            ri, rj = route_of[i], route_of[j]
+            if ri == rj or loads[ri] + loads[rj] > self.max_capacity:
+                continue
+
+            a, b = routes[ri], routes[rj]
+            # Merge only when i and j are route ends, orienting so they meet
+            if a[-1] == i and b[0] == j:
+                merged = a + b
+            elif a[0] == i and b[-1] == j:
+                merged = b + a
+            elif a[-1] == i and b[-1] == j:
+                merged = a + b[::-1]
+            elif a[0] == i and b[0] == j:
+                merged = a[::-1] + b
+            else:
+                continue
+
+            routes[ri] = merged
+            loads[ri] += loads.pop(rj)
+            del routes[rj]
+            for v in b:
+                route_of[v] = ri
+
+        return list(routes.values())
+
+    def _savings_pairs(self, n):
+        """Visit pairs (i < j, 1-based) whose merge is considered"""
+        if n <= FULL_SAVINGS_MAX_VISITS:
+            i_idx, j_idx = np.triu_indices(n, k=1)
+            return i_idx + 1, j_idx + 1
+        # Each visit's nearest visits (itself included, dropped below), by the shorter direction
+        inner = self.cost[1:, 1:]
+        k = SAVINGS_NEIGHBOURS + 1
+        near = np.argpartition(np.minimum(inner, inner.T), k, axis=1)[:, :k]
+        rows = np.repeat(np.arange(n), k)
+        cols = near.ravel()
+        keep = rows != cols
+        low, high = np.minimum(rows[keep], cols[keep]), np.maximum(rows[keep], cols[keep])
+        pairs = np.unique(low * n + high)
+        return pairs // n + 1, pairs % n + 1
+
+    def _local_search(self, routes, deadline):
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for route in routes:
+                if self._two_opt(route, deadline):
+                    improved = True
+            if self._or_opt(routes, deadline):
+                improved = True
+        return [route for route in routes if route]
+
+    def _two_opt(self, route, deadline):
+        """Reverse route segments while that shortens the route (first improvement)"""
+        cost = self.cost
+        improved_any = False
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            tour = [0] + route + [0]
+            for i in range(1, len(tour) - 2):
+                # One pass over a long route is O(n^2), so the budget is checked per i as well
+                if time.perf_counter() >= deadline:
+                    break
+                a, b = tour[i - 1], tour[i]
+                for j in range(i + 1, len(tour) - 1):
+                    c, d = tour[j], tour[j + 1]
+                    delta = cost[a, c] + cost[b, d] - cost[a, b] - cost[c, d]
+                    if delta < -1e-9:
+                        tour[i:j + 1] = tour[i:j + 1][::-1]
+                        improved = improved_any = True
+                        break
+                if improved:
+                    break
+            route[:] = tour[1:-1]
+        return improved_any
+
+    def _or_opt(self, routes, deadline):
+        """Move segments of 1-3 consecutive stops to their best position in any route"""
+        cost = self.cost
+        loads = [self._load(route) for route in routes]
+        improved_any = False
+
+        for r_from, route in enumerate(routes):
+            for seg_len in (1, 2, 3):
+                start = 0
+                while start + seg_len <= len(route):
+                    if time.perf_counter() >= deadline:
+                        return improved_any
+                    segment = route[start:start + seg_len]
+                    prev = route[start - 1] if start > 0 else 0
+                    nxt = route[start + seg_len] if start + seg_len < len(route) else 0
+                    first, last = segment[0], segment[-1]
+                    removal_gain = cost[prev, first] + cost[last, nxt] - cost[prev, nxt]
+                    seg_load = sum(self.visit_demand[v] for v in segment)
+
+                    best = None
+                    for r_to, target in enumerate(routes):
+                        if r_to != r_from and loads[r_to] + seg_load > self.max_capacity:
+                            continue
+                        remaining = target if r_to != r_from else route[:start] + route[start + seg_len:]
+                        tour = [0] + remaining + [0]
+                        for pos in range(len(tour) - 1):
+                            a, b = tour[pos], tour[pos + 1]
+                            for reverse in (False, True):
+                                head, tail = (last, first) if reverse else (first, last)
+                                delta = cost[a, head] + cost[tail, b] - cost[a, b] - removal_gain
+                                if delta < -1e-9 and (best is None or delta < best[0]):
+                                    best = (delta, r_to, pos, reverse)
+
+                    if best is None:
+                        start += 1
+                        continue
+
+                    _, r_to, pos, reverse = best
+                    del route[start:start + seg_len]
+                    moved = segment[::-1] if reverse else segment
+                    routes[r_to][pos:pos] = moved
+                    loads[r_from] -= seg_load
+                    loads[r_to] += seg_load
+                    improved_any = True
+
+        return improved_any
+
+    def _assign_vehicles(self, routes):
+        """Give each trip to the least-used vehicle that can carry it (ties go to the smaller one)"""
+        vehicle_distance = [0.0] * len(self.vehicle_capacities)
+        trips = []
+        for route in sorted(routes, key=self._load, reverse=True):
+            load = self._load(route)
+            length = self._route_length(route)
+            candidates = [v for v, cap in enumerate(self.vehicle_capacities) if cap >= load]
+            vehicle = min(candidates, key=lambda v: (vehicle_distance[v], self.vehicle_capacities[v]))
+            vehicle_distance[vehicle] += length
+            trips.append({
+                'vehicle': vehicle,
+                'stops': [self.visit_stop[v] for v in route],
+                'load': load,
+                'distance': length
+            })
+        return trips
+
+
+def direct_trip_distance(distances, stops):
+    """Distance of serving every stop with its own out-and-back trip from the depot"""
+    distances = np.asarray(distances)
+    stops = np.asarray(stops, dtype=np.intp)
+    if not len(stops):
+        return 0.0
+    return float(np.sum(distances[0, stops] + distances[stops, 0]))